@@ -0,0 +1,153 @@
+"""
+camera.py
+
+The one place camera math happens: scene JSON cameras (pitch/yaw), rescaling
+for render width and the fp24 words of the camera struct ray_maker reads.
+Every tool and testbench builds its camera through Camera, so the RTL renders,
+FPGA renders and software models all see the same vectors.
+"""
+
+import sys
+import math
+from functools import cached_property
+from pathlib import Path
+
+import numpy as np
+
+proj_path = Path(__file__).resolve().parent.parent
+sys.path.append(str(proj_path / "sim"))
+
+from utils import make_fp_vec3, pack_bits, FP_VEC3_BITS
+
+# Scene cameras are set up for 1280 pixels wide, like FP_HALF_SCREEN_WIDTH
+REFERENCE_WIDTH = 1280
+
+
+class Camera:
+    """
+    Camera basis with pitch/yaw already applied
+        forward's length is the focal distance in pixels of a `width` wide image,
+        right/up are the world step per pixel
+    Encoded words are computed once per camera, and scaled() cameras are kept,
+        so rendering many resolutions reuses them
+    """
+    def __init__(
+        self,
+        origin: tuple[float],
+        forward: tuple[float],
+        right: tuple[float],
+        up: tuple[float],
+        width: int = REFERENCE_WIDTH,
+    ):
+        self.origin = tuple(float(x) for x in origin)
+        self.forward = tuple(float(x) for x in forward)
+        self.right = tuple(float(x) for x in right)
+        self.up = tuple(float(x) for x in up)
+        self.width = width
+        self._scaled = {width: self}
+
+    @classmethod
+    def from_json(cls, camera: dict, width: int = REFERENCE_WIDTH):
+        """
+        Camera from a scene JSON's "camera", pitch/yaw (radians) applied to forward/right/up
+        """
+        pitch = camera.get("pitch", 0)
+        yaw = camera.get("yaw", 0)
+
+        # Pitch rotation matrix around right vector
+        cos_pitch = np.cos(pitch)
+        sin_pitch = np.sin(pitch)
+        pitch_mat = np.array([
+            [1, 0, 0],
+            [0, cos_pitch, -sin_pitch],
+            [0, sin_pitch, cos_pitch]
+        ])
+
+        # Yaw rotation matrix around up vector
+        cos_yaw = np.cos(yaw)
+        sin_yaw = np.sin(yaw)
+        yaw_mat = np.array([
+            [cos_yaw, 0, sin_yaw],
+            [0, 1, 0],
+            [-sin_yaw, 0, cos_yaw]
+        ])
+
+        # Combined rotation matrix: apply yaw first, then pitch
+        rotmat = pitch_mat @ yaw_mat
+
+        cam = cls(
+            camera["origin"],
+            rotmat @ np.array(camera["forward"]),
+            rotmat @ np.array(camera["right"]),
+            rotmat @ np.array(camera["up"]),
+        )
+        return cam.scaled(width)
+
+    @classmethod
+    def from_fov(
+        cls,
+        origin: tuple[float],
+        forward_dir: tuple[float],
+        right_dir: tuple[float],
+        up_dir: tuple[float],
+        h_fov: float = None,
+        pixel_size: float = 2,
+        width: int = REFERENCE_WIDTH,
+    ):
+        """
+        Camera from unit axes and a horizontal field of view (radians)
+            forward gets the focal distance that spans h_fov across width pixels,
+            twice the width without a field of view (orthographic source cameras)
+        """
+        fwd_mag = 0.5 * width / math.tan(h_fov / 2) if h_fov is not None else 2.0 * width
+        return cls(
+            origin,
+            [x * fwd_mag for x in forward_dir],
+            [x * pixel_size for x in right_dir],
+            [x * pixel_size for x in up_dir],
+            width,
+        )
+
+    def scaled(self, width: int):
+        """
+        Same field of view for a `width` wide render: forward scaled by width / self.width
+        """
+        if width not in self._scaled:
+            cam = Camera(self.origin, [x * (width / self.width) for x in self.forward], self.right, self.up, width)
+            cam._scaled = self._scaled
+            self._scaled[width] = cam
+        return self._scaled[width]
+
+    @property
+    def vectors(self):
+        """
+        (origin, forward, right, up)
+        """
+        return self.origin, self.forward, self.right, self.up
+
+    def to_json(self):
+        """
+        Scene JSON "camera" of this camera (rotation baked in)
+        """
+        return {
+            "origin": list(self.origin),
+            "forward": list(self.forward),
+            "right": list(self.right),
+            "up": list(self.up),
+            "pitch": 0,
+            "yaw": 0,
+        }
+
+    @cached_property
+    def words(self):
+        """
+        fp_vec3 words of (origin, forward, right, up)
+        """
+        return tuple(make_fp_vec3(vec) for vec in self.vectors)
+
+    @cached_property
+    def bits(self):
+        """
+        Packed camera struct, origin in the MSBs
+        """
+        return pack_bits([(word, FP_VEC3_BITS) for word in self.words], msb=True)
@@ -1,7 +1,9 @@
 # Find evil bithack constants, among others
 
 import math
+import os
 from functools import lru_cache
+from multiprocessing import Pool
 import numpy as np
 from tqdm import tqdm
 
@@ -10,7 +12,22 @@ from pathlib import Path
 
 proj_path = Path(__file__).parent.parent
 sys.path.append(str(proj_path / "sim"))
-from utils import make_fp, convert_fp, FP_BITS, FP_EXP_BITS
+from utils import make_fp, make_fp_array, convert_fp_array, FP_BITS, FP_EXP_BITS
+from fpmodel import fp_inv_sqrt, fp_inv, HDL_PARAMS
+
+from argparse import ArgumentParser
+
+INV_SQRT_NR_STAGES = HDL_PARAMS["INV_SQRT_NR_STAGES"]
+INV_NR_STAGES = HDL_PARAMS["INV_NR_STAGES"]
+
+N_SAMPLES = 1_000
+
+# Candidate constants per cost evaluation, (batch, n_samples) int64 temporaries
+BATCH_SIZE = 1024
+
+# Costs of every constant evaluated so far, per cost function / Newton stages / sample count
+CACHE_DIR = proj_path / "ctrl" / ".constants_cache"
+
 
 # Helper function for searching the whole space
 def window_search(x: int, cost_fun, win_size: int, n_samples: int):
@@ -18,18 +35,19 @@ def window_search(x: int, cost_fun, win_size: int, n_samples: int):
     Centered at x, sample `cost` along `samples` points within the window
         [x - win_size / 2, x + win_size / 2].
     Recursively halve window size until win_size < 1.
+    cost_fun takes an array of constants and returns their costs
     """
     if win_size < 1:
-        return x, cost_fun(x)
+        return x, cost_fun(np.array([x]))[0]
 
     print(f"Running window search centered on {x}, {win_size=}, {n_samples=}")
 
-    x_lo = math.floor(x - win_size / 2)
-    x_hi = math.ceil(x + win_size / 2)
+    x_lo = max(math.floor(x - win_size / 2), 0)
+    x_hi = min(math.ceil(x + win_size / 2), (1 << FP_BITS) - 1)
 
     x_sample_spacing = max(1, (x_hi - x_lo) // n_samples)
-    x_sampled = sorted(set(range(x_lo, x_hi + 1, x_sample_spacing)))
-    cost_sampled = [cost_fun(x) for x in x_sampled]
+    x_sampled = np.arange(x_lo, x_hi + 1, x_sample_spacing)
+    cost_sampled = cost_fun(x_sampled)
 
     # import matplotlib.pyplot as plt
     # plt.plot(x_sampled, np.minimum(cost_sampled, 10))
@@ -37,70 +55,212 @@ def window_search(x: int, cost_fun, win_size: int, n_samples: int):
     # plt.ylabel("cost")
     # plt.show()
 
-    # Find x that minimizes cost samp
-    best_x_idx = 0
-    for i in range(len(x_sampled)):
-        if cost_sampled[i] < cost_sampled[best_x_idx]:
-            best_x_idx = i
-    
+    # Find x that minimizes cost samp (first one on ties)
+    best_x_idx = np.argmin(cost_sampled)
+
     return window_search(
-        x=x_sampled[best_x_idx],
+        x=int(x_sampled[best_x_idx]),
         cost_fun=cost_fun,
         win_size=(win_size / 2),
         n_samples=n_samples
     )
 
 
-# Evil bithack constant for inverse square root
+def sweep_search(cost_fun, batch_size: int = 1 << 16):
+    """
+    Evaluate every FP_BITS wide constant, return the best one and its cost
+    """
+    best_x, best_cost = 0, np.inf
+    for lo in tqdm(range(0, 1 << FP_BITS, batch_size)):
+        x = np.arange(lo, lo + batch_size)
+        cost = cost_fun(x)
+        idx = np.argmin(cost)
+        if cost[idx] < best_cost:
+            best_x, best_cost = int(x[idx]), cost[idx]
+    return best_x, best_cost
+
+
 @lru_cache(None)
-def cost_inv_sqrt_const(magic_const: int):
+def sample_points(n_samples: int = N_SAMPLES):
     """
-    Calculate mean relative error for x across a spectrum
+    Inputs the costs average over: floats and their fp encoding, across a spectrum
     """
-    assert isinstance(magic_const, int)
+    a_vals = np.exp2(np.linspace(-16, 16, n_samples))
+    a_fp = make_fp_array(a_vals).astype(np.int64)
+    return a_vals, a_fp
 
-    a_vals = np.exp2(np.linspace(-16, 16, 1_000))
-    init_guesses = np.zeros_like(a_vals)
 
-    for i, a in enumerate(a_vals):
-        a_fp = make_fp(float(a))
-        init_guesses[i] = convert_fp(magic_const - (a_fp >> 1))
+def relative_error(best_guesses: np.ndarray, guesses_fp: np.ndarray):
+    """
+    Mean relative error of each row of fp guesses, inf for rows that hit zero
+    """
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        cost = np.mean(np.abs(best_guesses / convert_fp_array(guesses_fp) - 1), axis=-1)
+    return np.nan_to_num(cost, nan=np.inf)
+
+
+# Evil bithack constant for inverse square root
+def cost_inv_sqrt_consts(magic_consts: np.ndarray, nr_stages: int = 0, n_samples: int = N_SAMPLES):
+    """
+    Calculate mean relative error for x across a spectrum, for each constant
+        After nr_stages Newton steps of the bit-accurate fp_inv_sqrt model,
+        or of the raw initial guess when nr_stages is 0
+    """
+    a_vals, a_fp = sample_points(n_samples)
+    magic_consts = np.asarray(magic_consts, dtype=np.int64)[:, None]
+
+    if nr_stages:
+        guesses = fp_inv_sqrt(a_fp, nr_stages, magic_consts)
+    else:
+        guesses = magic_consts - (a_fp >> 1)
 
-    best_guesses = 1 / np.sqrt(a_vals)
-    return np.mean(np.abs(best_guesses / init_guesses - 1))
+    return relative_error(1 / np.sqrt(a_vals), guesses)
 
 # Evil bithack constant for inverse
-@lru_cache(None)
-def cost_inv_const(magic_const: int):
+def cost_inv_consts(magic_consts: np.ndarray, nr_stages: int = 0, n_samples: int = N_SAMPLES):
     """
-    Calculate mean relative error for x across a spectrum
+    Calculate mean relative error for x across a spectrum, for each constant
+        After nr_stages Newton steps of the bit-accurate fp_inv model,
+        or of the raw initial guess when nr_stages is 0
+    """
+    a_vals, a_fp = sample_points(n_samples)
+    magic_consts = np.asarray(magic_consts, dtype=np.int64)[:, None]
+
+    if nr_stages:
+        guesses = fp_inv(a_fp, nr_stages, magic_consts)
+    else:
+        guesses = magic_consts - a_fp
+
+    return relative_error(1 / a_vals, guesses)
+
+
+COST_FUNS = {
+    "inv_sqrt": cost_inv_sqrt_consts,
+    "inv": cost_inv_consts,
+}
+
+# Newton stages after the initial guess in fp_inv_sqrt.sv / fp_inv.sv
+NR_STAGES = {
+    "inv_sqrt": INV_SQRT_NR_STAGES,
+    "inv": INV_NR_STAGES,
+}
+
+
+def cost_inv_sqrt_const(magic_const: int, nr_stages: int = 0):
+    """
+    Single-constant cost_inv_sqrt_consts
     """
     assert isinstance(magic_const, int)
+    return cost_inv_sqrt_consts(np.array([magic_const]), nr_stages)[0]
+
+def cost_inv_const(magic_const: int, nr_stages: int = 0):
+    """
+    Single-constant cost_inv_consts
+    """
+    assert isinstance(magic_const, int)
+    return cost_inv_consts(np.array([magic_const]), nr_stages)[0]
+
+
+def _batch_costs(job):
+    name, consts, nr_stages, n_samples = job
+    return COST_FUNS[name](consts, nr_stages, n_samples)
 
-    a_vals = np.exp2(np.linspace(-16, 16, 1_000))
-    init_guesses = np.zeros_like(a_vals)
 
-    for i, a in enumerate(a_vals):
-        a_fp = make_fp(float(a))
-        init_guesses[i] = convert_fp(magic_const - a_fp)
+class BatchCost:
+    """
+    Vectorized cost of many constants, split in BATCH_SIZE batches across a process pool
+        With a cache_dir, every cost is kept in a memory-mapped array over all
+        2^FP_BITS constants, so reruns and overlapping windows only evaluate new ones
+    """
+    def __init__(self, name: str, nr_stages: int = 0, n_samples: int = N_SAMPLES, pool: Pool = None, cache_dir: Path = CACHE_DIR):
+        self.name = name
+        self.nr_stages = nr_stages
+        self.n_samples = n_samples
+        self.pool = pool
+        self.n_evaluated = 0
+
+        self.costs = self.done = None
+        if cache_dir is not None:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            stem = cache_dir / f"{name}_nr{nr_stages}_s{n_samples}"
+            self.costs = self._open(stem.with_suffix(".costs.npy"), np.float64)
+            self.done = self._open(stem.with_suffix(".done.npy"), np.bool_)
+
+    @staticmethod
+    def _open(path: Path, dtype):
+        # Fresh files are sparse, only the evaluated pages take up disk
+        mode = "r+" if path.exists() else "w+"
+        return np.lib.format.open_memmap(path, mode=mode, dtype=dtype, shape=(1 << FP_BITS,))
+
+    def evaluate(self, consts: np.ndarray):
+        """
+        Costs of consts, without the cache
+        """
+        jobs = [
+            (self.name, consts[lo:lo + BATCH_SIZE], self.nr_stages, self.n_samples)
+            for lo in range(0, len(consts), BATCH_SIZE)
+        ]
+        self.n_evaluated += len(consts)
+        results = self.pool.map(_batch_costs, jobs) if self.pool else map(_batch_costs, jobs)
+        return np.concatenate(list(results)) if jobs else np.zeros(0)
+
+    def __call__(self, consts: np.ndarray):
+        consts = np.asarray(consts, dtype=np.int64)
+        if self.costs is None:
+            return self.evaluate(consts)
 
-    best_guesses = 1 / a_vals
-    return np.mean(np.abs(best_guesses / init_guesses - 1))
+        todo = np.unique(consts[~self.done[consts]])
+        if len(todo):
+            self.costs[todo] = self.evaluate(todo)
+            self.done[todo] = True
+            self.costs.flush()
+            self.done.flush()
+        return np.array(self.costs[consts])
+
+
+parser = ArgumentParser()
+parser.add_argument("--newton", action="store_true", help=f"minimize error after the HDL's Newton stages ({INV_SQRT_NR_STAGES} for inv sqrt, {INV_NR_STAGES} for inv) instead of the initial guess")
+parser.add_argument("--sweep", action="store_true", help="evaluate all 2^FP_BITS constants instead of the window search")
+parser.add_argument("--samples", type=int, default=N_SAMPLES, help="inputs each cost averages over")
+parser.add_argument("--processes", type=int, default=os.cpu_count())
+parser.add_argument("--no-cache", action="store_true", help=f"don't read or write {CACHE_DIR.name}")
 
 
 if __name__ == "__main__":
-    inv_sqrt_magic_num, inv_sqrt_cost = window_search(
-        (1 << FP_BITS) / 2, cost_inv_sqrt_const, 1 << FP_BITS, 100)
-    inv_magic_num, inv_cost = window_search(
-        (1 << FP_BITS) / 2, cost_inv_const, 1 << FP_BITS, 100)
-    
+    args = parser.parse_args()
+    cache_dir = None if args.no_cache else CACHE_DIR
+
+    results = {}
+    with Pool(args.processes) as pool:
+        for name, hdl_nr_stages in NR_STAGES.items():
+            cost_fun = BatchCost(name, hdl_nr_stages if args.newton else 0, args.samples, pool, cache_dir)
+            if args.sweep:
+                magic_num, _ = sweep_search(cost_fun)
+            else:
+                magic_num, _ = window_search(
+                    (1 << FP_BITS) // 2, cost_fun, 1 << FP_BITS, 100)
+            print(f"{name}: evaluated {cost_fun.n_evaluated} new constants")
+
+            # Report both errors, whichever one was minimized
+            guess_cost, nr_cost = (
+                BatchCost(name, nr_stages, args.samples, pool, cache_dir)(np.array([magic_num]))[0]
+                for nr_stages in (0, hdl_nr_stages)
+            )
+            print(f"{name} 'h{magic_num:x}: {guess_cost * 100:.4f}% initial guess error, "
+                  f"{nr_cost * 100:.6f}% after {hdl_nr_stages} Newton stages")
+            results[name] = magic_num, nr_cost if args.newton else guess_cost
+
+    inv_sqrt_magic_num, inv_sqrt_cost = results["inv_sqrt"]
+    inv_magic_num, inv_cost = results["inv"]
+    after = " after Newton stages" if args.newton else ""
+
     print(f"""\n===== PASTE INTO CONSTANTS.SV =====\n
 parameter fp FP_HALF_SCREEN_WIDTH = 'h{make_fp(1280 // 2):x};
 parameter fp FP_ONE = 'h{make_fp(1):x};
 parameter fp FP_THREE = 'h{make_fp(3):x};
 parameter fp FP_TWO = 'h{make_fp(2):x};
-parameter fp FP_INV_SQRT_MAGIC_NUM = 'h{inv_sqrt_magic_num:x}; // ({inv_sqrt_cost * 100:.4f}% error)
-parameter fp FP_INV_MAGIC_NUM = 'h{inv_magic_num:x}; // ({inv_cost * 100:.4f}% error)
+parameter fp FP_INV_SQRT_MAGIC_NUM = 'h{inv_sqrt_magic_num:x}; // ({inv_sqrt_cost * 100:.4f}% error{after})
+parameter fp FP_INV_MAGIC_NUM = 'h{inv_magic_num:x}; // ({inv_cost * 100:.4f}% error{after})
 
 =====================
 """)
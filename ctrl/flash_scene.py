@@ -6,141 +6,85 @@ import sys
 proj_path = Path(__file__).parent.parent
 
 sys.path.append(str(proj_path / "sim"))
-from utils import make_fp, make_fp_vec3, pack_bits, FP_VEC3_BITS
-from make_scene_buffer import Material, Object, build_material_dict
+from camera import Camera
+from make_scene_buffer import (
+    load_manifest, manifest_changes, pack_materials_array, pack_objects_array,
+    save_manifest, scene_manifest,
+)
+from uart_flash import FakeFlashDevice, build_stream, send_stream, theoretical_rate
 
-import wave
 import serial
-import sys
 import json
-import numpy as np
-
-from tqdm import tqdm
-
-from struct import unpack
 import time
 
 from argparse import ArgumentParser
 
+# Communication Parameters
+SERIAL_PORTNAME = "/dev/ttyUSB0"  # CHANGE ME to match your system's serial port name!
+BAUD = 115200  # Make sure this matches your UART receiver (uart_receive's BAUD_RATE in top_level_rtx.sv)
+
+# What the FPGA's scene buffer / material dictionary hold after the last flash
+FLASH_MANIFEST = proj_path / "data" / "flash_manifest.json"
+
 parser = ArgumentParser()
 parser.add_argument("scene", nargs="?", type=str)
+parser.add_argument("--full", action="store_true", help="send every object and material, e.g. after the FPGA was reprogrammed")
+parser.add_argument("--port", type=str, default=SERIAL_PORTNAME)
+parser.add_argument("--baud", type=int, default=BAUD)
+parser.add_argument("--block-size", type=int, default=4096, help="bytes per serial write")
+parser.add_argument("--no-burst", dest="burst", action="store_false", help="one idx + data command per word, for bitstreams without 0x0A/0x0B")
+parser.add_argument("--fake", action="store_true", help="flash a pty fake device that decodes like uart_memflash_rtx.sv and check what it received")
 
-args = parser.parse_args()
 
-# Communication Parameters
-SERIAL_PORTNAME = "/dev/ttyUSB0"  # CHANGE ME to match your system's serial port name!
-BAUD = 115200  # Make sure this matches your UART receiver
+def check_flashed(device: FakeFlashDevice, scene: dict):
+    """
+    Assert a fake device decoded exactly the scene's words
+    """
+    flashed = device.scene
+    cam_words = Camera.from_json(scene["camera"]).words
+    assert flashed.cam == dict(zip(["origin", "forward", "right", "up"], cam_words)), "Camera mismatch"
+
+    obj_records = pack_objects_array(scene)
+    assert flashed.objs == {idx: int.from_bytes(rec.tobytes(), "big") for idx, rec in enumerate(obj_records)}, "Object mismatch"
+
+    mat_records = pack_materials_array(scene)
+    assert flashed.mats == {idx: int.from_bytes(rec.tobytes(), "big") for idx, rec in enumerate(mat_records)}, "Material mismatch"
+
+    assert flashed.num_objs == len(scene["objects"]), "num_objs mismatch"
+    assert flashed.max_bounces == int(scene["max_bounces"]), "max_bounces mismatch"
 
 
 if __name__ == "__main__":
-    ser = serial.Serial(SERIAL_PORTNAME, BAUD)
-
-    # ser.write((0b10000000).to_bytes(1))
-    # print((FP_VEC3_BITS + 7) // 8)
-    # for i in range(100):
-    #     ser.write((0).to_bytes(1))
-    #     input(i+1)
-    # exit()
-
-    def set_cam(
-        origin: tuple[float] = None,
-        forward: tuple[float] = None,
-        right: tuple[float] = None,
-        up: tuple[float] = None,
-    ):
-        for cmd, vec in zip([0x00, 0x01, 0x02, 0x03], [origin, forward, right, up]):
-            if vec is None:
-                continue
-
-            ser.write((cmd).to_bytes(1, "big"))
-            data = make_fp_vec3(vec)
-            ser.write(data.to_bytes((FP_VEC3_BITS + 7) // 8, "big"))
-
-    def set_obj(obj_idx: int, obj: Object):
-        obj_bits, obj_num_bits = obj.pack_bits()
-        ser.write((0x04).to_bytes(1, "big"))
-        ser.write(obj_idx.to_bytes(2, "big"))
-
-        obj_num_bytes = ((obj_num_bits + 7) // 8)
-        ser.write((0x05).to_bytes(1, "big"))
-        ser.write(obj_bits.to_bytes(obj_num_bytes, "big"))
-
-    def set_num_objs(num_objs: int):
-        assert num_objs > 0, "Cannot set zero objects"
-        ser.write((0x06).to_bytes(1, "big"))
-        ser.write(num_objs.to_bytes(2, "big"))
-
-    def set_mat(mat_idx: int, mat_bits: int, mat_width: int):
-        ser.write((0x08).to_bytes(1, "big"))
-        ser.write(mat_idx.to_bytes(1, "big"))
-
-        mat_num_bytes = ((mat_width + 7) // 8)
-        ser.write((0x09).to_bytes(1, "big"))
-        ser.write(mat_bits.to_bytes(mat_num_bytes, "big"))
-
-    def set_max_bounces(max_bounces: int):
-        ser.write((0x07).to_bytes(1, "big"))
-        ser.write(max_bounces.to_bytes(1, "big"))
+    args = parser.parse_args()
 
     with open(args.scene) as fin:
         scene = json.load(fin)
 
-    forward = np.array(scene["camera"]["forward"])
-    right = np.array(scene["camera"]["right"])
-    up = np.array(scene["camera"]["up"])
-    pitch = scene["camera"].get("pitch", 0)
-    yaw = scene["camera"].get("yaw", 0)
-    
-    # Create rotation matrices for pitch and yaw
-    # Pitch rotation matrix around right vector
-    cos_pitch = np.cos(pitch)
-    sin_pitch = np.sin(pitch)
-    pitch_mat = np.array([
-        [1, 0, 0],
-        [0, cos_pitch, -sin_pitch],
-        [0, sin_pitch, cos_pitch]
-    ])
-    
-    # Yaw rotation matrix around up vector
-    cos_yaw = np.cos(yaw)
-    sin_yaw = np.sin(yaw)
-    yaw_mat = np.array([
-        [cos_yaw, 0, sin_yaw],
-        [0, 1, 0],
-        [-sin_yaw, 0, cos_yaw]
-    ])
-    
-    # Combined rotation matrix: apply yaw first, then pitch
-    rotmat = pitch_mat @ yaw_mat
-    
-    # Apply rotations to get new vectors
-    forward = tuple(rotmat @ forward)
-    right = tuple(rotmat @ right)
-    up = tuple(rotmat @ up)
-
-    set_cam(
-        origin=scene["camera"]["origin"],
-        forward=forward,
-        right=right,
-        up=up,
+    # Only send the objects and materials that changed since the last flash
+    # (a fake device starts out empty)
+    manifest = scene_manifest(scene)
+    old_manifest = None if args.full or args.fake else load_manifest(FLASH_MANIFEST)
+    obj_idxs, mat_idxs = manifest_changes(old_manifest, manifest)
+
+    stream = build_stream(scene, obj_idxs, mat_idxs, args.burst)
+
+    device = FakeFlashDevice() if args.fake else None
+    ser = serial.Serial(device.port if args.fake else args.port, args.baud)
+
+    elapsed = send_stream(ser, stream.buf, args.block_size)
+    if args.fake:
+        start = time.perf_counter()
+        device.wait(len(stream))
+        elapsed += time.perf_counter() - start
+        check_flashed(device, scene)
+        ser.close()
+        device.close()
+        print(f"Fake device decoded {device.scene.n_writes} writes, scene matches")
+    else:
+        save_manifest(FLASH_MANIFEST, manifest)
+
+    print(f"Sent {len(obj_idxs)}/{len(scene['objects'])} objects, {len(mat_idxs)}/{len(manifest['mat_dict'])} materials")
+    print(
+        f"{len(stream)} bytes in {elapsed:.3f}s: {len(stream) / elapsed:.0f} B/s, "
+        f"theoretical {theoretical_rate(args.baud):.0f} B/s at {args.baud} baud"
     )
-
-    # Build build mat dict
-    mat_bits2idx, mat_name2idx, mat_width = build_material_dict(scene)
-
-    # Flash mat dict
-    mats = sorted(mat_bits2idx.items(), key=lambda x: x[1])
-    for mat_bits, mat_idx_val in mats:
-        set_mat(mat_idx_val, mat_bits, mat_width)
-
-    # Flash objects
-    objs = scene["objects"]
-    for idx, obj in enumerate(objs):
-        # Look up material index in dictionary
-        obj["mat_idx"] = mat_name2idx[obj["material"]]
-        del obj["material"]
-        set_obj(idx, Object(**obj))
-
-    set_num_objs(len(objs))
-
-    set_max_bounces(int(scene["max_bounces"]))
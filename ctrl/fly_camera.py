@@ -0,0 +1,135 @@
+# We love python <3
+
+"""
+Fly the camera of a flashed scene over UART
+
+Keys: w/s forward/back, a/d left/right, r/f up/down, i/k pitch, j/l yaw, q quit
+Only the camera vectors that changed are sent, at most --rate times a second,
+and key presses that arrive while the link is busy are merged into one update.
+
+    python fly_camera.py scenes/knight.json
+    python fly_camera.py scenes/knight.json --fake --demo 5
+"""
+
+from pathlib import Path
+import sys
+
+proj_path = Path(__file__).parent.parent
+
+sys.path.append(str(proj_path / "sim"))
+from camera import Camera
+from uart_flash import CameraStreamer, FakeFlashDevice
+from flash_scene import SERIAL_PORTNAME, BAUD
+
+import serial
+import json
+import time
+import select
+import termios
+import tty
+
+import numpy as np
+
+from argparse import ArgumentParser
+
+parser = ArgumentParser()
+parser.add_argument("scene", type=str)
+parser.add_argument("--port", type=str, default=SERIAL_PORTNAME)
+parser.add_argument("--baud", type=int, default=BAUD)
+parser.add_argument("--rate", type=float, default=60, help="camera updates per second")
+parser.add_argument("--step", type=float, default=0.25, help="distance per move key")
+parser.add_argument("--turn", type=float, default=np.pi / 64, help="radians per pitch/yaw key")
+parser.add_argument("--fake", action="store_true", help="send to a pty fake device instead of the board")
+parser.add_argument("--demo", type=float, default=None, help="no keyboard: orbit the yaw for this many seconds, one input per ms")
+
+# key -> (move along forward, right, up), (pitch, yaw)
+KEYS = {
+    "w": ((1, 0, 0), (0, 0)),
+    "s": ((-1, 0, 0), (0, 0)),
+    "d": ((0, 1, 0), (0, 0)),
+    "a": ((0, -1, 0), (0, 0)),
+    "r": ((0, 0, 1), (0, 0)),
+    "f": ((0, 0, -1), (0, 0)),
+    "i": ((0, 0, 0), (1, 0)),
+    "k": ((0, 0, 0), (-1, 0)),
+    "l": ((0, 0, 0), (0, 1)),
+    "j": ((0, 0, 0), (0, -1)),
+}
+
+
+def apply_key(camera: dict, key: str, step: float, turn: float):
+    """
+    Move / turn a scene JSON camera in place, moves follow the rotated basis
+    """
+    move, (pitch, yaw) = KEYS[key]
+    _, forward, right, up = (np.array(v) for v in Camera.from_json(camera).vectors)
+    basis = [v / np.linalg.norm(v) for v in (forward, right, up)]
+
+    camera["origin"] = list(np.array(camera["origin"]) + step * sum(m * v for m, v in zip(move, basis)))
+    camera["pitch"] = camera.get("pitch", 0) + turn * pitch
+    camera["yaw"] = camera.get("yaw", 0) + turn * yaw
+
+
+def run_keyboard(streamer: CameraStreamer, camera: dict, period: float, step: float, turn: float):
+    fd = sys.stdin.fileno()
+    old_attrs = termios.tcgetattr(fd)
+    tty.setcbreak(fd)
+    try:
+        next_tick = time.perf_counter()
+        while True:
+            timeout = max(next_tick - time.perf_counter(), 0)
+            if select.select([sys.stdin], [], [], timeout)[0]:
+                key = sys.stdin.read(1)
+                if key == "q":
+                    return
+                if key in KEYS:
+                    apply_key(camera, key, step, turn)
+                    streamer.update(Camera.from_json(camera))
+
+            if time.perf_counter() >= next_tick:
+                streamer.tick()
+                next_tick += period
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, old_attrs)
+
+
+def run_demo(streamer: CameraStreamer, camera: dict, period: float, duration: float):
+    start = time.perf_counter()
+    next_tick = start
+    yaw0 = camera.get("yaw", 0)
+    while (now := time.perf_counter()) - start < duration:
+        camera["yaw"] = yaw0 + 2 * np.pi * (now - start) / duration
+        streamer.update(Camera.from_json(camera), now)
+        if now >= next_tick:
+            streamer.tick(now)
+            next_tick += period
+        time.sleep(1e-3)
+    streamer.tick(streamer.link_free_at)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    with open(args.scene) as fin:
+        camera = json.load(fin)["camera"]
+
+    device = FakeFlashDevice() if args.fake else None
+    ser = serial.Serial(device.port if args.fake else args.port, args.baud)
+    streamer = CameraStreamer(ser, args.baud)
+
+    # Whatever the FPGA holds, start from the scene's camera
+    streamer.update(Camera.from_json(camera))
+    streamer.tick()
+
+    if args.demo is not None:
+        run_demo(streamer, camera, 1 / args.rate, args.demo)
+    else:
+        run_keyboard(streamer, camera, 1 / args.rate, args.step, args.turn)
+
+    ser.close()
+    if args.fake:
+        device.wait(streamer.stats["sent_bytes"])
+        device.close()
+        print(f"Fake device decoded {device.scene.n_writes} camera writes")
+
+    print(streamer.report())
@@ -3,6 +3,7 @@
 from pathlib import Path
 
 from argparse import ArgumentParser
+import hashlib
 import json
 import numpy as np
 
@@ -10,10 +11,25 @@ proj_path = Path(__file__).parent.parent
 import sys
 sys.path.append(str(proj_path / "sim"))
 
-from utils import make_fp, make_fp_vec3, pack_bits, FP_BITS, FP_VEC3_BITS
+from camera import Camera
+from utils import make_fp, make_fp_array, make_fp_vec3, pack_bits, parse_sv_params, FP_BITS, FP_VEC3_BITS, FP_MANT_BITS
+
+# Scene buffer orderings, see order_objects()
+ORDERINGS = ["area", "emit", "morton"]
 
 parser = ArgumentParser()
 parser.add_argument("scene", nargs="?", type=str)
+parser.add_argument("--bvh", action="store_true", help="order objects by a SAH BVH and write data/bvh.mem")
+parser.add_argument("--leaf-size", type=int, default=4)
+parser.add_argument("--order", choices=ORDERINGS, default=None, help="reorder the scene buffer before export")
+parser.add_argument("--full", action="store_true", help="rewrite every object and material instead of only the changed ones")
+parser.add_argument("--report", action="store_true", help="compare the intersections per ray of every ordering in the software model")
+
+# Scene buffer addressing, from the hardware
+MAX_NUM_OBJS = parse_sv_params(proj_path / "hdl" / "constants.sv")["MAX_NUM_OBJS"]
+OBJ_IDX_WIDTH = (MAX_NUM_OBJS - 1).bit_length()
+NODE_IDX_WIDTH = OBJ_IDX_WIDTH + 1     # a binary tree over N leaves has < 2N nodes
+NODE_COUNT_WIDTH = 8
 
 class Material:
     def __init__(
@@ -84,6 +100,220 @@ class Object:
         return pack_bits(fields, msb=True), sum([width for _, width in fields])
 
 
+class BVHNode:
+    """
+    Bounding volume hierarchy node
+        Leaf (count > 0): objects [first, first + count) of the BVH object order
+        Internal (count == 0): children are nodes first and first + 1
+    """
+    def __init__(self, bbox_min: tuple[float], bbox_max: tuple[float], first: int = 0, count: int = 0):
+        self.bbox_min = bbox_min
+        self.bbox_max = bbox_max
+        self.first = first
+        self.count = count
+
+    @property
+    def is_leaf(self):
+        return self.count > 0
+
+    def pack_bits(self):
+        fields = [
+            (make_fp_vec3(self.bbox_min), FP_VEC3_BITS),
+            (make_fp_vec3(self.bbox_max), FP_VEC3_BITS),
+            (self.first, NODE_IDX_WIDTH),
+            (self.count, NODE_COUNT_WIDTH),
+        ]
+        return pack_bits(fields, msb=True), sum([width for _, width in fields])
+
+
+def object_bounds(obj: Object):
+    """
+    Axis-aligned (lo, hi) bounds of an object, None for planes (unbounded)
+    """
+    if obj.obj_type == 0:
+        rad = np.sqrt(obj.sphere_rad_sq)
+        center = np.asarray(obj.sphere_center, dtype=float)
+        return center - rad, center + rad
+
+    if obj.obj_type == 3:
+        return None
+
+    v0, v0v1, v0v2 = (np.asarray(v, dtype=float) for v in obj.trig)
+    corners = [v0, v0 + v0v1, v0 + v0v2]
+    if obj.obj_type == 2:
+        # Parallelogram
+        corners.append(v0 + v0v1 + v0v2)
+    return np.min(corners, axis=0), np.max(corners, axis=0)
+
+
+def _pad_bounds(lo: np.ndarray, hi: np.ndarray):
+    """
+    Grow bounds by an fp ulp so make_fp's round-to-nearest can't shrink them
+    """
+    mag = np.maximum(np.abs(lo), np.abs(hi))
+    ulp = np.exp2(np.floor(np.log2(np.maximum(mag, 2.0 ** -20))) - FP_MANT_BITS)
+    return lo - ulp, hi + ulp
+
+
+def _surface_area(lo: np.ndarray, hi: np.ndarray):
+    ext = np.maximum(hi - lo, 0)
+    return 2 * (ext[..., 0] * ext[..., 1] + ext[..., 1] * ext[..., 2] + ext[..., 2] * ext[..., 0])
+
+
+def build_bvh(objs: list[Object], leaf_size: int = 4, n_bins: int = 16):
+    """
+    Binned SAH bounding volume hierarchy over the scene buffer objects
+        Returns (nodes, order, n_unbounded):
+        order is the new object order, planes (n_unbounded of them, to be tested by
+        every ray) first, then every leaf's objects contiguously. Node 0 is the root.
+    """
+    bounds = [object_bounds(obj) for obj in objs]
+    unbounded = [idx for idx, b in enumerate(bounds) if b is None]
+    bounded = np.array([idx for idx, b in enumerate(bounds) if b is not None], dtype=int)
+
+    order = list(unbounded)
+    nodes = []
+    if len(bounded) == 0:
+        return nodes, order, len(unbounded)
+
+    lo = np.array([bounds[idx][0] for idx in bounded])
+    hi = np.array([bounds[idx][1] for idx in bounded])
+    centroid = (lo + hi) / 2
+    max_leaf = (1 << NODE_COUNT_WIDTH) - 1
+
+    def make_leaf(node: BVHNode, members: np.ndarray):
+        node.first = len(order)
+        node.count = len(members)
+        order.extend(bounded[members].tolist())
+
+    def split(node_idx: int, members: np.ndarray):
+        node = nodes[node_idx]
+        n = len(members)
+        if n <= leaf_size:
+            return make_leaf(node, members)
+
+        # Binned SAH: bucket centroids along each axis, try every bucket boundary
+        c_lo, c_hi = centroid[members].min(axis=0), centroid[members].max(axis=0)
+        best_cost, best_axis, best_bin = np.inf, None, None
+        for axis in range(3):
+            if c_hi[axis] <= c_lo[axis]:
+                continue
+            bins = ((centroid[members, axis] - c_lo[axis]) / (c_hi[axis] - c_lo[axis]) * n_bins).astype(int)
+            bins = np.minimum(bins, n_bins - 1)
+
+            for b in range(1, n_bins):
+                left = bins < b
+                n_left = np.count_nonzero(left)
+                if n_left == 0 or n_left == n:
+                    continue
+                cost = (
+                    n_left * _surface_area(lo[members[left]].min(axis=0), hi[members[left]].max(axis=0))
+                    + (n - n_left) * _surface_area(lo[members[~left]].min(axis=0), hi[members[~left]].max(axis=0))
+                )
+                if cost < best_cost:
+                    best_cost, best_axis, best_bin = cost, axis, b
+
+        leaf_cost = n * _surface_area(np.asarray(node.bbox_min), np.asarray(node.bbox_max))
+        if best_axis is None:
+            # All centroids coincide: halve by index if the leaf would overflow
+            if n <= max_leaf:
+                return make_leaf(node, members)
+            left = np.arange(n) < n // 2
+        elif best_cost >= leaf_cost and n <= max_leaf:
+            return make_leaf(node, members)
+        else:
+            bins = ((centroid[members, best_axis] - c_lo[best_axis]) / (c_hi[best_axis] - c_lo[best_axis]) * n_bins).astype(int)
+            left = np.minimum(bins, n_bins - 1) < best_bin
+
+        # Children are allocated next to each other
+        node.first = len(nodes)
+        for child in (members[left], members[~left]):
+            nodes.append(BVHNode(*_pad_bounds(lo[child].min(axis=0), hi[child].max(axis=0))))
+        split(node.first, members[left])
+        split(node.first + 1, members[~left])
+
+    members = np.arange(len(bounded))
+    nodes.append(BVHNode(*_pad_bounds(lo.min(axis=0), hi.max(axis=0))))
+    split(0, members)
+
+    for node in nodes:
+        node.bbox_min, node.bbox_max = tuple(node.bbox_min), tuple(node.bbox_max)
+    return nodes, order, len(unbounded)
+
+
+def _morton_codes(points: np.ndarray, bits: int = 10):
+    """
+    Interleave `bits` bits of each quantized coordinate, x in the LSB
+    """
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    q = ((points - lo) / np.where(hi > lo, hi - lo, 1) * ((1 << bits) - 1)).astype(np.int64)
+    codes = np.zeros(len(points), dtype=np.int64)
+    for bit in range(bits):
+        for axis in range(3):
+            codes |= ((q[:, axis] >> bit) & 1) << (3 * bit + axis)
+    return codes
+
+
+def order_objects(scene: dict, mode: str):
+    """
+    New scene buffer order (indices into scene["objects"]), unbounded planes first
+        area:   largest projected screen area first, objects behind the camera last
+        emit:   emitters (non-zero emit_color) first, otherwise unchanged
+        morton: Morton order of the object centers
+    """
+    assert mode in ORDERINGS, f"Unknown ordering {mode}"
+    objs = scene_objects(scene)
+    bounds = [object_bounds(obj) for obj in objs]
+
+    center = np.array([(b[0] + b[1]) / 2 if b is not None else (0, 0, 0) for b in bounds], dtype=float).reshape(-1, 3)
+    unbounded = np.array([b is None for b in bounds], dtype=bool)
+
+    if mode == "emit":
+        key = np.array([not any(scene["materials"][obj["material"]].get("emit_color", (0, 0, 0))) for obj in scene["objects"]], dtype=float)
+    elif mode == "morton":
+        key = _morton_codes(center) if len(objs) else np.zeros(0)
+    else:
+        # Projected radius ~ radius / depth, straddling the camera plane counts as everything
+        origin, forward, _, _ = camera_vectors(scene["camera"])
+        rad = np.array([np.linalg.norm(b[1] - b[0]) / 2 if b is not None else 0 for b in bounds])
+        depth = (center - np.asarray(origin)) @ (np.asarray(forward) / np.linalg.norm(forward))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            area = np.where(depth > rad, (rad / depth) ** 2, np.where(depth > -rad, np.inf, 0))
+        key = -area
+
+    # Planes before everything, including objects straddling the camera plane
+    return np.lexsort((key, ~unbounded)).tolist()
+
+
+def reorder_scene(scene: dict, order: list[int]):
+    """
+    Copy of the scene with its objects in the given order
+    """
+    return dict(scene, objects=[scene["objects"][idx] for idx in order])
+
+
+def report_orderings(scene: dict, width: int = 160, height: int = 90, samples: int = 1):
+    """
+    Intersections per ray of every ordering in the software model (sim/model), for
+        the linear sweep and for a sweep that could skip objects whose bounds lie
+        beyond the closest hit so far. Also the mean position of the closest hit.
+    """
+    from model.wavefront import Wavefront
+
+    print(f"{'order':>10} {'linear':>8} {'early-out':>10} {'until closest':>14}")
+    for mode in [None, *ORDERINGS]:
+        ordered = reorder_scene(scene, order_objects(scene, mode)) if mode else scene
+        wavefront = Wavefront(ordered, early_out=True)
+        wavefront.render(width, height, samples)
+
+        stats = wavefront.stats
+        n_rays = stats["rays"]
+        print(
+            f"{mode or 'original':>10} {stats['objects_tested'] / n_rays:8.1f} "
+            f"{stats['early_out_tested'] / n_rays:10.1f} {stats['objects_until_closest'] / n_rays:14.1f}"
+        )
+
+
 def build_material_dict(scene):
     """
     Build material dictionary from scene + deduplicates materials
@@ -106,14 +336,285 @@ def build_material_dict(scene):
     return mat_bits2idx, mat_name2idx, mat_width
 
 
-def export_scene(scene_file: str):
+def camera_vectors(camera: dict):
+    """
+    Camera (origin, forward, right, up) from a scene JSON's "camera",
+        with its pitch/yaw (radians) applied to forward/right/up, see Camera
+    """
+    return Camera.from_json(camera).vectors
+
+
+def scene_objects(scene: dict):
+    """
+    Object for every entry of the scene's "objects", with material indices resolved
+    """
+    _, mat_name2idx, _ = build_material_dict(scene)
+    return [
+        Object(**dict(obj, mat_idx=mat_name2idx[obj["material"]]))
+        for obj in scene["objects"]
+    ]
+
+
+# Bounces a software model follows max_bounces = 0 for
+UNLIMITED_BOUNCES = 256
+
+
+def bounce_limit(max_bounces: int):
+    """
+    Reflections ray_tracer.sv takes at most before a ray is done
+        `bounce_count >= max_bounces - 1` is evaluated 32 bits wide, so 0 never
+        stops on bounce count: models cap it at UNLIMITED_BOUNCES
+    """
+    max_bounces = int(max_bounces)
+    return max_bounces if max_bounces > 0 else UNLIMITED_BOUNCES
+
+
+def pack_scene(scene: dict):
+    """
+    Pack a scene into scene buffer and material dictionary words
+        Returns ([(obj_bits, obj_width)], [(mat_bits, mat_width)]), materials in index order
+    """
+    mat_bits2idx, _, mat_width = build_material_dict(scene)
+
+    obj_words = [obj.pack_bits() for obj in scene_objects(scene)]
+    mat_words = [
+        (mat_bits, mat_width)
+        for mat_bits, _ in sorted(mat_bits2idx.items(), key=lambda x: x[1])
+    ]
+    return obj_words, mat_words
+
+
+OBJ_BITS = 2 + 8 + 4 * FP_VEC3_BITS     # object struct width, sphere fields are padded to the trig's
+OBJ_BYTES = (OBJ_BITS + 7) // 8
+
+# Bump when the encoding changes so old manifests stop matching
+MANIFEST_VERSION = 1
+
+
+def pack_records(fields: list[tuple[np.ndarray, int]]):
+    """
+    Vectorized pack_bits(msb=True) for a whole column of words at once
+        fields: (values (N,) int array, width) pairs, first field in the MSBs
+        Returns an (N, n_bytes) uint8 array of the words, big-endian and zero padded
+        in the top byte, i.e. word.to_bytes(n_bytes, "big") for every row
+    """
+    width = sum(w for _, w in fields)
+    n_bytes = (width + 7) // 8
+    n_rows = len(fields[0][0])
+
+    bits = [np.zeros((n_rows, n_bytes * 8 - width), dtype=np.uint8)]
+    for values, w in fields:
+        assert w < 64, "pack_records fields must fit in an int64, split wider ones"
+        shifts = np.arange(w - 1, -1, -1, dtype=np.int64)
+        bits.append(((np.asarray(values, dtype=np.int64)[:, None] >> shifts) & 1).astype(np.uint8))
+
+    return np.packbits(np.concatenate(bits, axis=1), axis=1)
+
+
+def pack_objects_array(scene: dict):
+    """
+    Vectorized Object.pack_bits for every object of a scene
+        Returns an (N, OBJ_BYTES) uint8 array, see pack_records()
+    """
+    _, mat_name2idx, _ = build_material_dict(scene)
+    objs = scene["objects"]
+    n_objs = len(objs)
+
+    obj_type = np.array([obj.get("obj_type", 0) for obj in objs], dtype=np.int64)
+    mat_idx = np.array([mat_name2idx[obj["material"]] for obj in objs], dtype=np.int64)
+    has_trig = np.array([obj.get("trig") is not None for obj in objs])
+    trig = np.array([obj.get("trig") or ((0, 0, 0),) * 3 for obj in objs], dtype=float).reshape((n_objs, 3, 3))
+    center = np.array([obj.get("sphere_center") or (0, 0, 0) for obj in objs], dtype=float).reshape((n_objs, 3))
+    rad = np.array([obj.get("sphere_rad", 1) for obj in objs], dtype=float)
+
+    # Same arithmetic as Object.__init__, row by row
+    trig_norm = np.zeros((n_objs, 3))
+    if has_trig.any():
+        cross = np.cross(trig[has_trig, 1], trig[has_trig, 2])
+        trig_norm[has_trig] = cross / np.sqrt(np.sum(cross * cross, axis=1))[:, None]
+
+    # 12 fp slots after type/mat: v0, v0v1, v0v2, normal or center, rad_sq, rad_inv, zeros
+    trig_slots = np.concatenate([trig.reshape((n_objs, 9)), trig_norm], axis=1)
+    sphere_slots = np.concatenate([center, (rad ** 2)[:, None], (1 / rad)[:, None], np.zeros((n_objs, 7))], axis=1)
+    slots = make_fp_array(np.where((obj_type != 0)[:, None], trig_slots, sphere_slots))
+
+    return pack_records([
+        (obj_type, 2),
+        (mat_idx, 8),
+        *[(slots[:, idx], FP_BITS) for idx in range(12)],
+    ])
+
+
+def pack_materials_array(scene: dict):
+    """
+    Material dictionary words of a scene in index order, as an (N, n_bytes) uint8 array
+    """
+    mat_bits2idx, _, mat_width = build_material_dict(scene)
+    n_bytes = (mat_width + 7) // 8
+    mats = sorted(mat_bits2idx.items(), key=lambda x: x[1])
+    return np.frombuffer(
+        b"".join(mat_bits.to_bytes(n_bytes, "big") for mat_bits, _ in mats), dtype=np.uint8
+    ).reshape((len(mats), n_bytes))
+
+
+def _mem_lines(records: np.ndarray, width: int):
+    """
+    $readmemh lines of packed words, (N, line length) array of single bytes
+    """
+    n_rows, n_bytes = records.shape
+    n_hex_digits = (width + 3) // 4
+    digits = np.frombuffer(records.tobytes().hex().encode(), dtype="S1").reshape((n_rows, 2 * n_bytes))
+    return np.concatenate([digits[:, 2 * n_bytes - n_hex_digits:], np.full((n_rows, 1), b"\n")], axis=1)
+
+
+def write_mem(path, records: np.ndarray, width: int):
+    """
+    Write packed words (see pack_records()) as a $readmemh file, one word per line
+        with (width + 3) // 4 hex digits, same as hex(bits)[2:].zfill(...)
+    """
+    with open(path, "wb") as fout:
+        fout.write(_mem_lines(records, width).tobytes())
+
+
+def _update_rows(path, rows: np.ndarray, row_idxs: list[int], n_rows: int):
+    """
+    Overwrite some fixed-size rows of a file in place and cut it to n_rows rows
+    """
+    row_len = rows.shape[1]
+    with open(path, "r+b") as fout:
+        for row_idx, row in zip(row_idxs, rows):
+            fout.seek(row_idx * row_len)
+            fout.write(row.tobytes())
+        fout.truncate(n_rows * row_len)
+
+
+def update_mem(path, records: np.ndarray, width: int, row_idxs: list[int], n_rows: int):
+    """
+    Rewrite only the lines row_idxs of a write_mem() file, records holds their new words
+    """
+    _update_rows(path, _mem_lines(records, width), row_idxs, n_rows)
+
+
+def write_bin(path, records: np.ndarray):
+    """
+    Write packed words as raw back-to-back big-endian records, the same bytes the
+        flash commands carry, so the file can be uploaded or memory-mapped as is
+    """
+    np.ascontiguousarray(records, dtype=np.uint8).tofile(path)
+
+
+def update_bin(path, records: np.ndarray, row_idxs: list[int], n_rows: int):
+    """
+    Rewrite only the records row_idxs of a write_bin() file
+    """
+    _update_rows(path, np.ascontiguousarray(records, dtype=np.uint8), row_idxs, n_rows)
+
+
+def load_bin(path, width: int):
+    """
+    Memory-map a .bin written by write_bin(), (N, n_bytes) uint8
+    """
+    return np.memmap(path, dtype=np.uint8, mode="r").reshape((-1, (width + 7) // 8))
+
+
+def _content_hash(data: str):
+    return hashlib.blake2b(data.encode(), digest_size=8).hexdigest()
+
+
+def scene_manifest(scene: dict):
+    """
+    Content hashes of everything export_scene() / flash_scene.py encode
+        objects: per scene buffer index, hash of the object JSON and its material index
+        materials: per material name, its material dictionary index
+        mat_dict: per material dictionary index, hash of the material word
+    """
+    mat_bits2idx, mat_name2idx, mat_width = build_material_dict(scene)
+    return {
+        "version": MANIFEST_VERSION,
+        "obj_width": OBJ_BITS,
+        "mat_width": mat_width,
+        "objects": [
+            _content_hash(json.dumps([obj, mat_name2idx[obj["material"]]], sort_keys=True))
+            for obj in scene["objects"]
+        ],
+        "materials": mat_name2idx,
+        "mat_dict": [
+            _content_hash(hex(mat_bits))
+            for mat_bits, _ in sorted(mat_bits2idx.items(), key=lambda x: x[1])
+        ],
+    }
+
+
+def manifest_changes(old: dict, new: dict):
+    """
+    Scene buffer and material dictionary indices whose words differ from old to new
+        With no old manifest (or one of another format), every index has changed
+    """
+    if old is None or any(old.get(key) != new[key] for key in ["version", "obj_width", "mat_width"]):
+        return list(range(len(new["objects"]))), list(range(len(new["mat_dict"])))
+
+    def changed(old_hashes, new_hashes):
+        return [
+            idx for idx, new_hash in enumerate(new_hashes)
+            if idx >= len(old_hashes) or old_hashes[idx] != new_hash
+        ]
+
+    return changed(old["objects"], new["objects"]), changed(old["mat_dict"], new["mat_dict"])
+
+
+def load_manifest(path):
+    """
+    Manifest saved by save_manifest(), None if there is none
+    """
+    try:
+        with open(path) as fin:
+            return json.load(fin)
+    except FileNotFoundError:
+        return None
+
+
+def save_manifest(path, manifest: dict):
+    with open(path, "w") as fout:
+        json.dump(manifest, fout)
+
+
+# Files written by export_scene() whose contents the manifest records
+EXPORT_FILES = ["scene_buffer.mem", "scene_buffer.bin", "mat_dict.mem", "mat_dict.bin"]
+
+
+def _file_hashes(data_path: Path):
+    return {
+        name: hashlib.blake2b((data_path / name).read_bytes(), digest_size=8).hexdigest()
+        for name in EXPORT_FILES if (data_path / name).exists()
+    }
+
+
+def _export_matches(data_path: Path, manifest: dict):
+    """
+    Whether the exported files are still the ones written with a manifest
+        (nothing else has overwritten or edited them since)
+    """
+    files = manifest.get("files")
+    return files is not None and _file_hashes(data_path) == files
+
+
+def export_scene(scene_file: str, bvh: bool = False, leaf_size: int = 4, order: str = None, full: bool = False):
     """
     Export the JSON description of a scene to the .mem file
         For use in testbenching and initializing BRAM
+    With order, objects are reordered by order_objects() first
+    With bvh, objects are written in BVH order and the nodes go to bvh.mem
+    Next to every .mem goes a .bin of the same words as raw records, see write_bin()
+    scene_manifest.json records what was written and the hashes of the written files,
+        so the next export only rewrites the objects and materials that changed
+        (unless full, or the files no longer match)
     """
     with open(scene_file) as fin:
         scene = json.load(fin)
 
+    if order is not None:
+        scene = reorder_scene(scene, order_objects(scene, order))
+
     # Construct material dictionary
     mat_bits2idx, mat_name2idx, mat_width = build_material_dict(scene)
 
@@ -124,27 +625,49 @@ def export_scene(scene_file: str):
     for mat_bits, mat_idx in mat_bits2idx.items():
         print(mat_idx, hex(mat_bits))
 
+    if bvh:
+        nodes, order, n_unbounded = build_bvh(scene_objects(scene), leaf_size)
+        scene = reorder_scene(scene, order)
+
+        with open(str(proj_path / "data" / "bvh.mem"), "w") as fout:
+            for node in nodes:
+                bits, node_width = node.pack_bits()
+                n_hex_digits = (node_width + 3) // 4
+                fout.write(hex(bits)[2:].zfill(n_hex_digits) + "\n")
+
+        print(f"BVH node width: {node_width}" if nodes else "BVH is empty")
+        print(f"BVH: {len(nodes)} nodes, {sum(node.is_leaf for node in nodes)} leaves")
+        print(f"Unbounded objects (tested by every ray): {n_unbounded}")
+
+    # Only the words that changed since the last export are packed and rewritten
+    data_path = proj_path / "data"
+    manifest = scene_manifest(scene)
+    old_manifest = None if full else load_manifest(data_path / "scene_manifest.json")
+    if old_manifest is not None and not _export_matches(data_path, old_manifest):
+        old_manifest = None
+    obj_idxs, mat_idxs = manifest_changes(old_manifest, manifest)
+
     objs = scene["objects"]
-    obj_objs = []
-    for idx, obj in enumerate(objs):
-        obj["mat_idx"] = mat_name2idx[obj["material"]]
-        obj_objs.append(Object(**obj))
-    objs = obj_objs
-
-    with open(str(proj_path / "data" / "scene_buffer.mem"), "w") as fout:
-        for obj in objs:
-            bits, obj_width = obj.pack_bits()
-            n_hex_digits = (obj_width + 3) // 4
-            fout.write(hex(bits)[2:].zfill(n_hex_digits) + "\n")
-
-    with open(str(proj_path / "data" / "mat_dict.mem"), "w") as fout:
-        # Sort materials by index
-        mats = sorted(mat_bits2idx.items(), key=lambda x: x[1])
-        for mat_bits, _ in mats:
-            n_hex_digits = (mat_width + 3) // 4
-            fout.write(hex(mat_bits)[2:].zfill(n_hex_digits) + "\n")
-
-    print(f"Object width: {obj_width}")
+    obj_records = pack_objects_array(dict(scene, objects=[objs[idx] for idx in obj_idxs]))
+    mat_records = pack_materials_array(scene)[mat_idxs]
+    n_mats = len(manifest["mat_dict"])
+
+    if old_manifest is None:
+        write_mem(data_path / "scene_buffer.mem", obj_records, OBJ_BITS)
+        write_bin(data_path / "scene_buffer.bin", obj_records)
+        write_mem(data_path / "mat_dict.mem", mat_records, mat_width)
+        write_bin(data_path / "mat_dict.bin", mat_records)
+    else:
+        update_mem(data_path / "scene_buffer.mem", obj_records, OBJ_BITS, obj_idxs, len(objs))
+        update_bin(data_path / "scene_buffer.bin", obj_records, obj_idxs, len(objs))
+        update_mem(data_path / "mat_dict.mem", mat_records, mat_width, mat_idxs, n_mats)
+        update_bin(data_path / "mat_dict.bin", mat_records, mat_idxs, n_mats)
+
+    manifest["files"] = _file_hashes(data_path)
+    save_manifest(data_path / "scene_manifest.json", manifest)
+    print(f"Encoded {len(obj_idxs)}/{len(objs)} objects, {len(mat_idxs)}/{n_mats} materials")
+
+    print(f"Object width: {OBJ_BITS}")
     print(f"Scene buffer depth: {len(objs)}")
 
     print(f"Material width: {mat_width}")
@@ -153,4 +676,8 @@ def export_scene(scene_file: str):
 
 if __name__ == "__main__":
     args = parser.parse_args()
-    export_scene(args.scene)
+    if args.report:
+        with open(args.scene) as fin:
+            report_orderings(json.load(fin))
+    else:
+        export_scene(args.scene, args.bvh, args.leaf_size, args.order, args.full)
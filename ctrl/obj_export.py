@@ -8,6 +8,8 @@ import subprocess
 
 import matplotlib.pyplot as plt
 
+from camera import Camera
+
 def is_sphere(verts, threshold=0.1, outler_ratio=0.15):
     """
     Check if high # of unique vertices with low radii std deviation
@@ -158,16 +160,15 @@ quat = cam.matrix_world.to_quaternion()
 # Identity mapping: Blender XYZ = Raytracer XYZ
 axis = lambda v: quat @ mathutils.Vector(v)
 
-# Compute forward magnitude from horizontal FOV
+# Horizontal FOV (None for orthographic), the forward magnitude comes from Camera.from_fov
 aspect = 1280.0 / 720.0
 if cam.data.type == 'PERSP':
     angle, fit = cam.data.angle, cam.data.sensor_fit
     h_fov = angle if fit == 'HORIZONTAL' else (
         2 * math.atan(math.tan(angle/2) * aspect) if fit == 'VERTICAL'
         else angle if aspect >= 1 else 2 * math.atan(math.tan(angle/2) * aspect))
-    fwd_mag = 0.5 * 1280.0 / math.tan(h_fov / 2)
 else:
-    fwd_mag = 2560.0
+    h_fov = None
 
 # Get camera axes
 forward = axis((0, 0, -1))  # Camera viewing direction
@@ -177,15 +178,22 @@ right = axis((1, 0, 0))     # Camera right direction
 with open('/tmp/camera.json', 'w') as f:
     json.dump({
         'origin': [cam.matrix_world.translation.x, cam.matrix_world.translation.y, cam.matrix_world.translation.z],
-        'forward': [x * fwd_mag for x in forward],
-        'up': [x * 2 for x in up],
-        'right': [x * 2 for x in right],
-        'pitch': 0, 'yaw': 0
+        'forward': list(forward),
+        'up': list(up),
+        'right': list(right),
+        'h_fov': h_fov
     }, f)
 """], check=True)
 
     with open("/tmp/camera.json") as f:
-        camera = json.load(f)
+        blender_camera = json.load(f)
+        camera = Camera.from_fov(
+            blender_camera["origin"],
+            blender_camera["forward"],
+            blender_camera["right"],
+            blender_camera["up"],
+            h_fov=blender_camera["h_fov"],
+        ).to_json()
 
     with open("/tmp/materials.json") as f:
         blender_materials = json.load(f)
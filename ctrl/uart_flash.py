@@ -0,0 +1,453 @@
+"""
+uart_flash.py
+
+UART scene flashing, everything uart_memflash_rtx.sv understands, on both ends of the wire:
+
+    FlashStream      builds a whole command stream in one bytearray
+    build_stream()   the stream that flashes (part of) a scene
+    send_stream()    writes it to a serial port in large blocks and times it
+    CameraStreamer   rate-limited camera updates that only send changed vectors
+    MemflashDecoder  uart_memflash_rtx.sv's state machine, byte for byte
+                     (bursts come out as the idx/data writes they stand for)
+    FlashedScene     what top_level_rtx.sv latches from the decoder's writes
+    FakeFlashDevice  a pty that decodes whatever is written to it, for testing
+                     the client without an FPGA
+"""
+
+import os
+import sys
+import tty
+import time
+import threading
+from pathlib import Path
+
+import numpy as np
+
+proj_path = Path(__file__).resolve().parent.parent
+sys.path.append(str(proj_path / "sim"))
+
+from utils import FP_BITS, FP_VEC3_BITS
+from camera import Camera
+from make_scene_buffer import OBJ_BITS, OBJ_IDX_WIDTH, pack_materials_array, pack_objects_array
+
+# Commands, uart_memflash_rtx.sv / top_level_rtx.sv
+CMD_CAM_ORIGIN = 0x00
+CMD_CAM_FORWARD = 0x01
+CMD_CAM_RIGHT = 0x02
+CMD_CAM_UP = 0x03
+CMD_OBJ_IDX = 0x04
+CMD_OBJ_DATA = 0x05
+CMD_NUM_OBJS = 0x06
+CMD_MAX_BOUNCES = 0x07
+CMD_MAT_IDX = 0x08
+CMD_MAT_DATA = 0x09
+CMD_OBJ_BURST = 0x0A
+CMD_MAT_BURST = 0x0B
+
+MAT_BITS = 3 * FP_VEC3_BITS + FP_BITS + 8
+MAX_UART_DATA_BYTES = 128
+
+# Data bytes that follow each command byte
+CMD_BYTES = {
+    CMD_CAM_ORIGIN: (FP_VEC3_BITS + 7) // 8,
+    CMD_CAM_FORWARD: (FP_VEC3_BITS + 7) // 8,
+    CMD_CAM_RIGHT: (FP_VEC3_BITS + 7) // 8,
+    CMD_CAM_UP: (FP_VEC3_BITS + 7) // 8,
+    CMD_OBJ_IDX: (OBJ_IDX_WIDTH + 7) // 8,
+    CMD_OBJ_DATA: (OBJ_BITS + 7) // 8,
+    CMD_NUM_OBJS: (OBJ_IDX_WIDTH + 7) // 8,
+    CMD_MAX_BOUNCES: 1,
+    CMD_MAT_IDX: 1,
+    CMD_MAT_DATA: (MAT_BITS + 7) // 8,
+    # {first idx, count} headers, the count words follow
+    CMD_OBJ_BURST: 2 * ((OBJ_IDX_WIDTH + 7) // 8),
+    CMD_MAT_BURST: 2,
+}
+
+# Burst command -> (idx command, data command) it expands to
+BURSTS = {
+    CMD_OBJ_BURST: (CMD_OBJ_IDX, CMD_OBJ_DATA),
+    CMD_MAT_BURST: (CMD_MAT_IDX, CMD_MAT_DATA),
+}
+
+CAM_CMDS = [CMD_CAM_ORIGIN, CMD_CAM_FORWARD, CMD_CAM_RIGHT, CMD_CAM_UP]
+
+# 8N1 framing: start bit + 8 data bits + stop bit per byte
+UART_BITS_PER_BYTE = 10
+
+
+class FlashStream:
+    """
+    Command stream for uart_memflash_rtx, appended to a single bytearray
+        Every command is its byte followed by CMD_BYTES[cmd] big-endian data bytes
+    """
+    def __init__(self):
+        self.buf = bytearray()
+
+    def __len__(self):
+        return len(self.buf)
+
+    def command(self, cmd: int, data: bytes):
+        assert len(data) == CMD_BYTES[cmd], f"Command {cmd:#04x} takes {CMD_BYTES[cmd]} bytes, got {len(data)}"
+        self.buf.append(cmd)
+        self.buf += data
+
+    def set_camera(self, camera: Camera):
+        for cmd, word in zip(CAM_CMDS, camera.words):
+            self.command(cmd, word.to_bytes(CMD_BYTES[cmd], "big"))
+
+    def set_obj(self, obj_idx: int, obj_record: np.ndarray):
+        """
+        obj_record: packed object, see make_scene_buffer.pack_objects_array()
+        """
+        self.command(CMD_OBJ_IDX, obj_idx.to_bytes(CMD_BYTES[CMD_OBJ_IDX], "big"))
+        self.command(CMD_OBJ_DATA, obj_record.tobytes())
+
+    def set_num_objs(self, num_objs: int):
+        assert num_objs > 0, "Cannot set zero objects"
+        self.command(CMD_NUM_OBJS, num_objs.to_bytes(CMD_BYTES[CMD_NUM_OBJS], "big"))
+
+    def set_max_bounces(self, max_bounces: int):
+        self.command(CMD_MAX_BOUNCES, max_bounces.to_bytes(1, "big"))
+
+    def set_mat(self, mat_idx: int, mat_record: np.ndarray):
+        """
+        mat_record: packed material, see make_scene_buffer.pack_materials_array()
+        """
+        self.command(CMD_MAT_IDX, mat_idx.to_bytes(1, "big"))
+        self.command(CMD_MAT_DATA, mat_record.tobytes())
+
+    def burst(self, cmd: int, first_idx: int, records: np.ndarray):
+        """
+        Write consecutive words from first_idx on with burst commands, saving
+            the idx/data command framing of every word after the first
+        """
+        idx_cmd, data_cmd = BURSTS[cmd]
+        idx_bytes = CMD_BYTES[cmd] // 2
+        max_count = (1 << (8 * idx_bytes)) - 1
+        assert records.shape[1] == CMD_BYTES[data_cmd], f"Burst of {records.shape[1]}-byte words, expected {CMD_BYTES[data_cmd]}"
+
+        for offset in range(0, len(records), max_count):
+            chunk = records[offset:offset + max_count]
+            header = (first_idx + offset).to_bytes(idx_bytes, "big") + len(chunk).to_bytes(idx_bytes, "big")
+            self.command(cmd, header)
+            self.buf += np.ascontiguousarray(chunk, dtype=np.uint8).tobytes()
+
+    def set_objs(self, first_idx: int, obj_records: np.ndarray):
+        self.burst(CMD_OBJ_BURST, first_idx, obj_records)
+
+    def set_mats(self, first_idx: int, mat_records: np.ndarray):
+        self.burst(CMD_MAT_BURST, first_idx, mat_records)
+
+
+def consecutive_runs(idxs: list[int], merge: bool = True):
+    """
+    Split sorted indices into (first index, positions in idxs) runs of consecutive values
+        Without merge, every index is its own run
+    """
+    runs = []
+    for pos, idx in enumerate(idxs):
+        if merge and runs and idx == runs[-1][0] + len(runs[-1][1]):
+            runs[-1][1].append(pos)
+        else:
+            runs.append((idx, [pos]))
+    return runs
+
+
+def build_stream(scene: dict, obj_idxs: list[int], mat_idxs: list[int], burst: bool = True):
+    """
+    Whole flashing command stream for a scene: camera, the given materials and
+        objects, then num_objs and max_bounces
+    With burst, runs of consecutive indices go out as 0x0A / 0x0B bursts
+    """
+    stream = FlashStream()
+
+    stream.set_camera(Camera.from_json(scene["camera"]))
+
+    # Flash mat dict
+    mat_records = pack_materials_array(scene)[mat_idxs]
+    for first_idx, pos in consecutive_runs(mat_idxs, burst):
+        if len(pos) > 1:
+            stream.set_mats(first_idx, mat_records[pos])
+        else:
+            stream.set_mat(first_idx, mat_records[pos[0]])
+
+    # Flash objects
+    objs = scene["objects"]
+    obj_records = pack_objects_array(dict(scene, objects=[objs[idx] for idx in obj_idxs]))
+    for first_idx, pos in consecutive_runs(obj_idxs, burst):
+        if len(pos) > 1:
+            stream.set_objs(first_idx, obj_records[pos])
+        else:
+            stream.set_obj(first_idx, obj_records[pos[0]])
+
+    stream.set_num_objs(len(objs))
+    stream.set_max_bounces(int(scene["max_bounces"]))
+
+    return stream
+
+
+def theoretical_rate(baud: int):
+    """
+    Payload bytes per second a UART link can carry at this baud
+    """
+    return baud / UART_BITS_PER_BYTE
+
+
+def send_stream(ser, data: bytes, block_size: int = 4096):
+    """
+    Write a command stream in block_size slices (no copies, through a memoryview)
+        and wait for it to drain. Returns the elapsed seconds.
+    """
+    view = memoryview(data)
+    start = time.perf_counter()
+    for offset in range(0, len(view), block_size):
+        ser.write(view[offset:offset + block_size])
+    ser.flush()
+    return time.perf_counter() - start
+
+
+class CameraStreamer:
+    """
+    Camera updates over a UART link at a fixed tick rate
+        update() only records the newest Camera, tick()
+        sends the vectors whose fp24 words differ from what the FPGA holds.
+        While the link is still busy with the previous update tick() sends
+        nothing, and further update() calls replace (coalesce) the pending camera.
+    Link timing is modelled from the baud rate, so latencies are the time from
+        update() until the last byte of the update is on the wire
+    """
+    def __init__(self, ser, baud: int):
+        self.ser = ser
+        self.byte_rate = theoretical_rate(baud)
+
+        self.held = {}              # command -> fp_vec3 word the FPGA holds
+        self.pending = None
+        self.pending_since = None
+        self.link_free_at = 0.0
+
+        self.latencies = []
+        self.stats = dict(updates=0, coalesced=0, busy_ticks=0, sent_updates=0, sent_vectors=0, sent_bytes=0)
+
+    def update(self, camera: Camera, now: float = None):
+        now = time.perf_counter() if now is None else now
+        if self.pending is None:
+            self.pending_since = now
+        else:
+            self.stats["coalesced"] += 1
+        self.pending = camera
+        self.stats["updates"] += 1
+
+    def tick(self, now: float = None):
+        """
+        Send the pending camera if the link is free, returns the bytes sent
+        """
+        now = time.perf_counter() if now is None else now
+        if self.pending is None:
+            return 0
+        if now < self.link_free_at:
+            self.stats["busy_ticks"] += 1
+            return 0
+
+        stream = FlashStream()
+        for cmd, word in zip(CAM_CMDS, self.pending.words):
+            if self.held.get(cmd) != word:
+                stream.command(cmd, word.to_bytes(CMD_BYTES[cmd], "big"))
+                self.held[cmd] = word
+                self.stats["sent_vectors"] += 1
+
+        if len(stream):
+            self.ser.write(stream.buf)
+            self.link_free_at = now + len(stream) / self.byte_rate
+            self.stats["sent_updates"] += 1
+            self.stats["sent_bytes"] += len(stream)
+
+        self.latencies.append(max(self.link_free_at, now) - self.pending_since)
+        self.pending = None
+        return len(stream)
+
+    def report(self):
+        """
+        Summary of what was sent and the update latency the link sustained
+        """
+        stats = self.stats
+        bytes_per_update = stats["sent_bytes"] / max(stats["sent_updates"], 1)
+        full_update = len(CAM_CMDS) * (1 + CMD_BYTES[CMD_CAM_ORIGIN])
+        lines = [
+            f"{stats['updates']} camera updates, {stats['coalesced']} coalesced, {stats['busy_ticks']} ticks waited on the link",
+            f"{stats['sent_updates']} sent, {stats['sent_vectors']} vectors, {stats['sent_bytes']} bytes "
+            f"({bytes_per_update:.1f} B/update, {full_update} B for all four vectors)",
+            f"Link sustains {self.byte_rate / max(bytes_per_update, 1):.0f} updates/s at this mix, "
+            f"{self.byte_rate / full_update:.0f} updates/s of full cameras",
+        ]
+        if self.latencies:
+            latencies = np.array(self.latencies) * 1e3
+            lines.append(
+                f"Update latency: mean {latencies.mean():.2f} ms, p95 {np.percentile(latencies, 95):.2f} ms, "
+                f"max {latencies.max():.2f} ms"
+            )
+        return "\n".join(lines)
+
+
+class MemflashDecoder:
+    """
+    uart_memflash_rtx.sv, one received byte at a time
+        IDLE: the byte is a command, it picks how many data bytes follow
+        DATA: bytes shift into flash_data MSB first, the last one pulses flash_wen
+        BURST_DATA: after a burst header, every word pulses flash_wen as its
+            idx write then its data write
+    Unknown commands keep the previous command's length, like the HDL's casez
+    """
+    IDLE, DATA, BURST_DATA = range(3)
+
+    def __init__(self):
+        self.state = self.IDLE
+        self.byte_idx = 0
+        self.last_byte_idx = 0
+        self.flash_cmd = 0
+        self.flash_data = 0
+
+        self.burst_cmds = None
+        self.burst_idx = 0
+        self.burst_left = 0
+
+    def feed(self, data: bytes):
+        """
+        Returns the (flash_cmd, flash_data) of every flash_wen pulse
+        """
+        writes = []
+        for byte in data:
+            if self.state == self.IDLE:
+                if byte in CMD_BYTES:
+                    self.last_byte_idx = CMD_BYTES[byte] - 1
+                self.flash_cmd = byte
+                self.state = self.DATA
+                continue
+
+            self.flash_data = ((self.flash_data << 8) | byte) & ((1 << (MAX_UART_DATA_BYTES * 8)) - 1)
+            if self.byte_idx != self.last_byte_idx:
+                self.byte_idx += 1
+                continue
+            self.byte_idx = 0
+
+            if self.state == self.DATA and self.flash_cmd in BURSTS:
+                # Header: write the first index now, then take the words
+                idx_bits = 4 * CMD_BYTES[self.flash_cmd]
+                self.burst_cmds = BURSTS[self.flash_cmd]
+                self.burst_idx = (self.flash_data >> idx_bits) & ((1 << idx_bits) - 1)
+                self.burst_left = self.flash_data & ((1 << idx_bits) - 1)
+                self.last_byte_idx = CMD_BYTES[self.burst_cmds[1]] - 1
+
+                self.flash_cmd, self.flash_data = self.burst_cmds[0], self.burst_idx
+                if self.burst_left:
+                    writes.append((self.flash_cmd, self.flash_data))
+                    self.state = self.BURST_DATA
+                else:
+                    self.state = self.IDLE
+
+            elif self.state == self.BURST_DATA:
+                idx_cmd, data_cmd = self.burst_cmds
+                writes.append((data_cmd, self.flash_data))
+                self.burst_idx = (self.burst_idx + 1) & 0xFFFF
+                self.burst_left -= 1
+
+                if self.burst_left:
+                    # BURST_IDX: next word's index
+                    self.flash_cmd, self.flash_data = idx_cmd, self.burst_idx
+                    writes.append((self.flash_cmd, self.flash_data))
+                else:
+                    self.flash_cmd = data_cmd
+                    self.state = self.IDLE
+
+            else:
+                writes.append((self.flash_cmd, self.flash_data))
+                self.state = self.IDLE
+
+        return writes
+
+
+class FlashedScene:
+    """
+    Registers and memories top_level_rtx.sv updates on flash_wen
+        Widths are truncated the same way as the SystemVerilog assignments
+    """
+    def __init__(self):
+        self.cam = {}
+        self.objs = {}
+        self.mats = {}
+        self.obj_idx = 0
+        self.mat_idx = 0
+        self.num_objs = None
+        self.max_bounces = None
+        self.n_writes = 0
+
+    def apply(self, cmd: int, data: int):
+        self.n_writes += 1
+        if cmd in (CMD_CAM_ORIGIN, CMD_CAM_FORWARD, CMD_CAM_RIGHT, CMD_CAM_UP):
+            name = ["origin", "forward", "right", "up"][cmd]
+            self.cam[name] = data & ((1 << FP_VEC3_BITS) - 1)
+        elif cmd == CMD_OBJ_IDX:
+            self.obj_idx = data & ((1 << OBJ_IDX_WIDTH) - 1)
+        elif cmd == CMD_OBJ_DATA:
+            self.objs[self.obj_idx] = data & ((1 << OBJ_BITS) - 1)
+        elif cmd == CMD_NUM_OBJS:
+            self.num_objs = data & ((1 << OBJ_IDX_WIDTH) - 1)
+        elif cmd == CMD_MAX_BOUNCES:
+            self.max_bounces = data & 0xFF
+        elif cmd == CMD_MAT_IDX:
+            self.mat_idx = data & 0xFF
+        elif cmd == CMD_MAT_DATA:
+            self.mats[self.mat_idx] = data & ((1 << MAT_BITS) - 1)
+
+
+class FakeFlashDevice:
+    """
+    Pseudo-terminal standing in for the FPGA's UART: open .port with the client
+        (e.g. serial.Serial(device.port)) and everything written to it is decoded
+        on a background thread into .scene
+    """
+    def __init__(self):
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+
+        self.decoder = MemflashDecoder()
+        self.scene = FlashedScene()
+        self.n_bytes = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                data = os.read(self.master_fd, 1 << 16)
+            except OSError:
+                return
+            if not data:
+                return
+            with self._lock:
+                self.n_bytes += len(data)
+                for cmd, flash_data in self.decoder.feed(data):
+                    self.scene.apply(cmd, flash_data)
+
+    def wait(self, n_bytes: int, timeout: float = 10):
+        """
+        Block until n_bytes in total were received
+        """
+        deadline = time.monotonic() + timeout
+        while self.n_bytes < n_bytes:
+            assert time.monotonic() < deadline, f"Fake device got {self.n_bytes}/{n_bytes} bytes"
+            time.sleep(0.001)
+
+    def close(self):
+        # Reads on the master fail once the slave side is gone, ending the thread
+        os.close(self.slave_fd)
+        self._thread.join(timeout=1)
+        os.close(self.master_fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,169 @@
+`default_nettype none
+
+// pixel_sequencer for N_CORES ray tracers: walks the same pixel range, hands the
+// next pixel to the lowest idle core every cycle and collects the results, tagged
+// with their pixel and core, in a result buffer drained by the testbench
+//
+// A finished core holds its result until the buffer takes it (one write per
+// cycle), and pixels are only issued while every ray in flight has a free entry
+// waiting for it, so a full buffer never drops results.
+
+module pixel_dispatcher #(
+  parameter integer N_CORES = 2,
+  parameter integer RESULT_BITS = 16,
+  parameter integer RESULT_DEPTH = 2048
+) (
+  input wire clk,
+  input wire rst,
+
+  // Single-cycle start, range held until done (same as pixel_sequencer)
+  input wire start,
+  input wire [10:0] h_lo,
+  input wire [10:0] h_hi,
+  input wire [10:0] h_first,
+  input wire [9:0] v_first,
+  input wire [10:0] h_last,
+  input wire [9:0] v_last,
+  input wire [15:0] n_passes,
+
+  // Core interface
+  output logic [N_CORES-1:0][10:0] pixel_h,
+  output logic [N_CORES-1:0][9:0] pixel_v,
+  output logic [N_CORES-1:0] new_ray,
+  input wire [N_CORES-1:0] ray_done,
+  input wire [N_CORES-1:0][RESULT_BITS-1:0] result_in,  // valid with ray_done
+
+  // Result buffer of {pixel_h, pixel_v, core, result}, read out through results[0 .. count - 1]
+  input wire drain,               // single-cycle, empties the buffer
+  output logic [$clog2(RESULT_DEPTH+1)-1:0] count,
+  output logic busy,
+  output logic done,              // every pass finished, held until the next start
+  output logic ready              // full or done: time to drain
+);
+  localparam integer ENTRY_BITS = 11 + 10 + 8 + RESULT_BITS;
+
+  logic [ENTRY_BITS-1:0] results [RESULT_DEPTH];
+
+  // Next pixel to hand out
+  logic walking;
+  logic [10:0] next_h;
+  logic [9:0] next_v;
+  logic [15:0] pass;
+  logic started;
+
+  logic last_pixel;
+  assign last_pixel = next_h == h_last && next_v == v_last;
+
+  // Per core: ray in flight, or finished and waiting for the buffer
+  logic [N_CORES-1:0] core_busy;
+  logic [N_CORES-1:0] pending;
+  logic [N_CORES-1:0][ENTRY_BITS-1:0] pending_entry;
+
+  // Lowest core waiting to be written, lowest idle core, rays not in the buffer yet
+  logic write_any, writing, issue_any;
+  logic [7:0] write_core, issue_core;
+  logic [$clog2(RESULT_DEPTH+1)-1:0] outstanding;
+
+  always_comb begin
+    write_any = 1'b0;
+    write_core = 0;
+    outstanding = 0;
+
+    for (int i = N_CORES - 1; i >= 0; i--) begin
+      if (pending[i]) begin
+        write_any = 1'b1;
+        write_core = i;
+      end
+      outstanding = outstanding + core_busy[i] + pending[i];
+    end
+
+    // A core whose result goes into the buffer this cycle can take the next pixel
+    // right away, so one core issues on the same cycles as pixel_sequencer
+    writing = write_any && !drain;
+
+    issue_any = 1'b0;
+    issue_core = 0;
+    for (int i = N_CORES - 1; i >= 0; i--) begin
+      if (!core_busy[i] && (!pending[i] || (writing && write_core == i))) begin
+        issue_any = 1'b1;
+        issue_core = i;
+      end
+    end
+  end
+
+  assign busy = walking || outstanding != 0;
+  assign ready = count == RESULT_DEPTH || done;
+
+  always_ff @(posedge clk) begin
+    if (rst) begin
+      walking <= 1'b0;
+      started <= 1'b0;
+      core_busy <= 0;
+      pending <= 0;
+      new_ray <= 0;
+      done <= 1'b0;
+      count <= 0;
+      pass <= 0;
+
+    end else begin
+      new_ray <= 0;
+
+      // Latch finished rays with their tags
+      for (int i = 0; i < N_CORES; i++) begin
+        if (ray_done[i] && core_busy[i]) begin
+          core_busy[i] <= 1'b0;
+          pending[i] <= 1'b1;
+          pending_entry[i] <= {pixel_h[i], pixel_v[i], 8'(i), result_in[i]};
+        end
+      end
+
+      // One finished ray into the buffer per cycle
+      if (drain) begin
+        count <= 0;
+      end else if (writing) begin
+        results[count] <= pending_entry[write_core];
+        pending[write_core] <= 1'b0;
+        count <= count + 1;
+      end
+
+      if (start) begin
+        walking <= 1'b1;
+        started <= 1'b1;
+        next_h <= h_first;
+        next_v <= v_first;
+        pass <= 0;
+        count <= 0;
+        done <= 1'b0;
+
+      end else if (walking && issue_any && count + outstanding < RESULT_DEPTH) begin
+        // Hand the next pixel to an idle core
+        pixel_h[issue_core] <= next_h;
+        pixel_v[issue_core] <= next_v;
+        new_ray[issue_core] <= 1'b1;
+        core_busy[issue_core] <= 1'b1;
+
+        if (last_pixel) begin
+          if (pass == n_passes - 1) begin
+            walking <= 1'b0;
+          end else begin
+            pass <= pass + 1;
+            next_h <= h_first;
+            next_v <= v_first;
+          end
+        end else if (next_h == h_hi) begin
+          next_h <= h_lo;
+          next_v <= next_v + 1;
+        end else begin
+          next_h <= next_h + 1;
+        end
+
+      end else if (started && !walking && outstanding == 0) begin
+        // Last result is in the buffer
+        started <= 1'b0;
+        done <= 1'b1;
+      end
+    end
+  end
+endmodule
+
+`default_nettype wire
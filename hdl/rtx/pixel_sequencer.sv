@@ -0,0 +1,121 @@
+`default_nettype none
+
+// Walks a pixel range by itself, one ray at a time, and collects the results
+// in an on-chip buffer so a testbench only has to step in to drain it
+//
+// Pixels go row by row from (h_first, v_first) to (h_last, v_last), wrapping from
+// h_hi back to h_lo: a tile is h_lo = h_first, h_hi = h_last, a contiguous run of
+// pixels is h_lo = 0, h_hi = WIDTH - 1. The whole range is walked n_passes times.
+// When the buffer is full the sequencer stalls until drain empties it.
+
+module pixel_sequencer #(
+  parameter integer RESULT_BITS = 16,
+  parameter integer RESULT_DEPTH = 2048
+) (
+  input wire clk,
+  input wire rst,
+
+  // Single-cycle start, range held until done
+  input wire start,
+  input wire [10:0] h_lo,
+  input wire [10:0] h_hi,
+  input wire [10:0] h_first,
+  input wire [9:0] v_first,
+  input wire [10:0] h_last,
+  input wire [9:0] v_last,
+  input wire [15:0] n_passes,
+
+  // Ray interface
+  output logic [10:0] pixel_h,
+  output logic [9:0] pixel_v,
+  output logic new_ray,
+  input wire ray_done,
+  input wire [RESULT_BITS-1:0] result_in,
+
+  // Result buffer, read out through results[0 .. count - 1]
+  input wire drain,               // single-cycle, empties the buffer
+  output logic [$clog2(RESULT_DEPTH+1)-1:0] count,
+  output logic busy,
+  output logic done,              // every pass finished, held until the next start
+  output logic ready              // full or done: time to drain
+);
+  typedef enum { IDLE, ISSUE, WAIT } seq_state;
+  seq_state state;
+
+  logic [RESULT_BITS-1:0] results [RESULT_DEPTH];
+  logic [15:0] pass;
+
+  logic last_pixel;
+  assign last_pixel = pixel_h == h_last && pixel_v == v_last;
+
+  assign busy = state != IDLE;
+  assign ready = count == RESULT_DEPTH || done;
+
+  always_ff @(posedge clk) begin
+    if (rst) begin
+      state <= IDLE;
+      new_ray <= 1'b0;
+      done <= 1'b0;
+      count <= 0;
+      pass <= 0;
+
+    end else begin
+      if (drain) begin
+        count <= 0;
+      end
+
+      case (state)
+        IDLE: begin
+          new_ray <= 1'b0;
+
+          if (start) begin
+            pixel_h <= h_first;
+            pixel_v <= v_first;
+            pass <= 0;
+            count <= 0;
+            done <= 1'b0;
+            state <= ISSUE;
+          end
+        end
+        ISSUE: begin
+          // Stall while the buffer is full
+          if (count < RESULT_DEPTH) begin
+            new_ray <= 1'b1;
+            state <= WAIT;
+          end
+        end
+        WAIT: begin
+          new_ray <= 1'b0;
+
+          if (ray_done) begin
+            results[count] <= result_in;
+            count <= count + 1;
+
+            if (last_pixel) begin
+              if (pass == n_passes - 1) begin
+                done <= 1'b1;
+                state <= IDLE;
+              end else begin
+                pass <= pass + 1;
+                pixel_h <= h_first;
+                pixel_v <= v_first;
+                state <= ISSUE;
+              end
+
+            end else begin
+              if (pixel_h == h_hi) begin
+                pixel_h <= h_lo;
+                pixel_v <= pixel_v + 1;
+              end else begin
+                pixel_h <= pixel_h + 1;
+              end
+              state <= ISSUE;
+            end
+          end
+        end
+      endcase
+    end
+  end
+endmodule
+
+`default_nettype wire
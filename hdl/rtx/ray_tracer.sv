@@ -31,7 +31,12 @@ module ray_tracer #(
   input wire [7:0] max_bounces,
 
   // DEBUG: to be used only for testbench
-  input wire [95:0] lfsr_seed
+  input wire [95:0] lfsr_seed,
+
+  // DEBUG: per-ray statistics, held from ray_done until the next ray starts
+  output logic [31:0] stat_intx_cycles,
+  output logic [31:0] stat_reflect_cycles,
+  output logic [7:0] stat_bounces
 );
   typedef enum { IDLE, INTX, REFLECT } tracer_state;
 
@@ -68,6 +73,9 @@ module ray_tracer #(
       ray_valid_intx <= 1'b0;
       ray_done <= 1'b0;
       bounce_count <= 0;
+      stat_intx_cycles <= 0;
+      stat_reflect_cycles <= 0;
+      stat_bounces <= 0;
 
     end else begin
       // three-state FSM wahoo
@@ -91,10 +99,15 @@ module ray_tracer #(
             // Trigger the intersector
             ray_valid_intx <= 1'b1;
             state <= INTX;
+
+            stat_intx_cycles <= 0;
+            stat_reflect_cycles <= 0;
+            stat_bounces <= 0;
           end
         end
         INTX: begin
           ray_valid_intx <= 1'b0;
+          stat_intx_cycles <= stat_intx_cycles + 1;
 
           if (ray_done_intx) begin
             if (intx_hit_any) begin
@@ -112,8 +125,11 @@ module ray_tracer #(
         end
         REFLECT: begin
           ray_valid_rflx <= 1'b0;
+          stat_reflect_cycles <= stat_reflect_cycles + 1;
 
           if (ray_done_reflect) begin
+            stat_bounces <= stat_bounces + 1;
+
             // Latch reflector values and keep going
             cur_ray_dir <= rflx_new_dir;
             cur_ray_origin <= rflx_new_origin;    // ??
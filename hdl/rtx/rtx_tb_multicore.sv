@@ -0,0 +1,221 @@
+`default_nettype none
+
+// Testbench for N_CORES ray tracers rendering one frame together
+// One scene_buffer sweep is broadcast to every tracer (the intersector takes
+// any num_objs consecutive objects), each core gets its own ray_maker, material
+// dictionary copy and LFSR seed, and pixel_dispatcher hands pixels to whichever
+// core is idle and collects the tagged results in its buffer (seq_* ports)
+
+module rtx_tb_multicore #(
+  parameter WIDTH = 1280,
+  parameter HEIGHT = 720,
+  parameter SCENE_INIT_FILE = "scene_buffer.mem",
+  parameter MAT_INIT_FILE = "mat_dict.mem",
+  parameter N_CORES = 4,
+  parameter RESULT_DEPTH = 2048
+) (
+  input wire clk,
+  input wire rst,
+  input camera cam,
+  input wire [$clog2(MAX_NUM_OBJS)-1:0] num_objs,
+  input wire [7:0] max_bounces,
+
+  // Pixel dispatcher, see pixel_dispatcher.sv
+  input wire seq_start,
+  input wire [10:0] seq_h_lo,
+  input wire [10:0] seq_h_hi,
+  input wire [10:0] seq_h_first,
+  input wire [9:0] seq_v_first,
+  input wire [10:0] seq_h_last,
+  input wire [9:0] seq_v_last,
+  input wire [15:0] seq_passes,
+  input wire seq_drain,
+  output logic [$clog2(RESULT_DEPTH+1)-1:0] seq_count,
+  output logic seq_done,
+  output logic seq_ready,
+
+  // Scene buffer / material dictionary flashing, material writes go to every core
+  input wire flash_obj_wen,
+  input wire [OBJ_IDX_WIDTH-1:0] flash_obj_idx,
+  input wire [$bits(object)-1:0] flash_obj_data,
+
+  input wire flash_mat_wen,
+  input wire [7:0] flash_mat_idx,
+  input wire [$bits(material)-1:0] flash_mat_data,
+
+  // DEBUG: to be used only for testbench, one nonzero seed per core
+  input wire [N_CORES-1:0][95:0] lfsr_seeds,
+
+  // Cores with a ray in flight
+  output logic [N_CORES-1:0] cores_busy
+);
+  // rtx_pixel + RAY_STATS in sim/ray_stats.py order
+  localparam integer RESULT_BITS = 16 + 32 + 8 + 32 + 32;
+
+  object obj;
+
+  scene_buffer #(.INIT_FILE(SCENE_INIT_FILE)) scene_buf (
+    .clk(clk),
+    .rst(rst),
+    .num_objs(num_objs),
+    .obj(obj),
+
+    .flash_obj_wen(flash_obj_wen),
+    .flash_obj_idx(flash_obj_idx),
+    .flash_obj_data(flash_obj_data)
+  );
+
+  logic [N_CORES-1:0][10:0] core_pixel_h;
+  logic [N_CORES-1:0][9:0] core_pixel_v;
+  logic [N_CORES-1:0] core_new_ray;
+  logic [N_CORES-1:0] core_ray_done;
+  logic [N_CORES-1:0][RESULT_BITS-1:0] core_result;
+
+  generate
+    for (genvar c = 0; c < N_CORES; c++) begin : core
+      logic [7:0] mat_dict_idx;
+      material mat_dict_mat;
+
+      logic [10:0] pixel_h_caster;
+      logic [9:0] pixel_v_caster;
+
+      fp_vec3 ray_origin, ray_dir;
+      logic ray_valid_caster;
+
+      // material_dictionary has a single read port, so every core gets a copy
+      material_dictionary #(.INIT_FILE(MAT_INIT_FILE)) mat_dict (
+        .clk(clk),
+        .rst(rst),
+
+        .flash_mat_wen(flash_mat_wen),
+        .flash_mat_idx(flash_mat_idx),
+        .flash_mat_data(flash_mat_data),
+
+        .mat_idx(mat_dict_idx),
+        .mat(mat_dict_mat)
+      );
+
+      ray_maker #(
+        .WIDTH(WIDTH),
+        .HEIGHT(HEIGHT)
+      ) maker (
+        .clk(clk),
+        .rst(rst),
+
+        // Inputs
+        .cam(cam),
+        .pixel_h_in(core_pixel_h[c]),
+        .pixel_v_in(core_pixel_v[c]),
+        .ray_origin(ray_origin),
+        .ray_dir(ray_dir),
+        .ray_valid(ray_valid_caster),
+        .new_ray(core_new_ray[c]),
+
+        // Outputs
+        .pixel_h_out(pixel_h_caster),
+        .pixel_v_out(pixel_v_caster),
+
+        .lfsr_seed(lfsr_seeds[c])
+      );
+
+      logic ray_done_tracer;
+      fp_color pixel_color;
+      logic [31:0] stat_cycles, stat_intx_cycles, stat_reflect_cycles;
+      logic [7:0] stat_bounces;
+      logic [15:0] rtx_pixel;
+
+      ray_tracer #(
+        .WIDTH(WIDTH),
+        .HEIGHT(HEIGHT)
+      ) tracer (
+        .clk(clk),
+        .rst(rst),
+
+        // Input
+        .pixel_h_in(pixel_h_caster),
+        .pixel_v_in(pixel_v_caster),
+        .ray_origin(ray_origin),
+        .ray_dir(ray_dir),
+        .ray_valid(ray_valid_caster),
+
+        .lfsr_seed(lfsr_seeds[c]),
+
+        .ray_done(ray_done_tracer),
+        .pixel_color(pixel_color),
+
+        .max_bounces(max_bounces),
+
+        // Shared scene buffer sweep
+        .num_objs(num_objs),
+        .obj(obj),
+
+        .mat_dict_idx(mat_dict_idx),
+        .mat_dict_mat(mat_dict_mat),
+
+        .stat_intx_cycles(stat_intx_cycles),
+        .stat_reflect_cycles(stat_reflect_cycles),
+        .stat_bounces(stat_bounces)
+      );
+
+      // Count cycles from new_ray until ray_done goes high
+      logic ray_busy;
+      always_ff @(posedge clk) begin
+        if (rst) begin
+          ray_busy <= 1'b0;
+          stat_cycles <= 0;
+        end else if (core_new_ray[c]) begin
+          ray_busy <= 1'b1;
+          stat_cycles <= 0;
+        end else if (ray_busy) begin
+          stat_cycles <= stat_cycles + 1;
+          if (ray_done_tracer) ray_busy <= 1'b0;
+        end
+      end
+      assign cores_busy[c] = ray_busy;
+
+      // Convert to 565 representation
+      convert_fp_uint #(.WIDTH(5), .FRAC(5)) r_convert (.clk(clk), .x(pixel_color.r), .n(rtx_pixel[4:0]));
+      convert_fp_uint #(.WIDTH(6), .FRAC(6)) g_convert (.clk(clk), .x(pixel_color.g), .n(rtx_pixel[10:5]));
+      convert_fp_uint #(.WIDTH(5), .FRAC(5)) b_convert (.clk(clk), .x(pixel_color.b), .n(rtx_pixel[15:11]));
+
+      // Delay ray_done by 1 cycle for the conversion
+      pipeline #(.WIDTH(1), .DEPTH(1)) ray_done_pipe (.clk(clk), .in(ray_done_tracer), .out(core_ray_done[c]));
+
+      assign core_result[c] = {rtx_pixel, stat_cycles, stat_bounces, stat_intx_cycles, stat_reflect_cycles};
+    end
+  endgenerate
+
+  // Results tagged with their pixel and core
+  pixel_dispatcher #(
+    .N_CORES(N_CORES),
+    .RESULT_BITS(RESULT_BITS),
+    .RESULT_DEPTH(RESULT_DEPTH)
+  ) seq (
+    .clk(clk),
+    .rst(rst),
+
+    .start(seq_start),
+    .h_lo(seq_h_lo),
+    .h_hi(seq_h_hi),
+    .h_first(seq_h_first),
+    .v_first(seq_v_first),
+    .h_last(seq_h_last),
+    .v_last(seq_v_last),
+    .n_passes(seq_passes),
+
+    .pixel_h(core_pixel_h),
+    .pixel_v(core_pixel_v),
+    .new_ray(core_new_ray),
+    .ray_done(core_ray_done),
+    .result_in(core_result),
+
+    .drain(seq_drain),
+    .count(seq_count),
+    .busy(),
+    .done(seq_done),
+    .ready(seq_ready)
+  );
+
+endmodule
+
+`default_nettype wire
@@ -2,10 +2,17 @@
 
 // Testbench for rtx
 // All this does is wrap rtx but provide scene buffer as well
+// Set SCENE_INIT_FILE/MAT_INIT_FILE to "" and write the scene through the flash ports
+// at runtime so one binary can render any scene
+// Pixels come either one at a time from pixel_h_in/pixel_v_in/new_ray, or from
+// pixel_sequencer walking a whole range into its result buffer (seq_* ports)
 
 module rtx_tb_parallel #(
   parameter WIDTH = 1280,
-  parameter HEIGHT = 720
+  parameter HEIGHT = 720,
+  parameter SCENE_INIT_FILE = "scene_buffer.mem",
+  parameter MAT_INIT_FILE = "mat_dict.mem",
+  parameter RESULT_DEPTH = 2048
 ) (
   input wire clk,
   input wire rst,
@@ -17,11 +24,40 @@ module rtx_tb_parallel #(
   input wire [9:0] pixel_v_in,
   input wire new_ray,
 
+  // Pixel sequencer, see pixel_sequencer.sv
+  input wire seq_start,
+  input wire [10:0] seq_h_lo,
+  input wire [10:0] seq_h_hi,
+  input wire [10:0] seq_h_first,
+  input wire [9:0] seq_v_first,
+  input wire [10:0] seq_h_last,
+  input wire [9:0] seq_v_last,
+  input wire [15:0] seq_passes,
+  input wire seq_drain,
+  output logic [$clog2(RESULT_DEPTH+1)-1:0] seq_count,
+  output logic seq_done,
+  output logic seq_ready,
+
+  // Scene buffer / material dictionary flashing
+  input wire flash_obj_wen,
+  input wire [OBJ_IDX_WIDTH-1:0] flash_obj_idx,
+  input wire [$bits(object)-1:0] flash_obj_data,
+
+  input wire flash_mat_wen,
+  input wire [7:0] flash_mat_idx,
+  input wire [$bits(material)-1:0] flash_mat_data,
+
   output logic [15:0] rtx_pixel,
   output logic ray_done,
 
   // DEBUG: to be used only for testbench
-  input wire [95:0] lfsr_seed
+  input wire [95:0] lfsr_seed,
+
+  // Per-ray statistics of the last finished ray, valid with ray_done
+  output logic [31:0] stat_cycles,          // new_ray to ray_done
+  output logic [31:0] stat_intx_cycles,     // cycles the tracer spent in INTX
+  output logic [31:0] stat_reflect_cycles,  // cycles the tracer spent in REFLECT
+  output logic [7:0] stat_bounces           // reflections taken
 );
   object obj;
   logic [7:0] mat_dict_idx;
@@ -33,18 +69,35 @@ module rtx_tb_parallel #(
   fp_vec3 ray_origin, ray_dir;
   logic ray_valid_caster;
 
+  // Rays from the ports, or from the sequencer while it runs
+  logic [10:0] seq_pixel_h, maker_pixel_h;
+  logic [9:0] seq_pixel_v, maker_pixel_v;
+  logic seq_new_ray, seq_busy;
+
+  assign maker_pixel_h = seq_busy ? seq_pixel_h : pixel_h_in;
+  assign maker_pixel_v = seq_busy ? seq_pixel_v : pixel_v_in;
+
   // Initialize scene buffer
   // Bind inputs to ray tracer
-  scene_buffer #(.INIT_FILE("scene_buffer.mem")) scene_buf (
+  scene_buffer #(.INIT_FILE(SCENE_INIT_FILE)) scene_buf (
     .clk(clk),
     .rst(rst),
     .num_objs(num_objs),
-    .obj(obj)
+    .obj(obj),
+
+    .flash_obj_wen(flash_obj_wen),
+    .flash_obj_idx(flash_obj_idx),
+    .flash_obj_data(flash_obj_data)
   );
 
-  material_dictionary #(.INIT_FILE("mat_dict.mem")) mat_dict (
+  material_dictionary #(.INIT_FILE(MAT_INIT_FILE)) mat_dict (
     .clk(clk),
     .rst(rst),
+
+    .flash_mat_wen(flash_mat_wen),
+    .flash_mat_idx(flash_mat_idx),
+    .flash_mat_data(flash_mat_data),
+
     .mat_idx(mat_dict_idx),
     .mat(mat_dict_mat)
   );
@@ -58,12 +111,12 @@ module rtx_tb_parallel #(
 
     // Inputs
     .cam(cam),
-    .pixel_h_in(pixel_h_in),
-    .pixel_v_in(pixel_v_in),
+    .pixel_h_in(maker_pixel_h),
+    .pixel_v_in(maker_pixel_v),
     .ray_origin(ray_origin),
     .ray_dir(ray_dir),
     .ray_valid(ray_valid_caster),
-    .new_ray(new_ray),
+    .new_ray(new_ray || seq_new_ray),
 
     // Outputs
     .pixel_h_out(pixel_h_caster),
@@ -105,9 +158,28 @@ module rtx_tb_parallel #(
 
     // Material dictionary interface
     .mat_dict_idx(mat_dict_idx),
-    .mat_dict_mat(mat_dict_mat)
+    .mat_dict_mat(mat_dict_mat),
+
+    .stat_intx_cycles(stat_intx_cycles),
+    .stat_reflect_cycles(stat_reflect_cycles),
+    .stat_bounces(stat_bounces)
   );
 
+  // Count cycles from new_ray until ray_done goes high
+  logic ray_busy;
+  always_ff @(posedge clk) begin
+    if (rst) begin
+      ray_busy <= 1'b0;
+      stat_cycles <= 0;
+    end else if (new_ray || seq_new_ray) begin
+      ray_busy <= 1'b1;
+      stat_cycles <= 0;
+    end else if (ray_busy) begin
+      stat_cycles <= stat_cycles + 1;
+      if (ray_done_tracer) ray_busy <= 1'b0;
+    end
+  end
+
   // Convert to 565 representation
   // fp_color pixel_color_clipped;
   // fp_clip_upper #(.UPPER_BOUND(FP_ONE)) r_min(.clk(clk), .a(pixel_color.r), .clipped(pixel_color_clipped.r));
@@ -121,6 +193,39 @@ module rtx_tb_parallel #(
   // Delay ray_done by 1 cycle for the conversion
   pipeline #(.WIDTH(1), .DEPTH(1)) ray_done_pipe (.clk(clk), .in(ray_done_tracer), .out(ray_done));
 
+  // Results tagged with their pixel, RAY_STATS in sim/ray_stats.py order
+  pixel_sequencer #(
+    .RESULT_BITS(11 + 10 + 16 + 32 + 8 + 32 + 32),
+    .RESULT_DEPTH(RESULT_DEPTH)
+  ) seq (
+    .clk(clk),
+    .rst(rst),
+
+    .start(seq_start),
+    .h_lo(seq_h_lo),
+    .h_hi(seq_h_hi),
+    .h_first(seq_h_first),
+    .v_first(seq_v_first),
+    .h_last(seq_h_last),
+    .v_last(seq_v_last),
+    .n_passes(seq_passes),
+
+    .pixel_h(seq_pixel_h),
+    .pixel_v(seq_pixel_v),
+    .new_ray(seq_new_ray),
+    .ray_done(ray_done),
+    .result_in({
+      seq_pixel_h, seq_pixel_v, rtx_pixel,
+      stat_cycles, stat_bounces, stat_intx_cycles, stat_reflect_cycles
+    }),
+
+    .drain(seq_drain),
+    .count(seq_count),
+    .busy(seq_busy),
+    .done(seq_done),
+    .ready(seq_ready)
+  );
+
 endmodule
 
 `default_nettype wire
@@ -27,6 +27,10 @@ module uart_memflash_rtx (
   localparam integer MAT_IDX_BYTES = 1;
   localparam integer MAT_BYTES = ($bits(material) + 7) / 8;
 
+  // Bursts: {first idx, count} header, then count words for consecutive indices
+  localparam integer OBJ_BURST_BYTES = 2 * OBJ_IDX_BYTES;
+  localparam integer MAT_BURST_BYTES = 2 * MAT_IDX_BYTES;
+
   // Maximum number of bytes that can be sent
   localparam integer MAX_DATA_BYTES = MAX_UART_DATA_BYTES;
 
@@ -35,24 +39,43 @@ module uart_memflash_rtx (
     Protocol:
       - UART sends command type (one byte)
       - UART sends data
+    Bursts (0x0A objects, 0x0B materials):
+      - UART sends the command and a {first idx, count} header
+      - UART sends count words back to back, each one comes out as the
+        usual idx write (0x04 / 0x08) followed by the data write (0x05 / 0x09)
+      - Needs at least one idle cycle between bytes (always true behind uart_receive)
   */
 
   typedef enum {
     IDLE,
-    DATA
+    DATA,
+    BURST_DATA,
+    BURST_IDX
   } flash_state;
 
   flash_state state;
 
   logic [$clog2(MAX_DATA_BYTES)-1:0] byte_idx;
   logic [$clog2(MAX_DATA_BYTES)-1:0] last_byte_idx;
+
+  logic burst_mat;
+  logic [15:0] burst_idx;
+  logic [15:0] burst_left;
+
+  logic [MAX_DATA_BYTES*8-1:0] flash_data_next;
+  assign flash_data_next = {flash_data[MAX_DATA_BYTES*8-9:0], uart_rx_byte};
   
   always_ff @(posedge clk) begin
+    // Burst header fields
+    logic [15:0] header_idx;
+    logic [15:0] header_count;
+
     if (rst) begin
       flash_active <= 1'b0;
       flash_wen <= 1'b0;
       state <= IDLE;
       byte_idx <= 0;
+      burst_left <= 0;
       
     end else begin
       case (state)
@@ -73,6 +96,9 @@ module uart_memflash_rtx (
 
               8'h08: last_byte_idx <= (MAT_IDX_BYTES - 1);
               8'h09: last_byte_idx <= (MAT_BYTES - 1);
+
+              8'h0A: last_byte_idx <= (OBJ_BURST_BYTES - 1);
+              8'h0B: last_byte_idx <= (MAT_BURST_BYTES - 1);
             endcase
 
             flash_active <= 1'b1;
@@ -87,17 +113,66 @@ module uart_memflash_rtx (
           if (uart_rx_valid) begin
             // UART bytes are transmitted *MSB*
             // Shift data register to left 1 byte and get new byte
-            flash_data <= {flash_data[MAX_DATA_BYTES*8-9:0], uart_rx_byte};
+            flash_data <= flash_data_next;
+
+            if (byte_idx == last_byte_idx) begin
+              byte_idx <= 0;
+
+              if (flash_cmd == 8'h0A || flash_cmd == 8'h0B) begin
+                // Burst header: write the first index now, then take the words
+                if (flash_cmd == 8'h0A) begin
+                  header_idx = flash_data_next[2*OBJ_IDX_BYTES*8-1:OBJ_IDX_BYTES*8];
+                  header_count = flash_data_next[OBJ_IDX_BYTES*8-1:0];
+                  last_byte_idx <= (OBJ_BYTES - 1);
+                end else begin
+                  header_idx = flash_data_next[2*MAT_IDX_BYTES*8-1:MAT_IDX_BYTES*8];
+                  header_count = flash_data_next[MAT_IDX_BYTES*8-1:0];
+                  last_byte_idx <= (MAT_BYTES - 1);
+                end
+
+                burst_mat <= (flash_cmd == 8'h0B);
+                burst_idx <= header_idx;
+                burst_left <= header_count;
+
+                flash_cmd <= (flash_cmd == 8'h0B) ? 8'h08 : 8'h04;
+                flash_data <= header_idx;
+                flash_wen <= (header_count != 0);
+                state <= (header_count != 0) ? BURST_DATA : IDLE;
+
+              end else begin
+                flash_wen <= 1'b1;
+                state <= IDLE;
+              end
+            end else begin
+              byte_idx <= byte_idx + 1;
+            end
+          end
+        end
+        BURST_DATA: begin
+          flash_wen <= 1'b0;
+
+          if (uart_rx_valid) begin
+            flash_data <= flash_data_next;
 
             if (byte_idx == last_byte_idx) begin
               byte_idx <= 0;
+              flash_cmd <= burst_mat ? 8'h09 : 8'h05;
               flash_wen <= 1'b1;
-              state <= IDLE;
+              burst_idx <= burst_idx + 1;
+              burst_left <= burst_left - 1;
+              state <= (burst_left == 1) ? IDLE : BURST_IDX;
             end else begin
               byte_idx <= byte_idx + 1;
             end
           end
         end
+        BURST_IDX: begin
+          // Index of the next word, the cycle after the previous word's write
+          flash_cmd <= burst_mat ? 8'h08 : 8'h04;
+          flash_data <= burst_idx;
+          flash_wen <= 1'b1;
+          state <= BURST_DATA;
+        end
       endcase
     end
   end
@@ -0,0 +1,71 @@
+# Per-pixel sample accumulation for testbench renders
+
+from pathlib import Path
+
+import numpy as np
+
+from utils import parse_sv_params
+
+proj_path = Path(__file__).resolve().parent.parent
+
+# EXP_RATIO / COLOR_WIDTH defaults of the hardware frame buffer
+FRAME_BUFFER_PARAMS = parse_sv_params(proj_path / "hdl" / "mem" / "frame_buffer.sv")
+
+
+class PixelAccumulator:
+    """
+    Accumulates 8-bit RGB samples for n_pixels pixels.
+
+    mode="mean": float32 running mean (Welford, so the variance comes for free)
+    mode="ema":  bit-exact copy of frame_buffer.sv, i.e.
+                     acc = (acc * (2^EXP_RATIO - 1) + (sample << (COLOR_WIDTH - 8))) >> EXP_RATIO
+                 starting from an all-zero BRAM, displaying the top 8 bits
+    The running variance is tracked in both modes for adaptive sampling.
+    """
+    def __init__(self, n_pixels: int, mode: str = "mean", exp_ratio: int = None, color_width: int = None):
+        assert mode in ("mean", "ema"), f"Unknown accumulation mode {mode}"
+        self.mode = mode
+        self.exp_ratio = exp_ratio if exp_ratio is not None else FRAME_BUFFER_PARAMS["EXP_RATIO"]
+        self.color_width = color_width if color_width is not None else FRAME_BUFFER_PARAMS["COLOR_WIDTH"]
+
+        self.count = np.zeros(n_pixels, dtype=np.int32)
+        self.mean = np.zeros((n_pixels, 3), dtype=np.float32)
+        self.m2 = np.zeros((n_pixels, 3), dtype=np.float32)
+        self.ema = np.zeros((n_pixels, 3), dtype=np.int64)
+
+    def add(self, i: int, rgb: tuple[int]):
+        """
+        Add one sample to pixel i
+        """
+        x = np.asarray(rgb, dtype=np.float32)
+        self.count[i] += 1
+        delta = x - self.mean[i]
+        self.mean[i] += delta / self.count[i]
+        self.m2[i] += delta * (x - self.mean[i])
+
+        if self.mode == "ema":
+            scaled = self.ema[i] * ((1 << self.exp_ratio) - 1)
+            added = scaled + (np.asarray(rgb, dtype=np.int64) << (self.color_width - 8))
+            self.ema[i] = (added >> self.exp_ratio) & ((1 << self.color_width) - 1)
+
+    def variance(self):
+        """
+        Variance of the mean estimate per pixel (worst channel), inf until 2 samples
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            var = self.m2.max(axis=1) / (self.count - 1) / self.count
+        return np.where(self.count > 1, var, np.inf)
+
+    def converged(self, threshold: float, min_samples: int = 4):
+        """
+        Pixels whose estimate is settled enough to stop sampling
+        """
+        return (self.count >= min_samples) & (self.variance() < threshold)
+
+    def result(self):
+        """
+        (n_pixels, 3) float32 colors in [0, 255]
+        """
+        if self.mode == "ema":
+            return (self.ema >> (self.color_width - 8)).astype(np.float32)
+        return self.mean.copy()
@@ -0,0 +1,136 @@
+# Content-addressed build directories for cocotb runners
+
+import os
+import json
+import shutil
+import hashlib
+from pathlib import Path
+
+proj_path = Path(__file__).resolve().parent.parent
+
+# Every distinct build gets its own subdirectory in here
+CACHE_DIR = proj_path / "sim" / "sim_build" / "cache"
+
+# Builds kept by `python sim/build_cache.py`, nothing is pruned automatically
+#     since another run may still be using an old build
+CACHE_MAX_BUILDS = int(os.environ.get("BUILD_CACHE_MAX", 64))
+
+
+def build_key(sim: str, hdl_toplevel: str, sources, parameters: dict = None, build_args=(), mem_files=(), **build_kwargs):
+    """
+    Hash of everything that goes into a build: simulator, toplevel, the contents
+        of every source, the names of the init .mem files, parameters, build args
+        and any other runner.build() keyword (timescale, waves, defines, ...)
+    .mem files are read by $readmemh when the simulation starts, so editing a
+        scene doesn't need a new build, see stage_mem_files()
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps({
+        "sim": sim,
+        "hdl_toplevel": hdl_toplevel,
+        "parameters": {k: str(v) for k, v in (parameters or {}).items()},
+        "build_args": [str(arg) for arg in build_args],
+        "build_kwargs": {k: str(v) for k, v in sorted(build_kwargs.items())},
+    }, sort_keys=True).encode())
+
+    # Source order matters to the compiler, .mem files are looked up by name
+    for path in sources:
+        h.update(str(path).encode())
+        h.update(Path(path).read_bytes())
+    for path in sorted(mem_files, key=lambda p: Path(p).name):
+        h.update(Path(path).name.encode())
+
+    return h.hexdigest()
+
+
+def cached_build_dir(sim: str, hdl_toplevel: str, sources, parameters: dict = None, build_args=(), mem_files=(), **build_kwargs):
+    """
+    Directory that build_cached() builds these inputs into
+    """
+    key = build_key(sim, hdl_toplevel, sources, parameters, build_args, mem_files, **build_kwargs)
+    return CACHE_DIR / f"{hdl_toplevel}_{sim}_{key[:16]}"
+
+
+def mem_files_hash(mem_files):
+    """
+    Short hash of the contents of mem_files, for naming a directory that only
+        simulations of this exact scene run in
+    """
+    h = hashlib.blake2b(digest_size=8)
+    for path in sorted(mem_files, key=lambda p: Path(p).name):
+        h.update(Path(path).name.encode())
+        h.update(Path(path).read_bytes())
+    return h.hexdigest()
+
+
+def stage_mem_files(mem_files, test_dir):
+    """
+    Copy the current contents of mem_files into the directory a simulation runs
+        in ($readmemh resolves them from there). Returns test_dir.
+    """
+    test_dir = Path(test_dir)
+    os.makedirs(test_dir, exist_ok=True)
+    for path in mem_files:
+        shutil.copy(path, test_dir / Path(path).name)
+    return test_dir
+
+
+def prune_cache(max_builds: int = CACHE_MAX_BUILDS, keep=()):
+    """
+    Delete all but the max_builds most recently used builds in CACHE_DIR,
+        never the ones in keep. Returns the deleted directories.
+    """
+    keep = {Path(path).resolve() for path in keep}
+    builds = sorted(
+        (path for path in CACHE_DIR.glob("*") if path.is_dir()),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True,
+    )
+
+    pruned = []
+    for path in builds[max_builds:]:
+        if path.resolve() not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+            pruned.append(path)
+    return pruned
+
+
+def build_cached(runner, sources, hdl_toplevel: str, parameters: dict = None, build_args=(), mem_files=(), **build_kwargs):
+    """
+    runner.build() into a directory named after build_key(), copying mem_files
+        next to the simulator binary (the default test_dir). Unchanged inputs
+        reuse the previous build, any change to them gets a fresh directory, so
+        a stale build is never run. Old builds stay until prune_cache().
+    Returns the build directory.
+    """
+    sim = type(runner).__name__.lower()
+    build_dir = cached_build_dir(sim, hdl_toplevel, sources, parameters, build_args, mem_files, **build_kwargs)
+    stage_mem_files(mem_files, build_dir)
+
+    # always=False: the simulator's own up-to-date check skips compilation
+    #     when this directory has been built before
+    runner.build(
+        sources=sources,
+        hdl_toplevel=hdl_toplevel,
+        always=False,
+        build_args=list(build_args),
+        parameters=parameters or {},
+        build_dir=build_dir,
+        **build_kwargs,
+    )
+
+    # Mark as used for the LRU
+    os.utime(build_dir)
+
+    return build_dir
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description=f"Prune the build cache in {CACHE_DIR}")
+    parser.add_argument("--max-builds", type=int, default=CACHE_MAX_BUILDS, help="most recently used builds to keep, 0 clears the cache")
+    args = parser.parse_args()
+
+    for path in prune_cache(args.max_builds):
+        print(f"Removed {path.name}")
@@ -0,0 +1,21 @@
+"""
+fpmodel: bit-accurate NumPy models of the fp24 arithmetic in hdl/math
+
+Every function works elementwise on integer arrays of fp bit patterns, so
+millions of operands can be checked offline and cocotb tests only need to
+compare DUT outputs for equality. Constants (magic numbers, Newton stage
+counts) are parsed from hdl/constants.sv.
+"""
+
+from .params import HDL_PARAMS
+from .ops import (
+    unpack, pack, fp_greater,
+    fp_add, fp_sub, fp_mul, fp_shift,
+    fp_inv_sqrt, fp_inv_sqrt_stage, fp_sqrt,
+    fp_inv, fp_inv_stage,
+)
+from .vec3_ops import (
+    pack_vec3, unpack_vec3,
+    vec3_add, vec3_mul, vec3_scale, vec3_shift,
+    vec3_dot, vec3_cross, vec3_normalize, vec3_lerp,
+)
@@ -0,0 +1,171 @@
+# Bit-accurate models of the scalar fp units in hdl/math
+# All functions take/return fp values as integer arrays (returned as uint32)
+
+import numpy as np
+
+from .params import (
+    FP_EXP_BITS, FP_MANT_BITS, FP_BITS, FP_EXP_OFFSET,
+    FP_TWO, FP_THREE, FP_INV_SQRT_MAGIC_NUM, FP_INV_MAGIC_NUM,
+    INV_SQRT_NR_STAGES, INV_NR_STAGES,
+)
+
+FP_MASK = (1 << FP_BITS) - 1
+EXP_MASK = (1 << FP_EXP_BITS) - 1
+MANT_MASK = (1 << FP_MANT_BITS) - 1
+
+
+def _bits(x):
+    """
+    View anything fp-like as int64 so intermediate values can't overflow
+    """
+    return np.asarray(x).astype(np.int64) & FP_MASK
+
+def unpack(x):
+    """
+    Split fp values into (sign, exp, mant) fields
+    """
+    x = _bits(x)
+    return (
+        x >> (FP_EXP_BITS + FP_MANT_BITS),
+        (x >> FP_MANT_BITS) & EXP_MASK,
+        x & MANT_MASK,
+    )
+
+def pack(sign, exp, mant):
+    """
+    Assemble fp values from fields, truncating each to its width
+    """
+    return (
+        ((np.asarray(sign) & 1) << (FP_EXP_BITS + FP_MANT_BITS)) |
+        ((np.asarray(exp) & EXP_MASK) << FP_MANT_BITS) |
+        (np.asarray(mant) & MANT_MASK)
+    ).astype(np.uint32)
+
+def clz(x, width: int):
+    """
+    clz.sv: leading zeros of a `width`-bit value (width if zero)
+    """
+    # frexp(x) gives x in [2^(e-1), 2^e), so the MSB sits at bit e-1
+    _, e = np.frexp(np.asarray(x, dtype=np.float64))
+    return width - e.astype(np.int64)
+
+def fp_greater(a, b):
+    """
+    fp_add.sv: compare magnitudes (signs are ignored)
+    """
+    _, exp_a, mant_a = unpack(a)
+    _, exp_b, mant_b = unpack(b)
+    return (exp_a > exp_b) | ((exp_a == exp_b) & (mant_a > mant_b))
+
+
+# ===== BASIC OPS =====
+def fp_add(a, b, is_sub=0):
+    """
+    fp_add.sv: a + b (or a - b), truncating alignment shift, no rounding
+    """
+    is_sub = np.asarray(is_sub).astype(np.int64) & 1
+    sign_a_in, exp_a_in, mant_a_in = unpack(a)
+    sign_b_in, exp_b_in, mant_b_in = unpack(b)
+
+    # Swap so that |a| > |b| (equal magnitudes swap too)
+    swap = ~fp_greater(a, b)
+    exp_a = np.where(swap, exp_b_in, exp_a_in)
+    exp_b = np.where(swap, exp_a_in, exp_b_in)
+    sign_a = np.where(swap, sign_b_in ^ is_sub, sign_a_in)
+    sign_b = np.where(swap, sign_a_in, sign_b_in ^ is_sub)
+    mant_a = np.where(swap, mant_b_in, mant_a_in)
+    mant_b = np.where(swap, mant_a_in, mant_b_in)
+
+    frac_a = (1 << FP_MANT_BITS) | mant_a
+    frac_b = (1 << FP_MANT_BITS) | mant_b
+
+    # Stage 1: align and add (frac_sum is FP_MANT_BITS+2 wide)
+    exp_diff = (exp_a - exp_b) & EXP_MASK
+    frac_b_shift = np.where(exp_diff > FP_MANT_BITS + 1, 0, frac_b >> np.minimum(exp_diff, FP_MANT_BITS + 1))
+    frac_sum = np.where(sign_a == sign_b, frac_a + frac_b_shift, frac_a - frac_b_shift)
+    frac_sum &= (1 << (FP_MANT_BITS + 2)) - 1
+    both_zero = (exp_a == 0) & (mant_a == 0) & (exp_b == 0) & (mant_b == 0)
+
+    # Stage 2: normalize
+    overflow = (frac_sum >> (FP_MANT_BITS + 1)) & 1
+    frac_low = frac_sum & ((1 << (FP_MANT_BITS + 1)) - 1)
+    shift = clz(frac_low, FP_MANT_BITS + 1)
+
+    frac_norm = np.where(overflow, frac_sum >> 1, frac_low << shift)
+    exp_norm = np.where(overflow, exp_a + 1, exp_a - shift)
+
+    return np.where(both_zero, 0, pack(sign_a, exp_norm, frac_norm)).astype(np.uint32)
+
+def fp_sub(a, b):
+    return fp_add(a, b, is_sub=1)
+
+def fp_mul(a, b):
+    """
+    fp_mul.sv: a * b, mantissa product truncated
+    """
+    sign_a, exp_a, mant_a = unpack(a)
+    sign_b, exp_b, mant_b = unpack(b)
+
+    is_zero = ((exp_a == 0) & (mant_a == 0)) | ((exp_b == 0) & (mant_b == 0))
+
+    frac_prod = ((1 << FP_MANT_BITS) | mant_a) * ((1 << FP_MANT_BITS) | mant_b)
+    overflow = (frac_prod >> (2 * FP_MANT_BITS + 1)) & 1
+    exp_prod = exp_a + exp_b + overflow - FP_EXP_OFFSET
+    mant_prod = np.where(overflow, frac_prod >> (FP_MANT_BITS + 1), frac_prod >> FP_MANT_BITS)
+
+    res = pack(sign_a ^ sign_b, exp_prod, mant_prod)
+    return np.where(is_zero, 0, res).astype(np.uint32)
+
+def fp_shift(a, shift_amt: int):
+    """
+    fp_shift.sv: multiply by 2^shift_amt by adding to the exponent (wraps!)
+    """
+    sign, exp, mant = unpack(a)
+    return pack(sign, exp + shift_amt, mant)
+
+
+# ===== NEWTON-RAPHSON UNITS =====
+def fp_inv_sqrt_stage(x, y):
+    """
+    fp_inv_sqrt_stage: y * (3 - x * y * y) / 2
+    """
+    y_sq_by_x = fp_mul(fp_mul(y, y), x)
+    frac = fp_shift(fp_add(FP_THREE, y_sq_by_x, is_sub=1), -1)
+    return fp_mul(frac, y)
+
+def fp_inv_sqrt(x, nr_stages: int = INV_SQRT_NR_STAGES, magic_num: int = FP_INV_SQRT_MAGIC_NUM):
+    """
+    fp_inv_sqrt.sv: magic number guess followed by `nr_stages` Newton steps
+    """
+    x = _bits(x)
+    y = (magic_num - (x >> 1)) & FP_MASK
+    for _ in range(nr_stages):
+        y = fp_inv_sqrt_stage(x, y)
+    return np.asarray(y).astype(np.uint32)
+
+def fp_sqrt(x):
+    """
+    fp_sqrt.sv: x * (1 / sqrt(x))
+    """
+    return fp_mul(x, fp_inv_sqrt(x))
+
+def fp_inv_stage(x, y):
+    """
+    fp_inv_stage: y * (2 - x * y)
+    """
+    return fp_mul(y, fp_add(FP_TWO, fp_mul(x, y), is_sub=1))
+
+def fp_inv(x, nr_stages: int = INV_NR_STAGES, magic_num: int = FP_INV_MAGIC_NUM):
+    """
+    fp_inv.sv: iterate on |x| and reattach the sign at the end
+    """
+    sign, exp, mant = unpack(x)
+    abs_x = pack(0, exp, mant).astype(np.int64)
+
+    # MAGIC_NUMBER is FP_BITS-1 wide, the subtraction is FP_BITS wide
+    y = ((magic_num & (FP_MASK >> 1)) - abs_x) & FP_MASK
+    for _ in range(nr_stages):
+        y = fp_inv_stage(abs_x, y)
+
+    _, y_exp, y_mant = unpack(y)
+    return pack(sign, y_exp, y_mant)
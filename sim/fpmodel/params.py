@@ -0,0 +1,27 @@
+# HDL constants for the fp model, read straight from the SystemVerilog
+
+import sys
+from pathlib import Path
+
+proj_path = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(proj_path / "sim"))
+from utils import parse_sv_params
+
+HDL_PARAMS = parse_sv_params(proj_path / "hdl" / "constants.sv")
+
+# INV_NR_STAGES lives above fp_inv in fp_inv.sv
+HDL_PARAMS = parse_sv_params(proj_path / "hdl" / "math" / "fp_inv.sv", HDL_PARAMS)
+
+FP_EXP_BITS = HDL_PARAMS["FP_EXP_BITS"]
+FP_MANT_BITS = HDL_PARAMS["FP_MANT_BITS"]
+FP_BITS = HDL_PARAMS["FP_BITS"]
+FP_EXP_OFFSET = HDL_PARAMS["FP_EXP_OFFSET"]
+
+FP_ONE = HDL_PARAMS["FP_ONE"]
+FP_TWO = HDL_PARAMS["FP_TWO"]
+FP_THREE = HDL_PARAMS["FP_THREE"]
+FP_INV_SQRT_MAGIC_NUM = HDL_PARAMS["FP_INV_SQRT_MAGIC_NUM"]
+FP_INV_MAGIC_NUM = HDL_PARAMS["FP_INV_MAGIC_NUM"]
+
+INV_SQRT_NR_STAGES = HDL_PARAMS["INV_SQRT_NR_STAGES"]
+INV_NR_STAGES = HDL_PARAMS["INV_NR_STAGES"]
@@ -0,0 +1,84 @@
+# Bit-accurate models of fp_vec3_ops.sv
+# fp_vec3 values are integer arrays with a trailing (x, y, z) axis of size 3
+
+import numpy as np
+
+from .ops import fp_add, fp_mul, fp_shift, fp_inv_sqrt
+from .params import FP_BITS
+
+
+def pack_vec3(v):
+    """
+    (..., 3) fp array -> packed fp_vec3 Python ints ({x, y, z}, x in the MSBs)
+    """
+    v = np.asarray(v).astype(object)
+    return (v[..., 0] << (2 * FP_BITS)) | (v[..., 1] << FP_BITS) | v[..., 2]
+
+def unpack_vec3(v):
+    """
+    Packed fp_vec3 (Python int or array of them) -> (..., 3) fp array
+    """
+    v = np.asarray(v, dtype=object)
+    mask = (1 << FP_BITS) - 1
+    return np.stack([
+        (v >> (2 * FP_BITS)) & mask,
+        (v >> FP_BITS) & mask,
+        v & mask,
+    ], axis=-1).astype(np.uint32)
+
+def vec3_add(v, w, is_sub=0):
+    """
+    fp_vec3_add: componentwise fp_add
+    """
+    return fp_add(v, w, np.asarray(is_sub)[..., None])
+
+def vec3_mul(v, w):
+    """
+    fp_vec3_mul: componentwise fp_mul
+    """
+    return fp_mul(v, w)
+
+def vec3_scale(v, s):
+    """
+    fp_vec3_scale: multiply every component by scalar s
+    """
+    return fp_mul(v, np.asarray(s)[..., None])
+
+def vec3_shift(v, shift_amt: int):
+    """
+    fp_vec3_shift: fp_shift every component
+    """
+    return fp_shift(v, shift_amt)
+
+def vec3_dot(v, w):
+    """
+    fp_vec3_dot: (x*x' + y*y') + z*z'
+    """
+    prod = fp_mul(v, w)
+    return fp_add(fp_add(prod[..., 0], prod[..., 1]), prod[..., 2])
+
+def vec3_cross(v, w):
+    """
+    fp_vec3_cross
+    """
+    v = np.asarray(v)
+    w = np.asarray(w)
+    vx, vy, vz = v[..., 0], v[..., 1], v[..., 2]
+    wx, wy, wz = w[..., 0], w[..., 1], w[..., 2]
+    return np.stack([
+        fp_add(fp_mul(vy, wz), fp_mul(vz, wy), is_sub=1),
+        fp_add(fp_mul(vz, wx), fp_mul(vx, wz), is_sub=1),
+        fp_add(fp_mul(vx, wy), fp_mul(vy, wx), is_sub=1),
+    ], axis=-1)
+
+def vec3_normalize(v):
+    """
+    fp_vec3_normalize: v * inv_sqrt(v . v)
+    """
+    return vec3_scale(v, fp_inv_sqrt(vec3_dot(v, v)))
+
+def vec3_lerp(v, w, t, one_sub_t):
+    """
+    fp_vec3_lerp: v * (1 - t) + w * t, with 1 - t supplied by the caller
+    """
+    return vec3_add(vec3_scale(v, one_sub_t), vec3_scale(w, t))
@@ -0,0 +1,79 @@
+# Disk-backed framebuffer that chunks are merged into as soon as they finish
+
+import os
+import json
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from ray_stats import RAY_STATS
+
+
+class Framebuffer:
+    """
+    np.memmap'd pixels + per-pixel done mask, cycles and sample counts, living in `root`.
+    `stats` holds the per-sample mean of each RAY_STATS statistic per pixel.
+
+    Everything is flushed to disk on every merge, so if the render dies the
+    pixels that were already merged survive and reopening the same directory
+    picks up where it left off.
+    """
+    def __init__(self, root, width: int, height: int, meta: dict = None):
+        self.root = Path(root)
+        self.width = width
+        self.height = height
+        os.makedirs(self.root, exist_ok=True)
+
+        # Refuse to resume into a buffer rendered with different settings
+        meta = dict(meta or {}, width=width, height=height)
+        meta_path = self.root / "meta.json"
+        if meta_path.exists():
+            with open(meta_path) as fin:
+                old_meta = json.load(fin)
+            assert old_meta == meta, f"Framebuffer in {self.root} was rendered with {old_meta}, not {meta}"
+        else:
+            with open(meta_path, "w") as fout:
+                json.dump(meta, fout)
+
+        n_pixels = width * height
+        self.pixels = self._open("pixels.dat", np.float32, (n_pixels, 3))
+        self.done = self._open("done.dat", np.uint8, (n_pixels,))
+        self.cycles = self._open("cycles.dat", np.float32, (n_pixels,))
+        self.samples = self._open("samples.dat", np.int32, (n_pixels,))
+        self.stats = {name: self._open(f"{name}.dat", np.float32, (n_pixels,)) for name in RAY_STATS}
+
+    def _open(self, name: str, dtype, shape: tuple):
+        path = self.root / name
+        mode = "r+" if path.exists() else "w+"
+        return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+    def merge(self, pixel_idxs: np.ndarray, values: np.ndarray, cycles_per_pixel: float = 0, samples: np.ndarray = 1, stats: dict = None):
+        """
+        Write finished pixels (flat indices) and mark them done
+            stats: per-pixel totals over all samples of some RAY_STATS statistics
+        """
+        self.pixels[pixel_idxs] = values
+        self.cycles[pixel_idxs] = cycles_per_pixel
+        self.samples[pixel_idxs] = samples
+        for name, totals in (stats or {}).items():
+            self.stats[name][pixel_idxs] = totals / np.maximum(samples, 1)
+        self.done[pixel_idxs] = 1
+
+        for mm in (self.pixels, self.cycles, self.samples, *self.stats.values(), self.done):
+            mm.flush()
+
+    def is_done(self, pixel_idxs: np.ndarray):
+        return bool(self.done[pixel_idxs].all())
+
+    @property
+    def n_done(self):
+        return int(np.count_nonzero(self.done))
+
+    def image(self):
+        return Image.fromarray(
+            np.clip(self.pixels, 0, 255).reshape((self.height, self.width, 3)).astype("uint8")
+        )
+
+    def save_png(self, path):
+        self.image().save(path)
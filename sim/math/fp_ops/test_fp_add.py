@@ -14,7 +14,9 @@ import ctypes
 import numpy as np
 
 sys.path.append(Path(__file__).resolve().parent.parent.parent._str)
-from utils import convert_fp, make_fp
+from utils import convert_fp_array, make_fp_array
+from fpmodel import fp_add
+from stream import stream, Scoreboard, DELAYS
 
 test_file = os.path.basename(__file__).replace(".py", "")
 
@@ -29,42 +31,33 @@ async def test_module(dut):
     await ClockCycles(dut.clk, 3)
     dut.rst.value = 0
 
-    async def do_test(x: float, y: float, is_sub: bool):
-        """
-        Do a single test on x + y using fp_add
-        """
-        x_f = make_fp(x)
-        y_f = make_fp(y)
-
-        dut.a.value = x_f
-        dut.b.value = y_f
-        dut.is_sub.value = is_sub
-        await ClockCycles(dut.clk, 3)
-
-        return convert_fp(dut.sum.value)
-    
-    # x = -38000
-    # y = 39000
-    # res = await do_test(x, y, 0)
-    # dut._log.info(f"{res=}, {x+y=}")
-    # return
-    
     n_tests = 1_000
-    total_err = 0
-    for _ in range(n_tests):
-        x = (random.random() - 0.5) * 200
-        y = (random.random() - 0.5) * 200
-        is_sub = random.random() < 0.5
-
-        exp_ans = x - y if is_sub else x + y
-        dut_ans = await do_test(x, y, is_sub)
-
-        dut._log.info(f"{x=:>10.3f} {y=:>10.3f} {is_sub=:>5} {exp_ans=:>10.3f} {dut_ans=:>10.3f} diff={exp_ans-dut_ans}")
+    x = (np.random.rand(n_tests) - 0.5) * 200
+    y = (np.random.rand(n_tests) - 0.5) * 200
+    is_sub = np.random.rand(n_tests) < 0.5
+
+    x_f = make_fp_array(x)
+    y_f = make_fp_array(y)
+
+    # Must match the golden model bit for bit
+    scoreboard = Scoreboard("sum")
+    scoreboard.extend(fp_add(x_f, y_f, is_sub).tolist())
+
+    # New operands every cycle
+    results = await stream(
+        dut,
+        inputs={"a": x_f, "b": y_f, "is_sub": is_sub},
+        outputs=["sum"],
+        delay=DELAYS["FP_ADD_DELAY"],
+        scoreboards={"sum": scoreboard},
+    )
 
-        if exp_ans != 0:
-            total_err += abs((dut_ans - exp_ans) / exp_ans)
+    exp_ans = np.where(is_sub, x - y, x + y)
+    dut_ans = convert_fp_array(results["sum"])
 
-    dut._log.info(f"Mean error: {total_err / n_tests * 100:.6f}%")
+    rel_err = np.abs((dut_ans - exp_ans) / exp_ans)
+    dut._log.info(f"Mean error: {np.mean(rel_err[exp_ans != 0]) * 100:.6f}%")
+    scoreboard.report(dut._log)
 
 
 def runner():
@@ -86,18 +79,18 @@ def runner():
     parameters = {}
 
     sys.path.append(str(proj_path / "sim"))
+    from build_cache import build_cached
     hdl_toplevel = "fp_add"
     
     runner = get_runner(sim)
-    runner.build(
+    build_cached(
+        runner,
         sources=sources,
         hdl_toplevel=hdl_toplevel,
-        always=True,
         build_args=build_test_args,
         parameters=parameters,
         timescale=("1ns", "1ps"),
         waves=True,
-        build_dir=(proj_path / "sim" / "sim_build")
     )
     run_test_args = []
     runner.test(
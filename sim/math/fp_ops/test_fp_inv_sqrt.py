@@ -159,18 +159,18 @@ def runner():
     parameters = {}
 
     sys.path.append(str(proj_path / "sim"))
+    from build_cache import build_cached
     hdl_toplevel = "fp_inv_sqrt"
     
     runner = get_runner(sim)
-    runner.build(
+    build_cached(
+        runner,
         sources=sources,
         hdl_toplevel=hdl_toplevel,
-        always=True,
         build_args=build_test_args,
         parameters=parameters,
         timescale=("1ns", "1ps"),
         waves=True,
-        build_dir=(proj_path / "sim" / "sim_build")
     )
     run_test_args = []
     runner.test(
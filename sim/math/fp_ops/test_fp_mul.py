@@ -14,7 +14,9 @@ import ctypes
 import numpy as np
 
 sys.path.append(Path(__file__).resolve().parent.parent.parent._str)
-from utils import convert_fp, make_fp
+from utils import convert_fp_array, make_fp_array
+from fpmodel import fp_mul
+from stream import stream, Scoreboard, DELAYS
 
 test_file = os.path.basename(__file__).replace(".py", "")
 
@@ -29,34 +31,32 @@ async def test_module(dut):
     await ClockCycles(dut.clk, 3)
     dut.rst.value = 0
 
-    async def do_test(x: float, y: float):
-        """
-        Do a single test on x * y using fp_mul
-        """
-        x_f = make_fp(x)
-        y_f = make_fp(y)
-
-        dut.a.value = x_f
-        dut.b.value = y_f
-        await ClockCycles(dut.clk, 3)
-
-        return convert_fp(dut.prod.value)
-    
     n_tests = 1_000
-    total_err = 0
-    for _ in range(n_tests):
-        x = (random.random() - 0.5) * 200
-        y = (random.random() - 0.5) * 200
-
-        exp_ans = x * y
-        dut_ans = await do_test(x, y)
-
-        dut._log.info(f"{x=:>10.3f} {y=:>10.3f} {exp_ans=:>10.3f} {dut_ans=:>10.3f} diff={exp_ans-dut_ans}")
+    x = (np.random.rand(n_tests) - 0.5) * 200
+    y = (np.random.rand(n_tests) - 0.5) * 200
+
+    x_f = make_fp_array(x)
+    y_f = make_fp_array(y)
+
+    # Must match the golden model bit for bit
+    scoreboard = Scoreboard("prod")
+    scoreboard.extend(fp_mul(x_f, y_f).tolist())
+
+    # New operands every cycle
+    results = await stream(
+        dut,
+        inputs={"a": x_f, "b": y_f},
+        outputs=["prod"],
+        delay=DELAYS["FP_MUL_DELAY"],
+        scoreboards={"prod": scoreboard},
+    )
 
-        if exp_ans != 0:
-            total_err += abs((dut_ans - exp_ans) / exp_ans)
+    exp_ans = x * y
+    dut_ans = convert_fp_array(results["prod"])
 
-    dut._log.info(f"Mean error: {total_err / n_tests * 100:.6f}%")
+    rel_err = np.abs((dut_ans - exp_ans) / exp_ans)
+    dut._log.info(f"Mean error: {np.mean(rel_err[exp_ans != 0]) * 100:.6f}%")
+    scoreboard.report(dut._log)
 
 
 def runner():
@@ -78,18 +78,18 @@ def runner():
     parameters = {}
 
     sys.path.append(str(proj_path / "sim"))
+    from build_cache import build_cached
     hdl_toplevel = "fp_mul"
     
     runner = get_runner(sim)
-    runner.build(
+    build_cached(
+        runner,
         sources=sources,
         hdl_toplevel=hdl_toplevel,
-        always=True,
         build_args=build_test_args,
         parameters=parameters,
         timescale=("1ns", "1ps"),
         waves=True,
-        build_dir=(proj_path / "sim" / "sim_build")
     )
     run_test_args = []
     runner.test(
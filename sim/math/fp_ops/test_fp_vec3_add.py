@@ -15,7 +15,9 @@ import numpy as np
 import math
 
 sys.path.append(Path(__file__).resolve().parent.parent.parent._str)
-from utils import convert_fp, make_fp, make_fp_vec3, convert_fp_vec3
+from utils import convert_fp_array, make_fp_array
+from fpmodel import vec3_add, pack_vec3, unpack_vec3
+from stream import stream, Scoreboard, DELAYS
 
 test_file = os.path.basename(__file__).replace(".py", "")
 
@@ -32,44 +34,37 @@ async def test_module(dut):
     await ClockCycles(dut.clk, 3)
     dut.rst.value = 0
 
-    DELAY_CYCLES = 2
-
     N_SAMPLES = 1000
 
     # Generate random (N, 3) tensors for inputs
     a_vecs = np.exp2(np.random.rand(N_SAMPLES, 3) * 63 - 31)
-    a_vecs_fp = list(map(make_fp_vec3, a_vecs))
+    a_vecs_fp = make_fp_array(a_vecs)
 
     b_vecs = np.exp2(np.random.rand(N_SAMPLES, 3) * 63 - 31)
-    b_vecs_fp = list(map(make_fp_vec3, b_vecs))
+    b_vecs_fp = make_fp_array(b_vecs)
 
     is_sub = np.random.rand(N_SAMPLES) < 0.5
 
-    # Clock in one per cycle brrr
-    dut_ans = []
-    for i in range(N_SAMPLES):
-        a_fp_vec3 = a_vecs_fp[i]
-        b_fp_vec3 = b_vecs_fp[i]
-
-        dut.v.value = a_fp_vec3
-        dut.w.value = b_fp_vec3
-        dut.is_sub.value = bool(is_sub[i])
+    # Must match the golden model bit for bit
+    scoreboard = Scoreboard("sum")
+    scoreboard.extend(pack_vec3(vec3_add(a_vecs_fp, b_vecs_fp, is_sub)).tolist())
 
-        await ClockCycles(dut.clk, 1)
-        # await RisingEdge(dut.clk)
-        dut_ans.append(convert_fp_vec3(dut.sum.value))
-
-    for _ in range(DELAY_CYCLES):
-        await ClockCycles(dut.clk, 1)
-        dut_ans.append(convert_fp_vec3(dut.sum.value))
+    # Clock in one per cycle brrr
+    results = await stream(
+        dut,
+        inputs={"v": pack_vec3(a_vecs_fp), "w": pack_vec3(b_vecs_fp), "is_sub": is_sub},
+        outputs=["sum"],
+        delay=DELAYS["VEC3_ADD_DELAY"],
+        scoreboards={"sum": scoreboard},
+    )
 
     # Get answers!
-    await ClockCycles(dut.clk, DELAY_CYCLES * 2)
-    dut_ans = np.array(dut_ans[DELAY_CYCLES:])
+    dut_ans = convert_fp_array(unpack_vec3(results["sum"]))
     exp_ans = a_vecs + ((is_sub - 0.5) * -2)[:, None] * b_vecs
 
     rel_err = np.abs(dut_ans / exp_ans - 1)
     dut._log.info(f"mean relative error: {np.mean(rel_err) * 100:.6f}%")
+    scoreboard.report(dut._log)
 
 
 def runner():
@@ -95,18 +90,18 @@ def runner():
     parameters = {}
 
     sys.path.append(str(proj_path / "sim"))
+    from build_cache import build_cached
     hdl_toplevel = "fp_vec3_add"
     
     runner = get_runner(sim)
-    runner.build(
+    build_cached(
+        runner,
         sources=sources,
         hdl_toplevel=hdl_toplevel,
-        always=True,
         build_args=build_test_args,
         parameters=parameters,
         timescale=("1ns", "1ps"),
         waves=True,
-        build_dir=(proj_path / "sim" / "sim_build")
     )
     run_test_args = []
     runner.test(
@@ -15,7 +15,9 @@ import numpy as np
 import math
 
 sys.path.append(Path(__file__).resolve().parent.parent.parent._str)
-from utils import convert_fp, make_fp, make_fp_vec3, convert_fp_vec3
+from utils import convert_fp_array, make_fp_array
+from fpmodel import vec3_lerp, pack_vec3, unpack_vec3
+from stream import stream, Scoreboard, DELAYS
 
 test_file = os.path.basename(__file__).replace(".py", "")
 
@@ -32,54 +34,44 @@ async def test_module(dut):
     await ClockCycles(dut.clk, 3)
     dut.rst.value = 0
 
-    DELAY_CYCLES = 3
-
     N_SAMPLES = 1000
 
     # Generate random (N, 3) tensors for inputs
     a_vecs = np.exp2(np.random.rand(N_SAMPLES, 3) * 63 - 31)
-    a_vecs_fp = list(map(make_fp_vec3, a_vecs))
+    a_vecs_fp = make_fp_array(a_vecs)
 
     b_vecs = np.exp2(np.random.rand(N_SAMPLES, 3) * 63 - 31)
-    b_vecs_fp = list(map(make_fp_vec3, b_vecs))
+    b_vecs_fp = make_fp_array(b_vecs)
 
     t = np.random.rand(N_SAMPLES)
-    t_fp = list(map(make_fp, t))
-    one_sub_t_fp = list(map(make_fp, 1 - t))
-
-    # Clock in one per cycle brrr
-    dut_ans = []
-    for i in range(N_SAMPLES):
-        a_fp_vec3 = a_vecs_fp[i]
-        b_fp_vec3 = b_vecs_fp[i]
-
-        dut.v.value = a_fp_vec3
-        dut.w.value = b_fp_vec3
-        dut.t.value = t_fp[i]
-        dut.one_sub_t.value = one_sub_t_fp[i]
+    t_fp = make_fp_array(t)
+    one_sub_t_fp = make_fp_array(1 - t)
 
-        # await ClockCycles(dut.clk, 10)
-        await RisingEdge(dut.clk)
-        dut_ans.append(convert_fp_vec3(dut.lerped.value))
+    # Must match the golden model bit for bit
+    scoreboard = Scoreboard("lerped")
+    scoreboard.extend(pack_vec3(vec3_lerp(a_vecs_fp, b_vecs_fp, t_fp, one_sub_t_fp)).tolist())
 
-    for _ in range(DELAY_CYCLES):
-        await ClockCycles(dut.clk, 1)
-        dut_ans.append(convert_fp_vec3(dut.lerped.value))
+    # Clock in one per cycle brrr
+    results = await stream(
+        dut,
+        inputs={
+            "v": pack_vec3(a_vecs_fp),
+            "w": pack_vec3(b_vecs_fp),
+            "t": t_fp,
+            "one_sub_t": one_sub_t_fp,
+        },
+        outputs=["lerped"],
+        delay=DELAYS["VEC3_LERP_DELAY"],
+        scoreboards={"lerped": scoreboard},
+    )
 
     # Get answers!
-    await ClockCycles(dut.clk, DELAY_CYCLES * 2)
-    dut_ans = np.array(dut_ans[DELAY_CYCLES:])
-
-    dut._log.info(f"{a_vecs=}")
-    dut._log.info(f"{b_vecs=}")
-    dut._log.info(f"{t=}")
-    dut._log.info(f"{(1-t)=}")
-    dut._log.info(f"{dut_ans=}")
-
+    dut_ans = convert_fp_array(unpack_vec3(results["lerped"]))
     exp_ans = a_vecs * (1 - t)[:,None] + b_vecs * t[:,None]
 
     rel_err = np.abs(dut_ans / exp_ans - 1)
     dut._log.info(f"mean relative error: {np.mean(rel_err) * 100:.6f}%")
+    scoreboard.report(dut._log)
 
 
 def runner():
@@ -105,18 +97,18 @@ def runner():
     parameters = {}
 
     sys.path.append(str(proj_path / "sim"))
+    from build_cache import build_cached
     hdl_toplevel = "fp_vec3_lerp"
     
     runner = get_runner(sim)
-    runner.build(
+    build_cached(
+        runner,
         sources=sources,
         hdl_toplevel=hdl_toplevel,
-        always=True,
         build_args=build_test_args,
         parameters=parameters,
         timescale=("1ns", "1ps"),
         waves=True,
-        build_dir=(proj_path / "sim" / "sim_build")
     )
     run_test_args = []
     runner.test(
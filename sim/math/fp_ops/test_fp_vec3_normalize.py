@@ -17,7 +17,9 @@ import math
 import matplotlib.pyplot as plt
 
 sys.path.append(Path(__file__).resolve().parent.parent.parent._str)
-from utils import convert_fp, make_fp, make_fp_vec3, convert_fp_vec3
+from utils import convert_fp_array, make_fp_array
+from fpmodel import vec3_normalize, pack_vec3, unpack_vec3
+from stream import stream, Scoreboard, DELAYS
 
 test_file = os.path.basename(__file__).replace(".py", "")
 
@@ -34,36 +36,33 @@ async def test_module(dut):
     await ClockCycles(dut.clk, 3)
     dut.rst.value = 0
 
-    DELAY_CYCLES = 16
-
     N_SAMPLES = 1000
 
     # Generate random (N, 3) tensors for inputs
     async def mean_rel_err(vec_scale: float):
         a_vecs = np.exp2((np.random.rand(N_SAMPLES, 3) - 0.5) * 2 * vec_scale)
-        a_vecs_fp = list(map(make_fp_vec3, a_vecs))
-
-        # Clock in one per cycle brrr
-        dut_ans = []
-        for i in range(N_SAMPLES):
-            a_fp_vec3 = a_vecs_fp[i]
+        a_vecs_fp = make_fp_array(a_vecs)
 
-            dut.v.value = a_fp_vec3
+        # Must match the golden model bit for bit
+        scoreboard = Scoreboard("normed")
+        scoreboard.extend(pack_vec3(vec3_normalize(a_vecs_fp)).tolist())
 
-            await ClockCycles(dut.clk, 1)
-            dut_ans.append(convert_fp_vec3(dut.normed.value))
-
-        for _ in range(DELAY_CYCLES):
-            await ClockCycles(dut.clk, 1)
-            dut_ans.append(convert_fp_vec3(dut.normed.value))
+        # Clock in one per cycle brrr
+        results = await stream(
+            dut,
+            inputs={"v": pack_vec3(a_vecs_fp)},
+            outputs=["normed"],
+            delay=DELAYS["VEC3_NORM_DELAY"],
+            scoreboards={"normed": scoreboard},
+        )
 
         # Get answers!
-        await ClockCycles(dut.clk, DELAY_CYCLES * 2)
-        dut_ans = np.array(dut_ans[DELAY_CYCLES:])
+        dut_ans = convert_fp_array(unpack_vec3(results["normed"]))
         exp_ans = a_vecs / np.linalg.norm(a_vecs, axis=1, keepdims=True)
 
         rel_err = np.abs(dut_ans / exp_ans - 1)
         dut._log.info(f"vector scale: {scale:>2}\tmean relative error: {np.mean(rel_err) * 100:.6f}%")
+        scoreboard.report(dut._log)
 
         return np.mean(rel_err)
 
@@ -95,18 +94,18 @@ def runner():
     parameters = {}
 
     sys.path.append(str(proj_path / "sim"))
+    from build_cache import build_cached
     hdl_toplevel = "fp_vec3_normalize"
     
     runner = get_runner(sim)
-    runner.build(
+    build_cached(
+        runner,
         sources=sources,
         hdl_toplevel=hdl_toplevel,
-        always=True,
         build_args=build_test_args,
         parameters=parameters,
         timescale=("1ns", "1ps"),
         waves=True,
-        build_dir=(proj_path / "sim" / "sim_build")
     )
     run_test_args = []
     runner.test(
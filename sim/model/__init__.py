@@ -0,0 +1,9 @@
+"""
+model: whole-frame software models of the rtx pipeline
+
+Trace every pixel of a frame at once with NumPy arrays instead of one ray at
+a time through an RTL simulator, either in float32 or bit-accurate fp24
+(through sim/fpmodel).
+"""
+
+from .wavefront import Float32Math, Fp24Math, SceneArrays, Wavefront
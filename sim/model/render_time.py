@@ -0,0 +1,179 @@
+"""
+render_time.py
+
+Predicts how long a scene takes to render without simulating or flashing it.
+ray_tracer.sv's FSM makes the cost of a ray a closed form of its bounces:
+
+    INTX pass:  num_objs (one round-robin sweep of scene_buffer) + SPHERE_INTX_DELAY + 2
+    REFLECT:    ray_reflector's done_pipe depth + 1
+    rtx_tb_parallel adds ray_maker's latency (8 + VEC3_NORM_DELAY) in front,
+    the FPGA's ray_caster hides it behind the previous ray
+
+with one INTX pass per bounce, plus one more for rays that end on a miss.
+Delays are read from the SystemVerilog, the bounce distribution comes from the
+float32 wavefront model at a reduced resolution.
+
+    python sim/model/render_time.py ctrl/scenes/knight.json --width 1280 --height 720
+"""
+
+import os
+import re
+import sys
+import json
+import time
+from pathlib import Path
+from argparse import ArgumentParser
+
+import numpy as np
+
+proj_path = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(proj_path / "sim"))
+sys.path.append(str(proj_path / "ctrl"))
+
+from utils import parse_sv_params
+from make_scene_buffer import bounce_limit
+from model.wavefront import Wavefront
+
+parser = ArgumentParser()
+parser.add_argument("scene", type=str)
+parser.add_argument("--width", type=int, default=1280)
+parser.add_argument("--height", type=int, default=720)
+parser.add_argument("--frames", type=int, default=1, help="samples per pixel of the RTL render")
+parser.add_argument("--max-bounces", type=int, default=None, help="override the scene's max_bounces")
+parser.add_argument("--model-width", type=int, default=160, help="width the bounce distribution is estimated at")
+parser.add_argument("--model-samples", type=int, default=1)
+parser.add_argument("--clock-mhz", type=float, default=100)
+parser.add_argument("--sim-rate", type=float, default=None, help="simulated cycles/s per Verilator process (default: measured from the last parallel render)")
+parser.add_argument("--workers", type=int, default=os.cpu_count(), help="parallel simulator processes")
+
+HDL_PATH = proj_path / "hdl"
+
+# Chunk sidecars of the last test_rtx_parallel.py render
+CHUNKS_DIR = proj_path / "sim" / "sim_build" / "rtx_parallel" / "chunks"
+
+
+def pipeline_depth(path: Path, instance: str, params: dict):
+    """
+    DEPTH of the `pipeline` instance named `instance` in a SystemVerilog file
+    """
+    with open(path) as fin:
+        match = re.search(r"\.DEPTH\(([^;]*?)\)\s*\)\s*" + instance + r"\s*\(", fin.read())
+    assert match is not None, f"No pipeline {instance} in {path}"
+    return int(eval(match.group(1), {}, dict(params)))
+
+
+def load_delays():
+    """
+    Per-stage latencies of the rtx pipeline, in cycles
+    """
+    params = parse_sv_params(HDL_PATH / "constants.sv")
+    for name in ("quadratic_solver.sv", "sphere_intersector.sv"):
+        params = parse_sv_params(HDL_PATH / "math" / name, params)
+
+    return {
+        # new_ray to ray_valid of ray_maker
+        "maker": pipeline_depth(HDL_PATH / "rtx" / "ray_maker.sv", "valid_pipe", params),
+        # ray_valid_intx -> ray_valid_piped, then the post_obj_count sweep, hit_valid and the FSM
+        "intx": params["SPHERE_INTX_DELAY"] + 2,
+        # hit_valid -> reflect_done, and the FSM
+        "reflect": pipeline_depth(HDL_PATH / "rtx" / "ray_reflector.sv", "done_pipe", params) + 1,
+        # ray_done through the 565 conversion
+        "done": 1,
+    }
+
+
+def ray_cycles(n_bounces: np.ndarray, max_bounces: int, num_objs: int, delays: dict):
+    """
+    Cycles ray_tracer spends in INTX + REFLECT on rays that took n_bounces reflections
+    """
+    # Rays that stopped before the bounce limit ended on a miss, which took an extra pass
+    ended_on_miss = n_bounces < bounce_limit(max_bounces)
+    n_passes = n_bounces + ended_on_miss
+    return n_passes * (num_objs + delays["intx"]) + n_bounces * delays["reflect"]
+
+
+def measured_sim_rate(chunks_dir: Path = CHUNKS_DIR):
+    """
+    Simulated cycles per wall-clock second of one simulator, over the chunks
+        of the last parallel render that recorded their wall time
+    """
+    cycles = wall_time = 0
+    for path in chunks_dir.glob("chunk_*.json"):
+        with open(path) as fin:
+            stats = json.load(fin)
+        if stats.get("wall_time"):
+            cycles += stats["cycles"]
+            wall_time += stats["wall_time"]
+    return cycles / wall_time if wall_time else None
+
+
+def bounce_distribution(scene: dict, width: int, height: int, samples: int = 1):
+    """
+    Reflections taken by every primary ray of the float32 model, at width x height
+    """
+    wavefront = Wavefront(scene)
+    return np.concatenate([
+        wavefront.trace(*wavefront.make_rays(width, height))[1]
+        for _ in range(samples)
+    ]), wavefront.arrays.n_objs
+
+
+def predict(scene: dict, width: int, height: int, frames: int = 1, model_width: int = 160, model_samples: int = 1):
+    """
+    Predicted cycles of a scene: per ray, per RTL render and per FPGA frame
+    """
+    delays = load_delays()
+    max_bounces = int(scene["max_bounces"])
+
+    model_height = max(1, round(model_width * height / width))
+    n_bounces, num_objs = bounce_distribution(scene, model_width, model_height, model_samples)
+    tracer_cycles = ray_cycles(n_bounces, max_bounces, num_objs, delays)
+
+    # rtx_tb_parallel's stat_cycles, new_ray to ray_done
+    cycles = delays["maker"] + tracer_cycles + delays["done"]
+    # Testbench: plus a cycle to issue the next new_ray
+    tb_cycles = cycles + 1
+    # FPGA: ray_caster staged the next ray already and releases it the cycle after ray_done
+    fpga_cycles = 1 + tracer_cycles + delays["done"] + 1
+
+    return {
+        "num_objs": num_objs,
+        "max_bounces": max_bounces,
+        "delays": delays,
+        "bounce_hist": np.bincount(n_bounces, minlength=max(max_bounces, 0) + 1).tolist(),
+        "mean_bounces": float(np.mean(n_bounces)),
+        "ray_cycles": {f"p{p}": float(np.percentile(cycles, p)) for p in (50, 90, 99)} | {"mean": float(np.mean(cycles))},
+        "tb_cycles": float(np.mean(tb_cycles)) * width * height * frames,
+        "fpga_frame_cycles": float(np.mean(fpga_cycles)) * width * height,
+    }
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    with open(args.scene) as fin:
+        scene = json.load(fin)
+    if args.max_bounces is not None:
+        scene["max_bounces"] = args.max_bounces
+
+    start = time.time()
+    pred = predict(scene, args.width, args.height, args.frames, args.model_width, args.model_samples)
+    print(f"Modeled the bounce distribution in {time.time() - start:.2f}s")
+
+    print(f"Delays: {pred['delays']}")
+    print(f"num_objs {pred['num_objs']}, max_bounces {pred['max_bounces']}, "
+          f"cycles per INTX pass {pred['num_objs'] + pred['delays']['intx']}")
+    print(f"Bounces per ray: mean {pred['mean_bounces']:.2f}, histogram {pred['bounce_hist']}")
+    print("Cycles per ray (new_ray to ray_done): " + ", ".join(f"{key} {value:.0f}" for key, value in pred["ray_cycles"].items()))
+
+    fps = args.clock_mhz * 1e6 / pred["fpga_frame_cycles"]
+    print(f"\nFPGA: {pred['fpga_frame_cycles']:.3g} cycles per {args.width}x{args.height} frame, "
+          f"{fps:.3g} frames/s at {args.clock_mhz:g} MHz")
+
+    print(f"RTL render ({args.frames} spp): {pred['tb_cycles']:.3g} cycles")
+    sim_rate = args.sim_rate or measured_sim_rate()
+    if sim_rate:
+        wall_time = pred["tb_cycles"] / (sim_rate * args.workers)
+        print(f"Verilator: {wall_time:.0f}s ({wall_time / 3600:.2f} h) at {sim_rate:.3g} cycles/s x {args.workers} workers")
+    else:
+        print("Verilator: no measured sim rate yet, render once with test_rtx_parallel.py or pass --sim-rate")
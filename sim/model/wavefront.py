@@ -0,0 +1,769 @@
+"""
+wavefront.py
+
+Traces all pixels of a frame at once, following ray_tracer.sv stage by stage:
+    ray_maker -> (INTX: ray_intersector -> REFLECT: ray_reflector) * max_bounces
+Every stage works on arrays of rays, intersections are computed rays x objects
+in blocks, and a per-ray mask plays the role of the IDLE/INTX/REFLECT FSM.
+
+Arithmetic is pluggable: Float32Math for fast previews, Fp24Math for the same
+truncating fp24 ops as hdl/math (through sim/fpmodel). The LFSRs are replaced
+by NumPy generators with the same distributions, so fp24 renders match the
+hardware's arithmetic, not its exact noise.
+
+    python sim/model/wavefront.py ctrl/scenes/knight.json --width 1280 --height 720 --math float32
+"""
+
+import sys
+import json
+import time
+from pathlib import Path
+from argparse import ArgumentParser
+
+import numpy as np
+from PIL import Image
+
+proj_path = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(proj_path / "sim"))
+sys.path.append(str(proj_path / "ctrl"))
+
+import fpmodel
+from fpmodel.params import FP_BITS, FP_EXP_BITS, FP_MANT_BITS, FP_EXP_OFFSET, FP_ONE
+from utils import make_fp_array, convert_fp_array
+from camera import Camera
+from make_scene_buffer import pack_scene, scene_objects, build_bvh, object_bounds, bounce_limit
+
+parser = ArgumentParser()
+parser.add_argument("scene", type=str)
+parser.add_argument("--width", type=int, default=320)
+parser.add_argument("--height", type=int, default=180)
+parser.add_argument("--samples", type=int, default=1, help="samples per pixel")
+parser.add_argument("--math", choices=["float32", "fp24"], default="float32")
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--bvh", action="store_true", help="traverse a SAH BVH instead of sweeping every object")
+parser.add_argument("--leaf-size", type=int, default=4)
+parser.add_argument("--out", type=str, default="wavefront.png")
+
+# Constants baked into the hardware
+TRIG_EPSILON = 0x2f0000     # trig_intersector.sv EPSILON
+ORIGIN_EPSILON = 0x370000   # ray_reflector.sv EPSILON
+
+# Max elements per rays x objects intermediate, bounds the memory of an intersection block
+BLOCK_ELEMS = 1 << 21
+
+
+class Float32Math:
+    """
+    IEEE float32 stand-ins for the fp units
+    """
+    name = "float32"
+
+    def const(self, x):
+        return np.asarray(x, dtype=np.float32)
+
+    def from_fp(self, bits):
+        return convert_fp_array(bits).astype(np.float32)
+
+    def to_float(self, x):
+        return np.asarray(x, dtype=np.float32)
+
+    def add(self, a, b):
+        return a + b
+
+    def sub(self, a, b):
+        return a - b
+
+    def mul(self, a, b):
+        return a * b
+
+    def shift(self, a, shift_amt: int):
+        return a * np.float32(2.0 ** shift_amt)
+
+    def neg(self, a):
+        return -a
+
+    def sign(self, a):
+        return np.signbit(a)
+
+    def greater(self, a, b):
+        # fp_greater compares magnitudes
+        return np.abs(a) > np.abs(b)
+
+    def magnitude_key(self, a):
+        return np.abs(a)
+
+    def sqrt(self, a):
+        return np.sqrt(a)
+
+    def inv(self, a):
+        return 1 / a
+
+    def scale(self, v, s):
+        return v * s[..., None]
+
+    def dot(self, v, w):
+        prod = v * w
+        return (prod[..., 0] + prod[..., 1]) + prod[..., 2]
+
+    def cross(self, v, w):
+        return np.cross(v, w).astype(np.float32)
+
+    def normalize(self, v):
+        return v / np.sqrt(self.dot(v, v))[..., None]
+
+    def lerp(self, v, w, t, one_sub_t):
+        return self.scale(v, one_sub_t) + self.scale(w, t)
+
+    def to_uint(self, x, width: int, frac: int):
+        """
+        convert_fp_uint: |x| * 2^frac as a saturating width-bit integer
+        """
+        n = np.floor(np.abs(x) * np.float32(2.0 ** frac))
+        return np.minimum(n, (1 << width) - 1).astype(np.int64)
+
+
+class Fp24Math:
+    """
+    Bit-accurate fp24 through sim/fpmodel, values are uint32 bit patterns
+    """
+    name = "fp24"
+
+    SIGN_BIT = 1 << (FP_BITS - 1)
+
+    def const(self, x):
+        return make_fp_array(x)
+
+    def from_fp(self, bits):
+        return np.asarray(bits, dtype=np.uint32)
+
+    def to_float(self, x):
+        return convert_fp_array(x).astype(np.float32)
+
+    def add(self, a, b):
+        return fpmodel.fp_add(a, b)
+
+    def sub(self, a, b):
+        return fpmodel.fp_sub(a, b)
+
+    def mul(self, a, b):
+        return fpmodel.fp_mul(a, b)
+
+    def shift(self, a, shift_amt: int):
+        return fpmodel.fp_shift(a, shift_amt)
+
+    def neg(self, a):
+        return np.asarray(a, dtype=np.uint32) ^ np.uint32(self.SIGN_BIT)
+
+    def sign(self, a):
+        return (np.asarray(a, dtype=np.uint32) & self.SIGN_BIT) != 0
+
+    def greater(self, a, b):
+        return fpmodel.fp_greater(a, b)
+
+    def magnitude_key(self, a):
+        # Exponent/mantissa bits order the same way as magnitudes
+        return np.asarray(a, dtype=np.uint32) & np.uint32(self.SIGN_BIT - 1)
+
+    def sqrt(self, a):
+        return fpmodel.fp_sqrt(a)
+
+    def inv(self, a):
+        return fpmodel.fp_inv(a)
+
+    def scale(self, v, s):
+        return fpmodel.vec3_scale(v, s)
+
+    def dot(self, v, w):
+        return fpmodel.vec3_dot(v, w)
+
+    def cross(self, v, w):
+        return fpmodel.vec3_cross(v, w)
+
+    def normalize(self, v):
+        return fpmodel.vec3_normalize(v)
+
+    def lerp(self, v, w, t, one_sub_t):
+        return fpmodel.vec3_lerp(v, w, t, one_sub_t)
+
+    def to_uint(self, x, width: int, frac: int):
+        """
+        convert_fp_uint, bit for bit
+        """
+        _, exp, mant = fpmodel.unpack(x)
+        shift_amt = np.clip(exp + frac - FP_EXP_OFFSET, 0, FP_MANT_BITS)
+        n = (((1 << FP_MANT_BITS) | mant) >> (FP_MANT_BITS - shift_amt)) & ((1 << width) - 1)
+        n = np.where(exp + frac > (width - 1) + FP_EXP_OFFSET, (1 << width) - 1, n)
+        return np.where(exp + frac < FP_EXP_OFFSET, 0, n)
+
+
+MATH = {"float32": Float32Math, "fp24": Fp24Math}
+
+
+def _fields(words: list[tuple[int, int]], widths: list[int]):
+    """
+    Split packed (bits, width) words into MSB-first fields, one object (Python int) array per field
+    """
+    fields = []
+    offset = words[0][1] if words else sum(widths)
+    for width in widths:
+        offset -= width
+        mask = (1 << width) - 1
+        fields.append(np.array([(bits >> offset) & mask for bits, _ in words], dtype=object))
+    return fields
+
+
+def _vec3(packed: np.ndarray):
+    """
+    Packed fp_vec3 field -> (n, 3) fp bit patterns
+    """
+    packed = packed.astype(object)
+    mask = (1 << FP_BITS) - 1
+    return np.stack([
+        (packed >> (2 * FP_BITS)) & mask,
+        (packed >> FP_BITS) & mask,
+        packed & mask,
+    ], axis=-1).astype(np.uint32).reshape(-1, 3)
+
+
+class SceneArrays:
+    """
+    A scene JSON as the hardware sees it: the scene buffer and material dictionary
+        words from pack_scene(), unpacked into per-field fp arrays of `math`'s type
+    """
+    def __init__(self, scene: dict, math):
+        obj_words, mat_words = pack_scene(scene)
+        self.n_objs = len(obj_words)
+        self.max_bounces = int(scene["max_bounces"])
+
+        # object: obj_type(2) mat_idx(8) | trig: v0 v0v1 v0v2 normal | sphere: center rad_sq rad_inv
+        obj_type, mat_idx, f0, f1, f2, f3 = _fields(obj_words, [2, 8, 72, 72, 72, 72])
+        self.obj_type = obj_type.astype(np.int64)
+        self.obj_mat = mat_idx.astype(np.int64)
+        self.is_sphere = self.obj_type == 0
+
+        self.v0 = math.from_fp(_vec3(f0))
+        self.v0v1 = math.from_fp(_vec3(f1))
+        self.v0v2 = math.from_fp(_vec3(f2))
+        self.trig_norm = math.from_fp(_vec3(f3))
+
+        self.center = self.v0
+        self.rad_sq = math.from_fp(((f1 >> (72 - FP_BITS)) & ((1 << FP_BITS) - 1)).astype(np.uint32))
+        self.rad_inv = math.from_fp(((f1 >> (72 - 2 * FP_BITS)) & ((1 << FP_BITS) - 1)).astype(np.uint32))
+
+        # material: color emit_color spec_color smoothness(fp) specular_prob(8)
+        color, emit, spec, smoothness, specular_prob = _fields(mat_words, [72, 72, 72, FP_BITS, 8])
+        self.mat_color = math.from_fp(_vec3(color))
+        self.mat_emit = math.from_fp(_vec3(emit))
+        self.mat_spec_color = math.from_fp(_vec3(spec))
+        self.mat_smoothness = math.from_fp(smoothness.astype(np.uint32))
+        self.mat_specular_prob = specular_prob.astype(np.int64)
+
+
+class Wavefront:
+    """
+    Whole-frame model of rtx_tb_parallel: ray_maker, then up to max_bounces
+        rounds of ray_intersector + ray_reflector, then the 565 conversion
+    """
+    def __init__(self, scene: dict, math: str = "float32", seed: int = 0, bvh: bool = False, leaf_size: int = 4, early_out: bool = False):
+        self.math = MATH[math]()
+        self.scene = scene
+        self.arrays = SceneArrays(scene, self.math)
+        self.rng = np.random.default_rng(seed)
+
+        m = self.math
+        self.fp_zero = m.from_fp(np.uint32(0))
+        self.fp_one = m.from_fp(np.uint32(FP_ONE))
+        self.trig_epsilon = m.from_fp(np.uint32(TRIG_EPSILON))
+        self.origin_epsilon = m.from_fp(np.uint32(ORIGIN_EPSILON))
+
+        # Per-object precomputation for the float32 sweep, built on first use
+        self._f32_objs = None
+        self._trig_epsilon_f = float(convert_fp_array(TRIG_EPSILON))
+
+        # Intersection work done so far, to compare the linear sweep against the BVH
+        self.stats = {"rays": 0, "objects_tested": 0, "nodes_visited": 0}
+
+        # Work a linear sweep with an early-out would do (see closest_objects)
+        self.early_out = early_out
+        if early_out:
+            self.stats.update(objects_until_closest=0, early_out_tested=0)
+            # Bounding spheres of the object bounds, planes can never be skipped
+            self._bound_center = np.zeros((self.arrays.n_objs, 3))
+            self._bound_rad = np.full(self.arrays.n_objs, np.inf)
+            for idx, bounds in enumerate(object_bounds(obj) for obj in scene_objects(scene)):
+                if bounds is not None:
+                    self._bound_center[idx] = (bounds[0] + bounds[1]) / 2
+                    self._bound_rad[idx] = np.linalg.norm(bounds[1] - bounds[0]) / 2
+
+        self.bvh = None
+        if bvh:
+            nodes, order, n_unbounded = build_bvh(scene_objects(scene), leaf_size)
+            self.bvh = {
+                "lo": np.array([node.bbox_min for node in nodes], dtype=np.float64).reshape(-1, 3),
+                "hi": np.array([node.bbox_max for node in nodes], dtype=np.float64).reshape(-1, 3),
+                "first": np.array([node.first for node in nodes], dtype=np.int64),
+                "count": np.array([node.count for node in nodes], dtype=np.int64),
+                "order": np.array(order, dtype=np.int64),
+                "n_unbounded": n_unbounded,
+                "depth": self._bvh_depth(nodes),
+            }
+
+    # ===== ray_maker =====
+    def make_rays(self, width: int, height: int, camera: Camera = None):
+        """
+        Primary rays for every pixel (row-major), with ray_maker's signed
+            8-bit subpixel noise. Defaults to the scene's camera rescaled for
+            width, like the testbenches.
+        """
+        m = self.math
+        camera = Camera.from_json(self.scene["camera"], width) if camera is None else camera
+        origin, forward, right, up = camera.vectors
+        forward, right, up = m.const(forward), m.const(right), m.const(up)
+
+        v, h = np.mgrid[0:height, 0:width]
+        u = m.const((h - width // 2).ravel())
+        v = m.const((height // 2 - v).ravel())
+
+        noise_u = m.const(self.rng.integers(-128, 128, len(u)) / 256)
+        noise_v = m.const(self.rng.integers(-128, 128, len(v)) / 256)
+        u_noisy = m.add(u, noise_u)
+        v_noisy = m.add(v, noise_v)
+
+        sum_ru = m.add(m.scale(right, u_noisy), m.scale(up, v_noisy))
+        ray_dir = m.normalize(m.add(sum_ru, forward))
+        ray_origin = np.broadcast_to(m.const(origin), ray_dir.shape).copy()
+        return ray_origin, ray_dir
+
+    # ===== ray_intersector =====
+    def _intersect_spheres(self, o, d, objs, full: bool = True):
+        """
+        sphere_intersector.sv, objs broadcasts against the rays (e.g. (K,) for
+            rays x K objects, (R, 1) for one object per ray)
+        Returns (hit, dist) or (hit, dist, pos, norm) if full
+        """
+        m, s = self.math, self.arrays
+        o, d = o[:, None, :], d[:, None, :]
+
+        L = m.sub(o, s.center[objs])
+        b = m.shift(m.dot(d, L), 1)
+        c = m.sub(m.dot(L, L), s.rad_sq[objs])
+
+        # quadratic_solver: x0 = (-b - sqrt(b^2 - 4c)) / 2
+        discr = m.sub(m.mul(b, b), m.shift(c, 2))
+        x0 = m.shift(m.sub(m.neg(b), m.sqrt(discr)), -1)
+        hit = ~m.sign(discr) & ~m.sign(x0)
+        if not full:
+            return hit, x0
+
+        ray_dir_by_x0 = m.scale(d, x0)
+        pos = m.add(ray_dir_by_x0, o)
+        norm = m.scale(m.add(ray_dir_by_x0, L), s.rad_inv[objs])
+        return hit, x0, pos, norm
+
+    def _intersect_trigs(self, o, d, objs, full: bool = True):
+        """
+        trig_intersector.sv (triangles, parallelograms, planes), objs as above
+        """
+        m, s = self.math, self.arrays
+        o, d = o[:, None, :], d[:, None, :]
+        v0v1, v0v2 = s.v0v1[objs], s.v0v2[objs]
+
+        pvec = m.cross(d, v0v2)
+        det = m.dot(v0v1, pvec)
+        tvec = m.sub(o, s.v0[objs])
+        u = m.dot(tvec, pvec)
+        qvec = m.cross(tvec, v0v1)
+        v = m.dot(d, qvec)
+        t = m.mul(m.dot(v0v2, qvec), m.inv(det))
+
+        det_sign = m.sign(det)
+        is_pos_u_v = (m.sign(u) == det_sign) & (m.sign(v) == det_sign)
+        in_square = m.greater(det, u) & m.greater(det, v)
+        in_trig = ~m.greater(m.add(u, v), det) & m.greater(det, self.trig_epsilon)
+
+        obj_type = s.obj_type[objs]
+        in_bounds = np.select(
+            [obj_type == 1, obj_type == 2],
+            [in_trig & is_pos_u_v, in_square & is_pos_u_v],
+            default=True,
+        )
+        hit = ~m.sign(t) & m.greater(t, self.trig_epsilon) & in_bounds
+        if not full:
+            return hit, t
+
+        pos = m.add(o, m.scale(d, t))
+        # Back faces get the normal with every sign bit flipped
+        norm = np.broadcast_to(s.trig_norm[objs], pos.shape)
+        norm = np.where(det_sign[..., None], m.neg(norm), norm)
+        return hit, t, pos, norm
+
+    def _float32_keys(self, o, d, objs):
+        """
+        Hit distances (inf on a miss) of rays x objs for the float32 preview.
+            Same tests as the intersectors, but every ray x object product is
+            rewritten with scalar triple products into (R, 3) @ (3, K) matmuls.
+        """
+        s = self.arrays
+        if self._f32_objs is None:
+            v0, e1, e2 = s.v0, s.v0v1, s.v0v2
+            self._f32_objs = {
+                "e1": e1, "e2": e2,
+                "e2xe1": np.cross(e2, e1),
+                "e2xv0": np.cross(e2, v0),
+                "v0xe1": np.cross(v0, e1),
+                "e1xe2": np.cross(e1, e2),
+                "e2_v0xe1": np.einsum("ok,ok->o", e2, np.cross(v0, e1)),
+                "center": v0,
+                "center_sq_sub_rad_sq": np.einsum("ok,ok->o", v0, v0) - s.rad_sq,
+            }
+        key = np.full((len(d), len(objs)), np.inf, dtype=np.float32)
+
+        spheres = np.flatnonzero(s.is_sphere[objs])
+        if len(spheres):
+            # b = 2 d.(o - c), c = |o - c|^2 - r^2
+            f = {k: v[objs[spheres]] for k, v in self._f32_objs.items()}
+            b = 2 * (np.einsum("rk,rk->r", d, o)[:, None] - d @ f["center"].T)
+            c = np.einsum("rk,rk->r", o, o)[:, None] - 2 * (o @ f["center"].T) + f["center_sq_sub_rad_sq"]
+            discr = b * b - 4 * c
+            x0 = (-b - np.sqrt(discr)) / 2
+            key[:, spheres] = np.where((discr >= 0) & (x0 >= 0), x0, np.inf)
+
+        trigs = np.flatnonzero(~s.is_sphere[objs])
+        if len(trigs):
+            # det = e1.(d x e2), u = (o - v0).(d x e2), v = d.((o - v0) x e1), t = e2.((o - v0) x e1) / det
+            f = {k: v[objs[trigs]] for k, v in self._f32_objs.items()}
+            o_x_d = np.cross(o, d)
+            det = d @ f["e2xe1"].T
+            u = o_x_d @ f["e2"].T - d @ f["e2xv0"].T
+            v = -(o_x_d @ f["e1"].T) - d @ f["v0xe1"].T
+            t = (o @ f["e1xe2"].T - f["e2_v0xe1"]) / det
+
+            abs_det = np.abs(det)
+            is_pos_u_v = (np.signbit(u) == np.signbit(det)) & (np.signbit(v) == np.signbit(det))
+            in_trig = ~(np.abs(u + v) > abs_det) & (abs_det > self._trig_epsilon_f)
+            in_square = (abs_det > np.abs(u)) & (abs_det > np.abs(v))
+            obj_type = s.obj_type[objs[trigs]]
+            in_bounds = np.select(
+                [obj_type == 1, obj_type == 2],
+                [in_trig & is_pos_u_v, in_square & is_pos_u_v],
+                default=True,
+            )
+            key[:, trigs] = np.where(in_bounds & (t > self._trig_epsilon_f), t, np.inf)
+
+        return key
+
+    def closest_objects(self, ray_origin, ray_dir, block_elems: int = BLOCK_ELEMS):
+        """
+        Index of the closest object hit by every ray (-1 on a miss), swept like
+            ray_intersector: a later object only replaces the running hit if it
+            is strictly closer (fp_greater), so ties go to the first object.
+        Works on blocks of rays x objects of at most block_elems elements,
+            or traverses the BVH if there is one.
+        """
+        m, s = self.math, self.arrays
+        n_rays = len(ray_dir)
+        self.stats["rays"] += n_rays
+        if self.bvh is not None:
+            return self._bvh_closest_objects(ray_origin, ray_dir)
+
+        self.stats["objects_tested"] += n_rays * s.n_objs
+        best_obj = np.full(n_rays, -1, dtype=np.int64)
+        if s.n_objs == 0:
+            return best_obj
+
+        ray_block = min(n_rays, max(1, block_elems // min(s.n_objs, 256)))
+        obj_block = max(1, block_elems // max(ray_block, 1))
+
+        with np.errstate(all="ignore"):
+            for r0 in range(0, n_rays, ray_block):
+                o, d = ray_origin[r0:r0 + ray_block], ray_dir[r0:r0 + ray_block]
+                best_key = np.full(len(d), np.inf)
+
+                for k0 in range(0, s.n_objs, obj_block):
+                    objs = np.arange(k0, min(k0 + obj_block, s.n_objs))
+                    if m.name == "float32":
+                        key = self._float32_keys(o, d, objs)
+                    else:
+                        key = np.full((len(d), len(objs)), np.inf)
+
+                        # Each object type goes through its own intersector
+                        for is_sphere, intersector in ((True, self._intersect_spheres), (False, self._intersect_trigs)):
+                            cols = np.flatnonzero(s.is_sphere[objs] == is_sphere)
+                            if len(cols) == 0:
+                                continue
+                            hit, dist = intersector(o, d, objs[cols], full=False)
+                            key[:, cols] = np.where(hit, m.magnitude_key(dist), np.inf)
+
+                    if self.early_out:
+                        self._count_early_out(o, d, objs, key, best_key)
+
+                    # argmin keeps the first of equal distances, like the sweep
+                    closest = np.argmin(key, axis=1)
+                    closest_key = key[np.arange(len(d)), closest]
+                    update = closest_key < best_key
+                    best_key = np.where(update, closest_key, best_key)
+                    best_obj[r0:r0 + ray_block][update] = objs[closest[update]]
+
+        if self.early_out:
+            self.stats["objects_until_closest"] += int(np.where(best_obj >= 0, best_obj + 1, s.n_objs).sum())
+        return best_obj
+
+    def _count_early_out(self, o, d, objs, key, best_key):
+        """
+        Objects of a block that a sweep with an early-out would still intersect:
+            those whose bounding sphere is not entirely beyond the closest hit
+            found earlier in the buffer
+        """
+        if self.math.name == "fp24":
+            # Keys are fp magnitudes, hits are never negative
+            finite = np.isfinite(key)
+            key = np.where(finite, convert_fp_array(np.where(finite, key, 0).astype(np.int64)), np.inf)
+            best_key = np.where(np.isfinite(best_key), convert_fp_array(np.where(np.isfinite(best_key), best_key, 0).astype(np.int64)), np.inf)
+
+        # Closest hit before each object: previous blocks, then the exclusive running min
+        best_before = np.minimum.accumulate(np.concatenate([best_key[:, None], key[:, :-1]], axis=1), axis=1)
+
+        o = self.math.to_float(o).astype(np.float64)
+        center, rad = self._bound_center[objs], self._bound_rad[objs]
+        center_dist = np.sqrt(np.maximum(
+            np.einsum("rk,rk->r", o, o)[:, None] - 2 * (o @ center.T) + np.einsum("ok,ok->o", center, center), 0
+        ))
+        near = np.maximum(center_dist - rad, 0)
+        self.stats["early_out_tested"] += int(np.count_nonzero(near <= best_before))
+
+    @staticmethod
+    def _bvh_depth(nodes):
+        depth, stack = 0, [(0, 1)] if nodes else []
+        while stack:
+            idx, level = stack.pop()
+            depth = max(depth, level)
+            if not nodes[idx].is_leaf:
+                stack += [(nodes[idx].first, level + 1), (nodes[idx].first + 1, level + 1)]
+        return depth
+
+    def _test_objects(self, o, d, objs):
+        """
+        One object per ray through its intersector, returns (hit, magnitude key, float distance)
+        """
+        m, s = self.math, self.arrays
+        hit = np.zeros(len(d), dtype=bool)
+        key = np.full(len(d), np.inf)
+        dist = np.full(len(d), np.inf)
+
+        for is_sphere, intersector in ((True, self._intersect_spheres), (False, self._intersect_trigs)):
+            rays = np.flatnonzero(s.is_sphere[objs] == is_sphere)
+            if len(rays) == 0:
+                continue
+            h, t = intersector(o[rays], d[rays], objs[rays, None], full=False)
+            hit[rays] = h[:, 0]
+            key[rays] = np.where(h[:, 0], m.magnitude_key(t[:, 0]), np.inf)
+            dist[rays] = np.where(h[:, 0], m.to_float(t[:, 0]), np.inf)
+
+        return hit, key, dist
+
+    def _bvh_closest_objects(self, ray_origin, ray_dir):
+        """
+        closest_objects() through the BVH: every ray tests the unbounded objects,
+            then walks the tree with its own stack (nearest child first), skipping
+            boxes that start beyond its closest hit so far. Ties go to the lower
+            scene buffer index, like the linear sweep.
+        """
+        bvh = self.bvh
+        n_rays = len(ray_dir)
+        best_obj = np.full(n_rays, -1, dtype=np.int64)
+        best_key = np.full(n_rays, np.inf)
+        best_dist = np.full(n_rays, np.inf)
+
+        def update(rays, objs):
+            hit, key, dist = self._test_objects(ray_origin[rays], ray_dir[rays], objs)
+            closer = hit & ((key < best_key[rays]) | ((key == best_key[rays]) & (objs < best_obj[rays])))
+            rays, objs = rays[closer], objs[closer]
+            best_obj[rays], best_key[rays], best_dist[rays] = objs, key[closer], dist[closer]
+            self.stats["objects_tested"] += len(closer)
+
+        all_rays = np.arange(n_rays)
+        with np.errstate(all="ignore"):
+            for obj in bvh["order"][:bvh["n_unbounded"]]:
+                update(all_rays, np.full(n_rays, obj))
+
+            if len(bvh["first"]) == 0:
+                return best_obj
+
+            o = self.math.to_float(ray_origin).astype(np.float64)
+            d = self.math.to_float(ray_dir).astype(np.float64)
+            inv_d = 1 / d
+            center = (bvh["lo"] + bvh["hi"]) / 2
+
+            stack = np.zeros((n_rays, bvh["depth"] + 1), dtype=np.int64)
+            sp = np.ones(n_rays, dtype=np.int64)
+
+            while True:
+                active = np.flatnonzero(sp > 0)
+                if len(active) == 0:
+                    break
+                sp[active] -= 1
+                node = stack[active, sp[active]]
+                self.stats["nodes_visited"] += len(active)
+
+                # Slab test, fmin/fmax drop the NaNs of rays parallel to a slab face
+                t0 = (bvh["lo"][node] - o[active]) * inv_d[active]
+                t1 = (bvh["hi"][node] - o[active]) * inv_d[active]
+                tmin = np.fmin(t0, t1).max(axis=1)
+                tmax = np.fmax(t0, t1).min(axis=1)
+                in_box = (tmax >= np.maximum(tmin, 0)) & (tmin <= best_dist[active])
+
+                count = bvh["count"][node]
+                leaf = in_box & (count > 0)
+                rays, first, count = active[leaf], bvh["first"][node[leaf]], count[leaf]
+                for j in range(count.max(initial=0)):
+                    has_j = j < count
+                    update(rays[has_j], bvh["order"][first[has_j] + j])
+
+                inner = in_box & (bvh["count"][node] == 0)
+                rays, left = active[inner], bvh["first"][node[inner]]
+                right = left + 1
+
+                # Push the far child first so the near one is popped next
+                left_near = np.einsum("rk,rk->r", d[rays], center[right] - center[left]) >= 0
+                for child in (np.where(left_near, right, left), np.where(left_near, left, right)):
+                    stack[rays, sp[rays]] = child
+                    sp[rays] += 1
+
+        return best_obj
+
+    def intersect(self, ray_origin, ray_dir):
+        """
+        ray_intersector.sv for every ray
+            Returns (hit_any, hit_pos, hit_norm, hit_mat_idx)
+        """
+        s = self.arrays
+        best_obj = self.closest_objects(ray_origin, ray_dir)
+        hit_any = best_obj >= 0
+
+        hit_pos = np.zeros_like(ray_dir)
+        hit_norm = np.zeros_like(ray_dir)
+        hit_mat = np.where(hit_any, s.obj_mat[best_obj], 0)
+
+        # Recompute the winning intersection per ray for its position and normal
+        with np.errstate(all="ignore"):
+            for is_sphere, intersector in ((True, self._intersect_spheres), (False, self._intersect_trigs)):
+                rays = np.flatnonzero(hit_any & (s.is_sphere[best_obj] == is_sphere))
+                if len(rays) == 0:
+                    continue
+                _, _, pos, norm = intersector(ray_origin[rays], ray_dir[rays], best_obj[rays, None])
+                hit_pos[rays] = pos[:, 0]
+                hit_norm[rays] = norm[:, 0]
+
+        return hit_any, hit_pos, hit_norm, hit_mat
+
+    # ===== ray_reflector =====
+    def reflect(self, ray_dir, ray_color, income_light, hit_pos, hit_norm, hit_mat):
+        """
+        ray_reflector.sv: lerp between a diffuse and a specular bounce by
+            smoothness with probability specular_prob, add emitted light
+        Returns (new_dir, new_origin, new_color, new_income_light)
+        """
+        m, s = self.math, self.arrays
+        n_rays = len(ray_dir)
+
+        # prng8 <= specular_prob picks the specular branch
+        rng_specular = self.rng.integers(0, 256, n_rays)
+        is_specular = rng_specular <= s.mat_specular_prob[hit_mat]
+        spec_amt = np.where(is_specular, s.mat_smoothness[hit_mat], self.fp_zero)
+        one_sub_spec_amt = m.sub(self.fp_one, spec_amt)
+
+        # prng_sphere: three signed 16-bit ints, normalized
+        rng_vec = m.normalize(m.const(self.rng.integers(-(1 << 15), 1 << 15, (n_rays, 3))))
+        diffuse_dir = m.normalize(m.add(rng_vec, hit_norm))
+
+        # specular_reflect: d - 2 (d . n) n
+        specular_dir = m.sub(ray_dir, m.scale(hit_norm, m.shift(m.dot(ray_dir, hit_norm), 1)))
+        new_dir = m.normalize(m.lerp(diffuse_dir, specular_dir, spec_amt, one_sub_spec_amt))
+
+        new_origin = m.add(hit_pos, m.scale(hit_norm, self.origin_epsilon))
+
+        extra_income_light = m.mul(ray_color, s.mat_emit[hit_mat])
+        new_income_light = m.add(extra_income_light, income_light)
+
+        true_mat_color = m.lerp(s.mat_color[hit_mat], s.mat_spec_color[hit_mat], spec_amt, one_sub_spec_amt)
+        new_color = m.mul(ray_color, true_mat_color)
+
+        return new_dir, new_origin, new_color, new_income_light
+
+    # ===== ray_tracer =====
+    def trace(self, ray_origin, ray_dir):
+        """
+        ray_tracer.sv's FSM for every ray at once: a ray leaves the loop when it
+            misses (INTX) or after max_bounces reflections (REFLECT).
+        Returns (pixel_color, n_bounces), pixel_color in `math`'s type
+        """
+        m, s = self.math, self.arrays
+        n_rays = len(ray_dir)
+
+        ray_origin, ray_dir = ray_origin.copy(), ray_dir.copy()
+        ray_color = np.broadcast_to(self.fp_one, ray_dir.shape).copy()
+        income_light = np.broadcast_to(self.fp_zero, ray_dir.shape).copy()
+        pixel_color = income_light.copy()
+        n_bounces = np.zeros(n_rays, dtype=np.int64)
+
+        active = np.arange(n_rays)
+
+        for bounce_count in range(bounce_limit(s.max_bounces)):
+            hit_any, hit_pos, hit_norm, hit_mat = self.intersect(ray_origin[active], ray_dir[active])
+
+            # INTX -> IDLE on a miss
+            active, hit_pos, hit_norm, hit_mat = active[hit_any], hit_pos[hit_any], hit_norm[hit_any], hit_mat[hit_any]
+            if len(active) == 0:
+                break
+
+            new_dir, new_origin, new_color, new_income_light = self.reflect(
+                ray_dir[active], ray_color[active], income_light[active], hit_pos, hit_norm, hit_mat
+            )
+            ray_dir[active] = new_dir
+            ray_origin[active] = new_origin
+            ray_color[active] = new_color
+            income_light[active] = new_income_light
+            pixel_color[active] = new_income_light
+            n_bounces[active] = bounce_count + 1
+
+        return pixel_color, n_bounces
+
+    def to_rgb565(self, pixel_color):
+        """
+        rtx_tb_parallel's convert_fp_uint 565 packing, unpacked to 8-bit RGB
+        """
+        m = self.math
+        r = m.to_uint(pixel_color[..., 0], 5, 5)
+        g = m.to_uint(pixel_color[..., 1], 6, 6)
+        b = m.to_uint(pixel_color[..., 2], 5, 5)
+        return np.stack([r << 3, g << 2, b << 3], axis=-1).astype(np.uint8)
+
+    def render(self, width: int, height: int, samples: int = 1):
+        """
+        Mean of `samples` 565 frames, (H, W, 3) float32 in [0, 255]
+        """
+        acc = np.zeros((width * height, 3), dtype=np.float32)
+        for _ in range(samples):
+            pixel_color, _ = self.trace(*self.make_rays(width, height))
+            acc += self.to_rgb565(pixel_color)
+        return (acc / samples).reshape((height, width, 3))
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    with open(args.scene) as fin:
+        scene = json.load(fin)
+
+    start = time.time()
+    wavefront = Wavefront(scene, args.math, args.seed, args.bvh, args.leaf_size)
+    img = wavefront.render(args.width, args.height, args.samples)
+    print(f"Rendered {args.width}x{args.height} @ {args.samples} spp ({args.math}) in {time.time() - start:.2f}s")
+
+    stats = wavefront.stats
+    print(f"Objects tested per ray: {stats['objects_tested'] / stats['rays']:.1f} (linear sweep: {wavefront.arrays.n_objs})")
+    if args.bvh:
+        print(f"BVH nodes visited per ray: {stats['nodes_visited'] / stats['rays']:.1f}")
+
+    Image.fromarray(np.clip(img, 0, 255).astype("uint8")).save(args.out)
+    print(f"Wrote {args.out}")
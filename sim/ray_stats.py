@@ -0,0 +1,76 @@
+# Per-pixel ray statistics from rtx_tb_parallel's stat_* outputs
+
+import json
+
+import numpy as np
+from PIL import Image
+
+# Name of each statistic, and the rtx_tb_parallel output it is read from
+RAY_STATS = {
+    "ray_cycles": "stat_cycles",
+    "bounces": "stat_bounces",
+    "intx_cycles": "stat_intx_cycles",
+    "reflect_cycles": "stat_reflect_cycles",
+}
+
+PERCENTILES = (50, 90, 99)
+
+# Dark purple -> red -> yellow, like matplotlib's inferno
+HEATMAP_COLORS = np.array([
+    [0, 0, 4],
+    [87, 16, 110],
+    [188, 55, 84],
+    [249, 142, 9],
+    [252, 255, 164],
+], dtype=np.float32)
+
+
+def read_ray_stats(dut):
+    """
+    Statistics of the ray that just finished, in RAY_STATS order
+    """
+    return [getattr(dut, port).value.integer for port in RAY_STATS.values()]
+
+
+def summarize(stats: dict[str, np.ndarray]):
+    """
+    Mean, max and PERCENTILES of each statistic
+    """
+    summary = {}
+    for name, values in stats.items():
+        summary[name] = {"mean": float(np.mean(values)), "max": float(np.max(values))} if len(values) else {}
+        for p in PERCENTILES if len(values) else ():
+            summary[name][f"p{p}"] = float(np.percentile(values, p))
+    return summary
+
+
+def heatmap(values: np.ndarray, mask: np.ndarray = None):
+    """
+    Color a 2D array from 0 to its 99th percentile, masked out pixels are black
+    """
+    mask = np.ones(values.shape, dtype=bool) if mask is None else mask
+    hi = np.percentile(values[mask], 99) if mask.any() else 0
+    t = np.clip(values / hi, 0, 1) if hi > 0 else np.zeros(values.shape)
+
+    anchors = np.linspace(0, 1, len(HEATMAP_COLORS))
+    rgb = np.stack([np.interp(t, anchors, HEATMAP_COLORS[:, c]) for c in range(3)], axis=-1)
+    rgb[~mask] = 0
+    return Image.fromarray(rgb.astype("uint8"))
+
+
+def save_report(fb, prefix: str, meta: dict = None):
+    """
+    Heatmap PNG of every statistic of a Framebuffer and a JSON summary over its
+        rendered pixels, `prefix`_<stat>.png and `prefix`_stats.json
+    Returns the summary
+    """
+    mask = (fb.done != 0) & (fb.samples > 0)
+    shape = (fb.height, fb.width)
+
+    for name in RAY_STATS:
+        heatmap(np.asarray(fb.stats[name]).reshape(shape), mask.reshape(shape)).save(f"{prefix}_{name}.png")
+
+    summary = summarize({name: np.asarray(fb.stats[name])[mask] for name in RAY_STATS})
+    with open(f"{prefix}_stats.json", "w") as fout:
+        json.dump(dict(meta or {}, n_pixels=int(mask.sum()), stats=summary), fout, indent=2)
+    return summary
@@ -215,24 +215,22 @@ def runner():
     ]
     build_test_args = ["-Wall"]
 
-    build_dir = proj_path / "sim" / "sim_build"
-
     # values for parameters defined earlier in the code.
     parameters = {}
 
     sys.path.append(str(proj_path / "sim"))
+    from build_cache import build_cached
     hdl_toplevel = "ray_intersector"
     
     runner = get_runner(sim)
-    runner.build(
+    build_cached(
+        runner,
         sources=sources,
         hdl_toplevel=hdl_toplevel,
-        always=True,
         build_args=build_test_args,
         parameters=parameters,
         timescale=("1ns", "1ps"),
         waves=True,
-        build_dir=build_dir,
     )
     run_test_args = []
     runner.test(
@@ -21,6 +21,9 @@ from tqdm import tqdm
 
 sys.path.append(Path(__file__).resolve().parent.parent._str)
 from utils import convert_fp, make_fp, convert_fp_vec3, pack_bits, make_fp_vec3, FP_VEC3_BITS
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent / "ctrl"))
+from camera import Camera
+from sim_profile import profiled
 
 parser = ArgumentParser()
 parser.add_argument("--scale", type=float, default=0.5)
@@ -54,15 +57,13 @@ async def test_module(dut):
     dut.rst.value = 1
     dut.max_bounces = 3
 
-    dut.cam.value = pack_bits([
-        (make_fp_vec3((0, -20, 0)), FP_VEC3_BITS),            # origin
-        (make_fp_vec3((0, WIDTH / 2, 0)), FP_VEC3_BITS),    # forward
-        (make_fp_vec3((1, 0, 0)), FP_VEC3_BITS),            # right
-        (make_fp_vec3((0, 0, 1)), FP_VEC3_BITS),            # up
-        # (make_fp_vec3((0, 0, WIDTH / 2)), FP_VEC3_BITS),    # forward
-        # (make_fp_vec3((1, 0, 0)), FP_VEC3_BITS),            # right
-        # (make_fp_vec3((0, 1, 0)), FP_VEC3_BITS),            # up
-    ])
+    dut.cam.value = Camera(
+        origin=(0, -20, 0),
+        forward=(0, WIDTH / 2, 0),
+        right=(1, 0, 0),
+        up=(0, 0, 1),
+        width=WIDTH,
+    ).bits
     dut.num_objs.value = NUM_OBJS
 
     await ClockCycles(dut.clk, 100)
@@ -80,20 +81,21 @@ async def test_module(dut):
     dut._log.info(f"{WIDTH=}, {HEIGHT=}")
     dut._log.info(f"{scale=}")
 
-    for _ in tqdm(range(WIDTH * HEIGHT), ncols=80, gui=False):
-    # for _ in range(WIDTH * HEIGHT):
-        await RisingEdge(dut.ray_done)
+    with profiled(test_file, "0", 10, meta={"width": WIDTH, "height": HEIGHT}):
+        for _ in tqdm(range(WIDTH * HEIGHT), ncols=80, gui=False):
+        # for _ in range(WIDTH * HEIGHT):
+            await RisingEdge(dut.ray_done)
 
-        pixel_h = dut.pixel_h.value.integer
-        pixel_v = dut.pixel_v.value.integer
-        pixel_color = unpack_color8(dut.rtx_pixel.value.integer)
+            pixel_h = dut.pixel_h.value.integer
+            pixel_v = dut.pixel_v.value.integer
+            pixel_color = unpack_color8(dut.rtx_pixel.value.integer)
 
-        # dut._log.info(pixel_color)
+            # dut._log.info(pixel_color)
 
-        r, g, b = pixel_color
+            r, g, b = pixel_color
 
-        # dut._log.info(f"{pixel_h=}, {pixel_v=}, {pixel_color=}")
-        img.putpixel((pixel_h, pixel_v), (r, g, b))
+            # dut._log.info(f"{pixel_h=}, {pixel_v=}, {pixel_color=}")
+            img.putpixel((pixel_h, pixel_v), (r, g, b))
 
     img.save(proj_path / "sim" / "test.png")
 
@@ -123,10 +125,6 @@ def runner():
     ]
     build_test_args = ["-Wall"]
 
-    build_dir = proj_path / "sim" / "sim_build"
-    shutil.copy(SCENE_BUF_MEM_PATH, build_dir / "scene_buffer.mem")
-    shutil.copy(MAT_DICT_MEM_PATH, build_dir / "mat_dict.mem")
-
     # values for parameters defined earlier in the code.
     parameters = {
         "WIDTH": WIDTH,
@@ -134,18 +132,19 @@ def runner():
     }
 
     sys.path.append(str(proj_path / "sim"))
+    from build_cache import build_cached
     hdl_toplevel = "rtx_tb"
     
     runner = get_runner(sim)
-    runner.build(
+    build_cached(
+        runner,
         sources=sources,
         hdl_toplevel=hdl_toplevel,
-        always=True,
         build_args=build_test_args,
         parameters=parameters,
         timescale=("1ns", "1ps"),
         waves=True,
-        build_dir=build_dir,
+        mem_files=[SCENE_BUF_MEM_PATH, MAT_DICT_MEM_PATH],
     )
     run_test_args = []
     runner.test(
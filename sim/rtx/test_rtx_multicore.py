@@ -0,0 +1,349 @@
+"""
+test_rtx_multicore.py
+
+Renders a frame on rtx_tb_multicore with N ray tracers sharing one scene buffer,
+once per --cores value, and reports how throughput scales with N:
+
+    samples/kcycle   rays finished per simulated cycle, i.e. a multi-core FPGA
+                     build at the same clock (frames/s at --clock-mhz)
+    samples/s        rays per wall-clock second of the one Verilator process
+
+pixel_dispatcher hands every pixel to whichever core is idle, so Python only
+wakes up to drain the result buffer, same as test_rtx_parallel.py --hdl-seq.
+"""
+
+import warnings
+warnings.filterwarnings("ignore", category=UserWarning)
+
+import os
+import sys
+import json
+import hashlib
+import glob
+from pathlib import Path
+from argparse import ArgumentParser, BooleanOptionalAction
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, RisingEdge
+from cocotb.utils import get_sim_time
+from cocotb.runner import get_runner
+
+import numpy as np
+import time
+
+from PIL import Image
+from tqdm import tqdm
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent / "ctrl"))
+
+from utils import unpack_bits
+from camera import Camera
+from make_scene_buffer import export_scene
+from ray_stats import RAY_STATS, summarize
+from sim_profile import profiled
+from accumulate import PixelAccumulator
+from build_cache import build_cached, mem_files_hash, stage_mem_files
+from scene_loader import load_scene
+
+parser = ArgumentParser()
+parser.add_argument("--json", type=str, default=None)
+parser.add_argument("--scale", type=float, default=0.5)
+parser.add_argument("--frames", type=int, default=1, help="samples per pixel")
+parser.add_argument("--cores", type=str, default="1,2,4,8", help="comma-separated N_CORES to render with")
+parser.add_argument("--seed", type=int, default=None, help="fixes the LFSR seeds")
+parser.add_argument("--clock-mhz", type=float, default=100, help="FPGA clock for the frames/s model")
+parser.add_argument("--runtime-scene", action=BooleanOptionalAction, help="flash the --json scene in at runtime instead of baking .mem files into the build")
+
+args = parser.parse_args()
+
+if "TEST_WIDTH" in os.environ:
+    WIDTH = int(os.environ["TEST_WIDTH"])
+    HEIGHT = int(os.environ["TEST_HEIGHT"])
+    N_FRAMES = int(os.environ["TEST_N_FRAMES"])
+    N_CORES = int(os.environ["TEST_N_CORES"])
+    CAM_DATA = json.loads(os.environ["CAM_DATA"])
+    MAX_BOUNCES = int(os.environ["MAX_BOUNCES"])
+    RUNTIME_SCENE = "SCENE_JSON" in os.environ
+    if RUNTIME_SCENE:
+        with open(os.environ["SCENE_JSON"]) as fin:
+            SCENE = json.load(fin)
+    else:
+        SCENE = None
+    SEED = int(os.environ["TEST_SEED"])
+
+else:
+    WIDTH = int(32 * args.scale)
+    HEIGHT = int(18 * args.scale)
+    N_FRAMES = args.frames
+    N_CORES = None
+    SEED = args.seed if args.seed is not None else int.from_bytes(os.urandom(4))
+    RUNTIME_SCENE = bool(args.runtime_scene)
+    assert args.json or not RUNTIME_SCENE, "--runtime-scene needs a --json scene"
+
+    if args.json:
+        if not RUNTIME_SCENE:
+            export_scene(args.json)
+        with open(args.json) as fin:
+            SCENE = json.load(fin)
+        CAM_DATA = SCENE["camera"]
+        MAX_BOUNCES = SCENE["max_bounces"]
+
+    else:
+        CAM_DATA = {
+            "origin": [0, 0, 0],
+            "forward": [0, WIDTH, 0],
+            "right": [2, 0, 0],
+            "up": [0, 0, 2],
+        }
+        MAX_BOUNCES = 3
+        SCENE = None
+
+CORE_COUNTS = [int(n) for n in args.cores.split(",")]
+
+test_file = os.path.basename(__file__).replace(".py", "")
+
+proj_path = Path(__file__).resolve().parent.parent.parent
+SCENE_BUF_MEM_PATH = str(proj_path / "data" / "scene_buffer.mem")
+MAT_DICT_MEM_PATH = str(proj_path / "data" / "mat_dict.mem")
+
+if RUNTIME_SCENE:
+    NUM_OBJS = len(SCENE["objects"])
+    MEM_FILES = []
+else:
+    with open(SCENE_BUF_MEM_PATH, "r") as fin:
+        NUM_OBJS = fin.read().strip().count("\n") + 1
+    MEM_FILES = [SCENE_BUF_MEM_PATH, MAT_DICT_MEM_PATH]
+
+# One render (n<N>.npy/.json) per core count
+OUT_DIR = proj_path / "sim" / "sim_build" / "rtx_multicore"
+os.makedirs(OUT_DIR, exist_ok=True)
+
+SIM = os.getenv("SIM", "verilator")
+HDL_TOPLEVEL = "rtx_tb_multicore"
+
+SOURCES = [
+    proj_path / "hdl" / "pipeline.sv",
+    proj_path / "hdl" / "constants.sv",
+    proj_path / "hdl" / "types" / "types.sv",
+    *glob.glob(f"{proj_path}/hdl/math/*.sv", recursive=True),
+    *glob.glob(f"{proj_path}/hdl/rng/*.sv", recursive=True),
+    proj_path / "hdl" / "mem" / "xilinx_true_dual_port_read_first_2_clock_ram.v",
+    *glob.glob(f"{proj_path}/hdl/rtx/*.sv", recursive=True),
+]
+
+BUILD_TEST_ARGS = [
+    "-Wno-WIDTHEXPAND",
+    "-Wno-MULTIDRIVEN",
+    "-Wno-WIDTHTRUNC",
+    "-Wno-TIMESCALEMOD",
+    "-Wno-PINMISSING",
+    "-Wno-BLKSEQ",
+]
+
+CLK_PERIOD_NS = 10
+
+# pixel_dispatcher result entries, as rtx_tb_multicore packs them (MSB first)
+RESULT_FIELDS = [("pixel_h", 11), ("pixel_v", 10), ("core", 8), ("rtx_pixel", 16), *zip(RAY_STATS, (32, 8, 32, 32))]
+
+
+def parameters(n_cores: int):
+    params = {
+        "WIDTH": WIDTH,
+        "HEIGHT": HEIGHT,
+        "N_CORES": n_cores,
+    }
+    if RUNTIME_SCENE:
+        params["SCENE_INIT_FILE"] = '""'
+        params["MAT_INIT_FILE"] = '""'
+    return params
+
+
+def core_seed(core: int):
+    """
+    LFSR seed of a core, never zero (prng8 would get stuck)
+        Core 0 gets test_rtx_parallel.py's seed for chunk 0
+    """
+    seed = int.from_bytes(hashlib.sha256(f"{SEED}:{core}".encode()).digest()[:12])
+    return seed or 1
+
+
+@cocotb.test()
+async def test_module(dut):
+    cocotb.start_soon(Clock(dut.clk, CLK_PERIOD_NS, units="ns").start())
+
+    seeds = 0
+    for core in range(N_CORES):
+        seeds |= core_seed(core) << (96 * core)
+    dut.lfsr_seeds.value = seeds
+    dut.rst.value = 1
+    dut.flash_obj_wen.value = 0
+    dut.flash_mat_wen.value = 0
+    dut.seq_start.value = 0
+    dut.seq_drain.value = 0
+
+    if RUNTIME_SCENE:
+        # RAM writes ignore reset, so the scene goes in while we hold it
+        await load_scene(dut, SCENE)
+
+    dut.cam.value = Camera.from_json(CAM_DATA, WIDTH).bits
+    dut.num_objs.value = NUM_OBJS
+    dut.max_bounces.value = MAX_BOUNCES
+
+    await ClockCycles(dut.clk, 100)
+    dut.rst.value = 0
+
+    n_pixels = WIDTH * HEIGHT
+    accum = PixelAccumulator(n_pixels)
+    stats = np.zeros((n_pixels, len(RAY_STATS)), dtype=np.int64)
+    core_rays = np.zeros(N_CORES, dtype=np.int64)
+
+    start_cycles = get_sim_time("ns") // CLK_PERIOD_NS
+    start_time = time.time()
+
+    with profiled(test_file, f"n{N_CORES}", CLK_PERIOD_NS, meta={"width": WIDTH, "height": HEIGHT, "n_cores": N_CORES}):
+        # Whole frame, N_FRAMES passes
+        ports = ("seq_h_lo", "seq_h_hi", "seq_h_first", "seq_v_first", "seq_h_last", "seq_v_last")
+        for port, value in zip(ports, (0, WIDTH - 1, 0, 0, WIDTH - 1, HEIGHT - 1)):
+            getattr(dut, port).value = value
+        dut.seq_passes.value = N_FRAMES
+
+        dut.seq_start.value = 1
+        await ClockCycles(dut.clk, 1)
+        dut.seq_start.value = 0
+
+        pbar = tqdm(total=N_FRAMES * n_pixels, ncols=120, desc=f"[{N_CORES} cores]")
+        widths = [width for _, width in RESULT_FIELDS]
+        while True:
+            await RisingEdge(dut.seq_ready)
+
+            count = dut.seq_count.value.integer
+            for k in range(count):
+                pixel_h, pixel_v, core, rtx_pixel, *ray_stats = unpack_bits(dut.seq.results[k].value.integer, widths)
+                i = pixel_v * WIDTH + pixel_h
+                accum.add(i, unpack_color8(rtx_pixel))
+                stats[i] += ray_stats
+                core_rays[core] += 1
+            pbar.update(count)
+
+            if dut.seq_done.value:
+                break
+
+            dut.seq_drain.value = 1
+            await ClockCycles(dut.clk, 1)
+            dut.seq_drain.value = 0
+        pbar.close()
+
+    cycles = get_sim_time("ns") // CLK_PERIOD_NS - start_cycles
+    save_path = OUT_DIR / f"n{N_CORES}.npy"
+    np.save(save_path, accum.result())
+    np.save(save_path.with_name(f"n{N_CORES}_samples.npy"), accum.count)
+    with open(save_path.with_suffix(".json"), "w") as fout:
+        json.dump({
+            "n_cores": N_CORES,
+            "cycles": int(cycles),
+            "n_samples": int(accum.count.sum()),
+            "wall_time": time.time() - start_time,
+            "core_rays": core_rays.tolist(),
+            "stats": summarize({name: stats[:, j] / np.maximum(accum.count, 1) for j, name in enumerate(RAY_STATS)}),
+        }, fout)
+    dut._log.info(f"Saved {N_CORES}-core render to {save_path}")
+
+
+def unpack_color8(color8):
+    return (
+        ((color8 >> 0) & 0b11111) << 3,
+        ((color8 >> 5) & 0b111111) << 2,
+        ((color8 >> 11) & 0b11111) << 3
+    )
+
+
+def run_simulator(n_cores: int):
+    """Build (cached) and run the testbench with n_cores ray tracers."""
+
+    os.environ["TEST_WIDTH"] = str(WIDTH)
+    os.environ["TEST_HEIGHT"] = str(HEIGHT)
+    os.environ["TEST_N_FRAMES"] = str(N_FRAMES)
+    os.environ["TEST_N_CORES"] = str(n_cores)
+    os.environ["TEST_SEED"] = str(SEED)
+    os.environ["CAM_DATA"] = json.dumps(CAM_DATA)
+    os.environ["MAX_BOUNCES"] = str(MAX_BOUNCES)
+    if RUNTIME_SCENE:
+        os.environ["SCENE_JSON"] = str(Path(args.json).resolve())
+
+    runner = get_runner(SIM)
+    build_start = time.time()
+    build_cached(
+        runner,
+        sources=SOURCES,
+        hdl_toplevel=HDL_TOPLEVEL,
+        build_args=BUILD_TEST_ARGS,
+        parameters=parameters(n_cores),
+        mem_files=MEM_FILES,
+        timescale=("1ns", "1ps"),
+        waves=False,
+    )
+    print(f"Build ({n_cores} cores): {time.time() - build_start:.1f}s")
+
+    runner.test(
+        hdl_toplevel=HDL_TOPLEVEL,
+        test_module=test_file,
+        test_args=[],
+        waves=False,
+        # One run directory per scene, so concurrent runs never swap .mem files
+        test_dir=stage_mem_files(MEM_FILES, OUT_DIR / "run" / mem_files_hash(MEM_FILES)),
+    )
+
+
+if __name__ == "__main__":
+    print(f"Resolution: {WIDTH}x{HEIGHT}")
+    print(f"Frames: {N_FRAMES}")
+    print(f"Seed: {SEED}")
+    print(f"Cores: {CORE_COUNTS}")
+    print()
+
+    results = []
+    for n_cores in CORE_COUNTS:
+        result_path = OUT_DIR / f"n{n_cores}.json"
+        result_path.unlink(missing_ok=True)
+
+        run_simulator(n_cores)
+
+        with open(result_path) as fin:
+            results.append(json.load(fin))
+
+        # Every pixel should have come back N_FRAMES times
+        samples = np.load(OUT_DIR / f"n{n_cores}_samples.npy")
+        assert np.all(samples == N_FRAMES), f"{n_cores} cores: samples per pixel {samples.min()}..{samples.max()}, expected {N_FRAMES}"
+
+        pixels = np.load(OUT_DIR / f"n{n_cores}.npy")
+        Image.fromarray(np.clip(np.round(pixels), 0, 255).astype("uint8").reshape((HEIGHT, WIDTH, 3))).save(
+            f"test_rtx_multicore_{WIDTH}x{HEIGHT}_f{N_FRAMES}_n{n_cores}.png"
+        )
+
+    # Throughput relative to the first core count
+    base = results[0]
+    base_rate = base["n_samples"] / base["cycles"]
+    base_wall_rate = base["n_samples"] / base["wall_time"]
+    for result in results:
+        result["samples_per_cycle"] = result["n_samples"] / result["cycles"]
+        result["samples_per_s"] = result["n_samples"] / result["wall_time"]
+        result["cycle_speedup"] = result["samples_per_cycle"] / base_rate
+        result["wall_speedup"] = result["samples_per_s"] / base_wall_rate
+        # FPGA model: same clock, frames of WIDTH x HEIGHT at one sample per pixel
+        result["fpga_fps"] = args.clock_mhz * 1e6 * result["samples_per_cycle"] / (WIDTH * HEIGHT)
+
+    print(f"\n{'cores':>5} {'cycles':>10} {'samp/kcyc':>10} {'speedup':>8} {'fps@' + format(args.clock_mhz, 'g') + 'MHz':>12} "
+          f"{'wall':>8} {'samp/s':>9} {'speedup':>8}  rays per core")
+    for result in results:
+        print(
+            f"{result['n_cores']:5d} {result['cycles']:10d} {1000 * result['samples_per_cycle']:10.2f} {result['cycle_speedup']:7.2f}x "
+            f"{result['fpga_fps']:12.3g} {result['wall_time']:7.1f}s {result['samples_per_s']:9.1f} {result['wall_speedup']:7.2f}x  "
+            f"{result['core_rays']}"
+        )
+
+    scaling_path = OUT_DIR / f"scaling_{WIDTH}x{HEIGHT}_f{N_FRAMES}.json"
+    with open(scaling_path, "w") as fout:
+        json.dump({"width": WIDTH, "height": HEIGHT, "frames": N_FRAMES, "seed": SEED, "clock_mhz": args.clock_mhz, "results": results}, fout, indent=2)
+    print(f"\nScaling: {scaling_path}")
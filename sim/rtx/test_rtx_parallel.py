@@ -11,6 +11,7 @@ import os
 import sys
 import shutil
 import json
+import hashlib
 import subprocess
 import glob
 from pathlib import Path
@@ -19,6 +20,7 @@ from argparse import ArgumentParser, BooleanOptionalAction
 import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles, RisingEdge
+from cocotb.utils import get_sim_time
 from cocotb.runner import get_runner
 
 import numpy as np
@@ -30,8 +32,17 @@ from tqdm import tqdm
 sys.path.append(Path(__file__).resolve().parent.parent._str)
 sys.path.append(str(Path(__file__).resolve().parent.parent.parent / "ctrl"))
 
-from utils import make_fp_vec3, pack_bits, FP_BITS, FP_VEC3_BITS
-from make_scene_buffer import export_scene
+from utils import make_fp_vec3, pack_bits, unpack_bits, FP_BITS, FP_VEC3_BITS
+from camera import Camera
+from make_scene_buffer import export_scene, scene_manifest
+from work_queue import WorkQueue
+from tiles import make_tiles, task_pixel_indices, order_tasks, estimate_pixel_cost
+from framebuffer import Framebuffer
+from ray_stats import RAY_STATS, read_ray_stats, save_report
+from sim_profile import PROFILE_ENV, profiled, summarize_profiles, print_summary
+from accumulate import PixelAccumulator
+from build_cache import build_cached, cached_build_dir, mem_files_hash, stage_mem_files
+from scene_loader import load_scene
 
 # MULTIPROCESSING GO BRRR
 from multiprocessing import Pool
@@ -39,9 +50,21 @@ from multiprocessing import Pool
 parser = ArgumentParser()
 parser.add_argument("--chunks", type=int, default=None)
 parser.add_argument("--scale", type=float, default=0.5)
-parser.add_argument("--frames", type=int, default=1)
+parser.add_argument("--frames", type=int, default=1, help="samples per pixel")
 parser.add_argument("--waves", action=BooleanOptionalAction)
 parser.add_argument("--json", type=str, default=None)
+parser.add_argument("--persistent", action=BooleanOptionalAction, help="one long-lived simulator per core pulling chunks from a work queue")
+parser.add_argument("--tile", type=int, default=None, help="render square tiles of this size, most expensive first")
+parser.add_argument("--seed", type=int, default=None, help="fixes the LFSR seeds, renders with the same scene/resolution/seed resume")
+parser.add_argument("--resume", action=BooleanOptionalAction, default=True)
+parser.add_argument("--preview", type=float, default=10, help="seconds between preview PNGs")
+parser.add_argument("--accum", choices=["mean", "ema"], default="mean", help="float32 mean, or frame_buffer.sv's exponential moving average")
+parser.add_argument("--exp-ratio", type=int, default=None, help="EXP_RATIO for --accum ema (default: frame_buffer.sv)")
+parser.add_argument("--adaptive-var", type=float, default=None, help="stop sampling a pixel once the variance of its mean drops below this")
+parser.add_argument("--min-samples", type=int, default=4, help="samples before a pixel may stop early")
+parser.add_argument("--runtime-scene", action=BooleanOptionalAction, help="flash the --json scene in at runtime instead of baking .mem files into the build")
+parser.add_argument("--hdl-seq", action=BooleanOptionalAction, help="let rtx_tb_parallel's pixel_sequencer walk each chunk and drain its result buffer in bulk")
+parser.add_argument("--profile", action=BooleanOptionalAction, help="profile simulator vs Python time per worker (sim_profile.py)")
 
 args = parser.parse_args()
 
@@ -53,20 +76,43 @@ if "TEST_WIDTH" in os.environ:
     assert "CAM_DATA" in os.environ
     CAM_DATA = json.loads(os.environ["CAM_DATA"])
     MAX_BOUNCES = int(os.environ["MAX_BOUNCES"])
+    RUNTIME_SCENE = "SCENE_JSON" in os.environ
+    if RUNTIME_SCENE:
+        with open(os.environ["SCENE_JSON"]) as fin:
+            SCENE = json.load(fin)
+    else:
+        SCENE = None
+    SEED = int(os.environ["TEST_SEED"])
+    ACCUM_MODE = os.environ["ACCUM_MODE"]
+    EXP_RATIO = int(os.environ["EXP_RATIO"]) if "EXP_RATIO" in os.environ else None
+    ADAPTIVE_VAR = float(os.environ["ADAPTIVE_VAR"]) if "ADAPTIVE_VAR" in os.environ else None
+    MIN_SAMPLES = int(os.environ["MIN_SAMPLES"])
+    HDL_SEQ = "HDL_SEQ" in os.environ
 
 else:
     scale = args.scale
     WIDTH = int(32 * scale)
     HEIGHT = int(18 * scale)
     N_FRAMES = args.frames
+    SEED = args.seed if args.seed is not None else int.from_bytes(os.urandom(4))
+    ACCUM_MODE = args.accum
+    EXP_RATIO = args.exp_ratio
+    ADAPTIVE_VAR = args.adaptive_var
+    MIN_SAMPLES = args.min_samples
+    RUNTIME_SCENE = bool(args.runtime_scene)
+    assert args.json or not RUNTIME_SCENE, "--runtime-scene needs a --json scene"
+    HDL_SEQ = bool(args.hdl_seq)
+    assert not (HDL_SEQ and ADAPTIVE_VAR is not None), "--hdl-seq walks every pass over every pixel, it can't do --adaptive-var"
 
     # Parent caller, initialize scene params
     if args.json:
-        export_scene(args.json)
+        if not RUNTIME_SCENE:
+            export_scene(args.json)
         with open(args.json) as fin:
             data = json.load(fin)
             CAM_DATA = data["camera"]
             MAX_BOUNCES = data["max_bounces"]
+            SCENE = data
 
     else:
         CAM_DATA = {
@@ -76,17 +122,24 @@ else:
             "up": [0, 0, 2],
         }
         MAX_BOUNCES = 3
+        SCENE = None
         
 N_CHUNKS = args.chunks or (2 * os.cpu_count() * N_FRAMES)
 TOTAL_PIXELS = WIDTH * HEIGHT
 
-# Round up on chunk size
-CHUNK_SIZE = (TOTAL_PIXELS + N_CHUNKS - 1) // N_CHUNKS
-CHUNK_RANGES = [
-    (i * CHUNK_SIZE, min((i + 1) * CHUNK_SIZE - 1, TOTAL_PIXELS - 1))
-    for i in range((TOTAL_PIXELS + CHUNK_SIZE - 1) // CHUNK_SIZE)
-]
-NUM_CHUNKS_ACTUAL = len(CHUNK_RANGES)
+if args.tile:
+    # 2D tiles, scheduled by estimated cost
+    CHUNK_TASKS = make_tiles(WIDTH, HEIGHT, args.tile)
+else:
+    # Round up on chunk size
+    CHUNK_SIZE = (TOTAL_PIXELS + N_CHUNKS - 1) // N_CHUNKS
+    CHUNK_TASKS = [
+        {"start": i * CHUNK_SIZE, "end": min((i + 1) * CHUNK_SIZE - 1, TOTAL_PIXELS - 1)}
+        for i in range((TOTAL_PIXELS + CHUNK_SIZE - 1) // CHUNK_SIZE)
+    ]
+for chunk_idx, task in enumerate(CHUNK_TASKS):
+    task["chunk"] = chunk_idx
+NUM_CHUNKS_ACTUAL = int(os.environ.get("TEST_N_CHUNKS", len(CHUNK_TASKS)))
 
 test_file = os.path.basename(__file__).replace(".py", "")
 
@@ -94,16 +147,37 @@ proj_path = Path(__file__).resolve().parent.parent.parent
 SCENE_BUF_MEM_PATH = str(proj_path / "data" / "scene_buffer.mem")
 MAT_DICT_MEM_PATH = str(proj_path / "data" / "mat_dict.mem")
 
-with open(SCENE_BUF_MEM_PATH, "r") as fin:
-    NUM_OBJS = fin.read().strip().count("\n") + 1
+if RUNTIME_SCENE:
+    # Scene is written through the flash ports, nothing is baked into the build
+    NUM_OBJS = len(SCENE["objects"])
+    MEM_FILES = []
+else:
+    with open(SCENE_BUF_MEM_PATH, "r") as fin:
+        NUM_OBJS = fin.read().strip().count("\n") + 1
+    MEM_FILES = [SCENE_BUF_MEM_PATH, MAT_DICT_MEM_PATH]
+
+# Workers take the parent's hash, data/ may have been re-exported by another render since
+MEM_HASH = os.environ["MEM_HASH"] if "TEST_WIDTH" in os.environ else mem_files_hash(MEM_FILES)
 
 # Location to store chunk .npy files
 CHUNKS_OUT_DIR = proj_path / "sim" / "sim_build" / "rtx_parallel" / "chunks"
 os.makedirs(CHUNKS_OUT_DIR, exist_ok=True)
 
-# Single shared build directory for all workers
-BUILD_DIR = proj_path / "sim" / "sim_build" / "rtx_parallel" / f"verilator_{WIDTH}x{HEIGHT}"
-os.makedirs(BUILD_DIR, exist_ok=True)
+# Pixel ranges waiting for a persistent worker
+WORK_QUEUE_DIR = proj_path / "sim" / "sim_build" / "rtx_parallel" / "queue"
+
+# Framebuffers merged into as chunks finish, one per scene/resolution/frames/--seed (one shared by unseeded renders)
+FRAMES_DIR = proj_path / "sim" / "sim_build" / "rtx_parallel" / "frames"
+
+# Where the simulators run, holding a copy of the scene .mem files, one per scene
+#     so concurrent renders of different scenes never overwrite each other's
+RUN_DIR = proj_path / "sim" / "sim_build" / "rtx_parallel" / "run" / MEM_HASH
+
+# Per-worker profiles of a --profile render
+PROFILE_DIR = proj_path / "sim" / "sim_build" / "rtx_parallel" / "profile"
+
+# Measured cycles per pixel from the last render, used to order the next one
+COST_HISTORY_PATH = proj_path / "sim" / "sim_build" / "rtx_parallel" / f"cost_{Path(args.json).stem if args.json else 'default'}_{WIDTH}x{HEIGHT}.npy"
 
 # Common configuration for Verilator build and test
 SIM = os.getenv("SIM", "verilator")
@@ -130,28 +204,52 @@ BUILD_TEST_ARGS = [
     "-Wno-BLKSEQ",
 ]
 
+CLK_PERIOD_NS = 10
+
+# Reset cycles that load a chunk's LFSR seed
+RESEED_CYCLES = 4
+
+# pixel_sequencer result entries, as rtx_tb_parallel packs them (MSB first)
+SEQ_RESULT_FIELDS = [("pixel_h", 11), ("pixel_v", 10), ("rtx_pixel", 16), *zip(RAY_STATS, (32, 8, 32, 32))]
+
 PARAMETERS = {
     "WIDTH": WIDTH,
     "HEIGHT": HEIGHT,
 }
+if RUNTIME_SCENE:
+    PARAMETERS["SCENE_INIT_FILE"] = '""'
+    PARAMETERS["MAT_INIT_FILE"] = '""'
+
+# Single shared build directory for all workers, keyed on everything that goes into the build
+BUILD_DIR = cached_build_dir(
+    SIM, HDL_TOPLEVEL, SOURCES, PARAMETERS, BUILD_TEST_ARGS,
+    mem_files=MEM_FILES,
+    timescale=("1ns", "1ps"),
+    waves=True,
+)
 
 
 @cocotb.test()
 async def test_module(dut):
     # dut._log.info("Starting...")
-    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    cocotb.start_soon(Clock(dut.clk, CLK_PERIOD_NS, units="ns").start())
 
     # dut._log.info("Holding reset...")
-    dut.lfsr_seed.value = int.from_bytes(os.urandom(12))
+    # render_chunk reseeds for every chunk, this one only gets us through reset
+    dut.lfsr_seed.value = chunk_seed(-1)
     dut.rst.value = 1
-
-    cam_scale = WIDTH / 1280
-    dut.cam.value = pack_bits([
-        (make_fp_vec3(CAM_DATA["origin"]), FP_VEC3_BITS),
-        (make_fp_vec3([v * cam_scale for v in CAM_DATA["forward"]]), FP_VEC3_BITS),
-        (make_fp_vec3(CAM_DATA["right"]), FP_VEC3_BITS),
-        (make_fp_vec3(CAM_DATA["up"]), FP_VEC3_BITS),
-    ])
+    dut.flash_obj_wen.value = 0
+    dut.flash_mat_wen.value = 0
+    dut.new_ray.value = 0
+    dut.seq_start.value = 0
+    dut.seq_drain.value = 0
+
+    if RUNTIME_SCENE:
+        # RAM writes ignore reset, so the scene goes in while we hold it
+        await load_scene(dut, SCENE)
+
+    # Same vectors (pitch/yaw included) flash_scene.py sends to the FPGA
+    dut.cam.value = Camera.from_json(CAM_DATA, WIDTH).bits
     
     dut.num_objs.value = NUM_OBJS
     dut.max_bounces.value = MAX_BOUNCES
@@ -159,86 +257,244 @@ async def test_module(dut):
     await ClockCycles(dut.clk, 100)
     dut.rst.value = 0
 
-    def unpack_color8(color8):
-        return (
-            ((color8 >> 0) & 0b11111) << 3,
-            ((color8 >> 5) & 0b111111) << 2,
-            ((color8 >> 11) & 0b11111) << 3
-        )
-
-    # Extract pixel_start_idx and pixel_end_idx from environment vars
-    pixel_start_idx = int(os.environ["PIXEL_START_IDX"])
-    pixel_end_idx = int(os.environ["PIXEL_END_IDX"])
-    chunk_idx = int(os.environ.get("CHUNK_IDX", "0"))
-
-    n_pixels = pixel_end_idx - pixel_start_idx + 1
-    pixel_values = np.zeros((n_pixels, 3))
-
-    for i in tqdm(range(N_FRAMES * n_pixels), ncols=120, desc=f"[chunk {chunk_idx:>3}/{NUM_CHUNKS_ACTUAL:<3}]"):
-        pixel_idx = (i % n_pixels) + pixel_start_idx
-        pixel_v_in = pixel_idx // WIDTH
-        pixel_h_in = pixel_idx % WIDTH
-
-        dut.pixel_h_in.value = pixel_h_in
-        dut.pixel_v_in.value = pixel_v_in
-        dut.new_ray.value = 1
-        await ClockCycles(dut.clk, 1)
-        dut.new_ray.value = 0
+    if "WORK_QUEUE_DIR" in os.environ:
+        # Persistent worker: reset once, then keep rendering chunks until the queue runs dry
+        queue = WorkQueue(os.environ["WORK_QUEUE_DIR"])
+        worker_idx = int(os.environ.get("WORKER_IDX", "0"))
 
-        await RisingEdge(dut.ray_done)
-        # await ClockCycles(dut.clk, 1000)
+        n_chunks = 0
+        with profiled(test_file, f"worker{worker_idx:02}", CLK_PERIOD_NS, meta={"width": WIDTH, "height": HEIGHT}):
+            while (task := queue.claim()) is not None:
+                await render_chunk(dut, task, desc=f"[worker {worker_idx:>2}, chunk {task['chunk']:>4}/{NUM_CHUNKS_ACTUAL:<4}]")
+                n_chunks += 1
 
-        pixel_color = unpack_color8(dut.rtx_pixel.value.integer)
+        dut._log.info(f"Worker {worker_idx} done after {n_chunks} chunks")
 
-        r, g, b = pixel_color
-        pixel_values[pixel_idx - pixel_start_idx] += (r, g, b)
+    else:
+        # Extract the pixel range or tile from environment vars
+        task = json.loads(os.environ["CHUNK_TASK"])
+        with profiled(test_file, f"chunk{task['chunk']:04}", CLK_PERIOD_NS, meta={"width": WIDTH, "height": HEIGHT}):
+            await render_chunk(dut, task)
+
+
+def chunk_seed(chunk_idx: int):
+    """
+    LFSR seed of a chunk, never zero (prng8 would get stuck)
+    """
+    seed = int.from_bytes(hashlib.sha256(f"{SEED}:{chunk_idx}".encode()).digest()[:12])
+    return seed or 1
+
+
+async def reseed(dut, chunk_idx: int):
+    """
+    Load a chunk's LFSR seed, which only happens in reset. Scene RAMs ignore rst
+        and the camera/scene inputs are held, so this is safe between chunks.
+    """
+    dut.lfsr_seed.value = chunk_seed(chunk_idx)
+    dut.rst.value = 1
+    await ClockCycles(dut.clk, RESEED_CYCLES)
+    dut.rst.value = 0
+
+
+def unpack_color8(color8):
+    return (
+        ((color8 >> 0) & 0b11111) << 3,
+        ((color8 >> 5) & 0b111111) << 2,
+        ((color8 >> 11) & 0b11111) << 3
+    )
+
+
+async def render_chunk(dut, task: dict, desc: str = None):
+    """
+    Render the pixels of a task (pixel range or tile) with up to N_FRAMES samples per pixel
+        and save the chunk, its per-pixel sample counts and the number of cycles it took
+    Per-pixel RAY_STATS totals over all samples go into chunk_XXXX_<stat>.npy sidecars
+    """
+    chunk_idx = task["chunk"]
+
+    # Same seed + same chunk => same noise, whichever worker renders it, so resumed renders match
+    await reseed(dut, chunk_idx)
+
+    pixel_idxs = task_pixel_indices(task, WIDTH)
+    n_pixels = len(pixel_idxs)
+    accum = PixelAccumulator(n_pixels, mode=ACCUM_MODE, exp_ratio=EXP_RATIO)
+    stats = np.zeros((n_pixels, len(RAY_STATS)), dtype=np.int64)
+
+    start_cycles = get_sim_time("ns") // CLK_PERIOD_NS
+    start_time = time.time()
+
+    desc = desc or f"[chunk {chunk_idx:>3}/{NUM_CHUNKS_ACTUAL:<3}]"
+    pbar = tqdm(total=N_FRAMES * n_pixels, ncols=120, desc=desc)
+
+    if HDL_SEQ:
+        await sequence_pixels(dut, task, pixel_idxs, accum, stats, pbar)
+    else:
+        await sample_pixels(dut, pixel_idxs, accum, stats, pbar)
+    pbar.close()
 
     # Save into common chunks directory
     save_path = CHUNKS_OUT_DIR / f"chunk_{chunk_idx:04}.npy"
-    np.save(save_path, np.floor(pixel_values / N_FRAMES))
+    np.save(save_path, accum.result())
+    np.save(save_path.with_name(f"chunk_{chunk_idx:04}_samples.npy"), accum.count)
+    for name, totals in zip(RAY_STATS, stats.T):
+        np.save(save_path.with_name(f"chunk_{chunk_idx:04}_{name}.npy"), totals)
+    with open(save_path.with_suffix(".json"), "w") as fout:
+        json.dump({
+            "cycles": get_sim_time("ns") // CLK_PERIOD_NS - start_cycles,
+            "n_pixels": n_pixels,
+            "n_samples": int(accum.count.sum()),
+            "wall_time": time.time() - start_time,
+        }, fout)
     dut._log.info(f"Saved pixel chunk to {save_path}")
 
 
+async def sample_pixels(dut, pixel_idxs: np.ndarray, accum: PixelAccumulator, stats: np.ndarray, pbar: tqdm):
+    """
+    Python drives every ray: set the pixel, pulse new_ray, wait for ray_done
+    """
+    # One pass over the chunk per sample, dropping pixels that have converged
+    active = np.ones(len(pixel_idxs), dtype=bool)
+    for _ in range(N_FRAMES):
+        for i in np.flatnonzero(active):
+            pixel_idx = pixel_idxs[i]
+            pixel_v_in = pixel_idx // WIDTH
+            pixel_h_in = pixel_idx % WIDTH
+
+            dut.pixel_h_in.value = int(pixel_h_in)
+            dut.pixel_v_in.value = int(pixel_v_in)
+            dut.new_ray.value = 1
+            await ClockCycles(dut.clk, 1)
+            dut.new_ray.value = 0
+
+            await RisingEdge(dut.ray_done)
+            # await ClockCycles(dut.clk, 1000)
+
+            accum.add(i, unpack_color8(dut.rtx_pixel.value.integer))
+            stats[i] += read_ray_stats(dut)
+            pbar.update(1)
+
+        if ADAPTIVE_VAR is not None:
+            active &= ~accum.converged(ADAPTIVE_VAR, MIN_SAMPLES)
+            if not active.any():
+                break
+
+
+def sequencer_range(task: dict):
+    """
+    pixel_sequencer (h_lo, h_hi, h_first, v_first, h_last, v_last) of a pixel range or tile
+    """
+    if "start" in task:
+        return 0, WIDTH - 1, task["start"] % WIDTH, task["start"] // WIDTH, task["end"] % WIDTH, task["end"] // WIDTH
+    return task["x0"], task["x1"], task["x0"], task["y0"], task["x1"], task["y1"]
+
+
+async def sequence_pixels(dut, task: dict, pixel_idxs: np.ndarray, accum: PixelAccumulator, stats: np.ndarray, pbar: tqdm):
+    """
+    pixel_sequencer walks all N_FRAMES passes over the task by itself, Python only
+        wakes up to drain the result buffer when it is full or the walk is done
+    """
+    ports = ("seq_h_lo", "seq_h_hi", "seq_h_first", "seq_v_first", "seq_h_last", "seq_v_last")
+    for port, value in zip(ports, sequencer_range(task)):
+        getattr(dut, port).value = int(value)
+    dut.seq_passes.value = N_FRAMES
+
+    dut.seq_start.value = 1
+    await ClockCycles(dut.clk, 1)
+    dut.seq_start.value = 0
+
+    widths = [width for _, width in SEQ_RESULT_FIELDS]
+    while True:
+        await RisingEdge(dut.seq_ready)
+
+        for k in range(dut.seq_count.value.integer):
+            pixel_h, pixel_v, rtx_pixel, *ray_stats = unpack_bits(dut.seq.results[k].value.integer, widths)
+            i = np.searchsorted(pixel_idxs, pixel_v * WIDTH + pixel_h)
+            accum.add(i, unpack_color8(rtx_pixel))
+            stats[i] += ray_stats
+        pbar.update(dut.seq_count.value.integer)
+
+        if dut.seq_done.value:
+            break
+
+        dut.seq_drain.value = 1
+        await ClockCycles(dut.clk, 1)
+        dut.seq_drain.value = 0
+
+
 def build_verilator():
     """Build Verilator executable once (called from main process)."""
     print(f"Building Verilator for {WIDTH}x{HEIGHT}...")
 
-    # Copy scene buffer to build dir
-    shutil.copy(SCENE_BUF_MEM_PATH, BUILD_DIR / "scene_buffer.mem")
-    shutil.copy(MAT_DICT_MEM_PATH, BUILD_DIR / "mat_dict.mem")
-
+    # Skips compiling if nothing but the scene changed, the .mem files are read from RUN_DIR
     runner = get_runner(SIM)
-    runner.build(
+    build_dir = build_cached(
+        runner,
         sources=SOURCES,
         hdl_toplevel=HDL_TOPLEVEL,
-        always=False,  # skip if already built
         build_args=BUILD_TEST_ARGS,
         parameters=PARAMETERS,
+        mem_files=MEM_FILES,
         timescale=("1ns", "1ps"),
         waves=True,
-        build_dir=BUILD_DIR,
     )
+    assert build_dir == BUILD_DIR
+    stage_mem_files(MEM_FILES, RUN_DIR)
 
     print(f"Build complete. Executable cached in {BUILD_DIR}")
 
 
-def run_test_worker(pixel_start_idx: int, pixel_end_idx: int, chunk_idx: int):
+def run_test_worker(task: dict):
     """Run test for a specific pixel chunk (called from worker process)."""
 
     # Set environment variables for this chunk
-    os.environ["PIXEL_START_IDX"] = str(pixel_start_idx)
-    os.environ["PIXEL_END_IDX"] = str(pixel_end_idx)
-    os.environ["CHUNK_IDX"] = str(chunk_idx)
+    os.environ["CHUNK_TASK"] = json.dumps(task)
+
+    run_simulator()
+
+    return task["chunk"]
+
+
+def run_persistent_worker(worker_idx: int):
+    """Run one simulator that drains WORK_QUEUE_DIR (called from worker process)."""
+
+    os.environ["WORK_QUEUE_DIR"] = str(WORK_QUEUE_DIR)
+    os.environ["WORKER_IDX"] = str(worker_idx)
+
+    run_simulator()
+
+    return worker_idx
+
+
+def run_simulator():
+    """Launch the prebuilt simulator with the scene parameters in the environment."""
 
     # Set test parameters so workers use correct WIDTH/HEIGHT
     os.environ["TEST_WIDTH"] = str(WIDTH)
     os.environ["TEST_HEIGHT"] = str(HEIGHT)
     os.environ["TEST_N_FRAMES"] = str(N_FRAMES)
+    os.environ["TEST_N_CHUNKS"] = str(NUM_CHUNKS_ACTUAL)
+    os.environ["TEST_SEED"] = str(SEED)
+    os.environ["MEM_HASH"] = MEM_HASH
+    os.environ["ACCUM_MODE"] = ACCUM_MODE
+    os.environ["MIN_SAMPLES"] = str(MIN_SAMPLES)
+    if EXP_RATIO is not None:
+        os.environ["EXP_RATIO"] = str(EXP_RATIO)
+    if ADAPTIVE_VAR is not None:
+        os.environ["ADAPTIVE_VAR"] = str(ADAPTIVE_VAR)
 
     if CAM_DATA:
         os.environ["CAM_DATA"] = json.dumps(CAM_DATA)
         os.environ["MAX_BOUNCES"] = str(MAX_BOUNCES)
 
+    if RUNTIME_SCENE:
+        os.environ["SCENE_JSON"] = str(Path(args.json).resolve())
+
+    if args.profile:
+        os.environ[PROFILE_ENV] = str(PROFILE_DIR)
+
+    if HDL_SEQ:
+        os.environ["HDL_SEQ"] = "1"
+
     runner = get_runner(SIM)
     runner.build(
         sources=SOURCES,
@@ -257,22 +513,52 @@ def run_test_worker(pixel_start_idx: int, pixel_end_idx: int, chunk_idx: int):
         test_module=test_file,
         test_args=[],
         waves=True,
+        test_dir=RUN_DIR,
     )
 
-    return chunk_idx
 
+def load_pixel_cost():
+    """
+    Per-pixel cost estimate for ordering tasks: cycles measured on the last render
+        of this scene/resolution if there was one, else a primary-ray pre-pass
+    """
+    if COST_HISTORY_PATH.exists():
+        print(f"Task costs: previous render ({COST_HISTORY_PATH.name})")
+        return np.load(COST_HISTORY_PATH)
 
-def worker(task):
-    """Wrapper for Pool.map"""
-    chunk_idx, start_idx, end_idx = task
-    return run_test_worker(start_idx, end_idx, chunk_idx)
+    if SCENE is not None:
+        print("Task costs: primary ray pre-pass")
+        cam = Camera.from_json(CAM_DATA, WIDTH).to_json()
+        return estimate_pixel_cost(SCENE, cam, WIDTH, HEIGHT, MAX_BOUNCES)
+
+    return None
+
+
+def merge_finished(fb: Framebuffer, pending: dict):
+    """
+    Merge every chunk that finished since the last call into the framebuffer
+        (the .json sidecar is written last, so its presence means the chunk is complete)
+    """
+    for chunk_idx, task in list(pending.items()):
+        stats_path = CHUNKS_OUT_DIR / f"chunk_{chunk_idx:04}.json"
+        if not stats_path.exists():
+            continue
+
+        with open(stats_path) as fin:
+            stats = json.load(fin)
+        pixels = np.load(stats_path.with_suffix(".npy"))
+        samples = np.load(CHUNKS_OUT_DIR / f"chunk_{chunk_idx:04}_samples.npy")
+        ray_stats = {name: np.load(CHUNKS_OUT_DIR / f"chunk_{chunk_idx:04}_{name}.npy") for name in RAY_STATS}
+        fb.merge(task_pixel_indices(task, WIDTH), pixels, stats["cycles"] / stats["n_pixels"], samples, ray_stats)
+        del pending[chunk_idx]
 
 
 if __name__ == "__main__":
     print(f"Resolution: {WIDTH}x{HEIGHT}")
     print(f"Frames: {N_FRAMES}")
+    print(f"Seed: {SEED}")
     print(f"Chunks: {NUM_CHUNKS_ACTUAL}")
-    print(f"Worker processes: {os.cpu_count()}")
+    print(f"Worker processes: {os.cpu_count()}{' (persistent)' if args.persistent else ''}")
     print()
 
     # Build Verilator once
@@ -281,30 +567,99 @@ if __name__ == "__main__":
     build_time = time.time() - build_start
     print(f"Build time: {build_time:.1f}s\n")
 
-    # Create tasks for parallel execution
-    tasks = [(chunk_idx, start_idx, end_idx)
-             for chunk_idx, (start_idx, end_idx) in enumerate(CHUNK_RANGES)]
+    # Create tasks for parallel execution, most expensive first when tiling
+    tasks = CHUNK_TASKS
+    if args.tile:
+        tasks = order_tasks(tasks, load_pixel_cost())
+
+    # Skip whatever a previous render with the same settings already finished
+    scene_name = Path(args.json).stem if args.json else "default"
+    accum_name = ACCUM_MODE if ACCUM_MODE == "mean" else f"ema{EXP_RATIO if EXP_RATIO is not None else ''}"
+    if ADAPTIVE_VAR is not None:
+        accum_name += f"_v{ADAPTIVE_VAR:g}_m{MIN_SAMPLES}"
+    # Content hash of the objects, materials, baked .mem files and camera, so an edited scene file never resumes the old render
+    scene_hash = hashlib.blake2b(json.dumps([scene_manifest(SCENE) if SCENE else None, MEM_HASH, CAM_DATA], sort_keys=True).encode(), digest_size=8).hexdigest()
+    # Only a fixed --seed can resume, every unseeded render replaces the same framebuffer
+    seed_name = f"s{SEED}" if args.seed is not None else "unseeded"
+    fb_dir = FRAMES_DIR / f"{scene_name}_{scene_hash}_b{MAX_BOUNCES}_{WIDTH}x{HEIGHT}_f{N_FRAMES}_{seed_name}_{accum_name}"
+    if (not args.resume or args.seed is None) and fb_dir.exists():
+        shutil.rmtree(fb_dir)
+    fb = Framebuffer(fb_dir, WIDTH, HEIGHT, meta={
+        "scene": scene_name, "scene_hash": scene_hash, "max_bounces": MAX_BOUNCES,
+        "frames": N_FRAMES, "seed": SEED, "accum": accum_name,
+    })
+
+    tasks = [task for task in tasks if not fb.is_done(task_pixel_indices(task, WIDTH))]
+    if fb.n_done:
+        print(f"Resuming: {fb.n_done}/{TOTAL_PIXELS} pixels already rendered, {len(tasks)} chunks left")
+
+    # Drop stale chunk files so only this render's chunks get merged
+    pending = {task["chunk"]: task for task in tasks}
+    for chunk_idx in pending:
+        for suffix in (".npy", ".json", "_samples.npy", *(f"_{name}.npy" for name in RAY_STATS)):
+            (CHUNKS_OUT_DIR / f"chunk_{chunk_idx:04}{suffix}").unlink(missing_ok=True)
+
+    output_file = f"test_rtx_{WIDTH}x{HEIGHT}_f{N_FRAMES}.png"
+
+    # Only this render's workers in the profile summary
+    if args.profile:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        for path in PROFILE_DIR.glob("*.json"):
+            path.unlink()
 
     # Run tests in parallel
     print("Starting parallel render...")
     render_start = time.time()
-    with Pool(processes=os.cpu_count()) as pool:
-        results = pool.map(worker, tasks)
+    if args.persistent:
+        # One simulator per core, each pulls chunks until none are left
+        queue = WorkQueue(WORK_QUEUE_DIR)
+        queue.reset()
+        queue.put(tasks)
+
+        n_workers = min(os.cpu_count(), len(tasks))
+        run_fn, work_items = run_persistent_worker, range(n_workers)
+
+    else:
+        # Hand out one task at a time so idle workers pick up whatever is left
+        n_workers = os.cpu_count()
+        run_fn, work_items = run_test_worker, tasks
+
+    if tasks:
+        with Pool(processes=n_workers) as pool:
+            result = pool.map_async(run_fn, work_items, chunksize=1)
+
+            # Merge chunks as they land and keep a preview up to date
+            last_preview = time.time()
+            while not result.ready():
+                result.wait(1)
+                merge_finished(fb, pending)
+
+                if time.time() - last_preview > args.preview:
+                    fb.save_png(output_file)
+                    last_preview = time.time()
+
+            result.get()
     render_time = time.time() - render_start
 
-    # Gather chunks and combine
-    print("\nCombining chunks...")
-    pixel_chunks = []
-    for chunk_idx in range(len(CHUNK_RANGES)):
-        chunk_path = CHUNKS_OUT_DIR / f"chunk_{chunk_idx:04}.npy"
-        if not chunk_path.exists():
-            raise FileNotFoundError(f"Expected chunk file missing: {chunk_path}")
-        pixel_chunks.append(np.load(chunk_path))
-
-    pixels_all = np.concatenate(pixel_chunks)
-    img = Image.fromarray(pixels_all.reshape((HEIGHT, WIDTH, 3)).astype("uint8"))
-    output_file = f"test_rtx_{WIDTH}x{HEIGHT}_f{N_FRAMES}.png"
-    img.save(output_file)
+    merge_finished(fb, pending)
+    if pending:
+        missing = [str(CHUNKS_OUT_DIR / f"chunk_{chunk_idx:04}.npy") for chunk_idx in pending]
+        raise FileNotFoundError(f"Expected chunk files missing: {missing}")
+
+    np.save(COST_HISTORY_PATH, np.array(fb.cycles).reshape((HEIGHT, WIDTH)))
+    print(f"Samples per pixel: mean {np.mean(fb.samples):.2f}, min {np.min(fb.samples)}, max {np.max(fb.samples)}")
+    fb.save_png(output_file)
+
+    # Where the simulated cycles went: heatmaps + percentiles of every ray statistic
+    stats_prefix = output_file.removesuffix(".png")
+    summary = save_report(fb, stats_prefix, meta={"scene": scene_name, "width": WIDTH, "height": HEIGHT, "frames": N_FRAMES})
+    print(f"\nPer-sample ray statistics ({stats_prefix}_<stat>.png, {stats_prefix}_stats.json):")
+    for name, pcts in summary.items():
+        print(f"  {name:>15}: " + ", ".join(f"{key} {value:.1f}" for key, value in pcts.items()))
+
+    if args.profile:
+        print(f"\nSimulator profile ({PROFILE_DIR / 'summary.json'}):")
+        print_summary(summarize_profiles(PROFILE_DIR))
 
     total_time = time.time() - build_start
     print(f"\n=== Render complete ===")
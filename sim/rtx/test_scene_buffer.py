@@ -67,23 +67,20 @@ def runner():
     # values for parameters defined earlier in the code.
     parameters = {"INIT_FILE": '"scene_buffer.mem"'}
 
-    # Copy scene buffer file
-    build_dir = proj_path / "sim" / "sim_build"
-    shutil.copy(str(proj_path / "data" / "scene_buffer.mem"), build_dir / "scene_buffer.mem")
-
     sys.path.append(str(proj_path / "sim"))
+    from build_cache import build_cached
     hdl_toplevel = "scene_buffer"
     
     runner = get_runner(sim)
-    runner.build(
+    build_cached(
+        runner,
         sources=sources,
         hdl_toplevel=hdl_toplevel,
-        always=True,
         build_args=build_test_args,
         parameters=parameters,
         timescale=("1ns", "1ps"),
         waves=True,
-        build_dir=build_dir,
+        mem_files=[str(proj_path / "data" / "scene_buffer.mem")],
     )
     run_test_args = []
     runner.test(
@@ -1,5 +1,6 @@
 import os
 import sys
+import json
 from pathlib import Path
 
 import cocotb
@@ -17,6 +18,10 @@ import ctypes
 sys.path.append(Path(__file__).resolve().parent.parent._str)
 from utils import convert_fp, make_fp, convert_fp_vec3
 
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent / "ctrl"))
+from uart_flash import CMD_BYTES, MemflashDecoder, build_stream
+from make_scene_buffer import manifest_changes, scene_manifest
+
 test_file = os.path.basename(__file__).replace(".py", "")
 
 @cocotb.test()
@@ -57,6 +62,56 @@ async def test_module(dut):
     await send_byte(10)
 
 
+
+@cocotb.test()
+async def test_flash_stream(dut):
+    """Decode a whole scene's command stream and compare every write against MemflashDecoder"""
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await Timer(1, "ps")
+
+    dut.rst.value = 1
+    dut.uart_rx_valid.value = 0
+    await ClockCycles(dut.clk, 4)
+    dut.rst.value = 0
+    await ClockCycles(dut.clk, 4)
+
+    proj_path = Path(__file__).resolve().parent.parent.parent
+    with open(proj_path / "ctrl" / "scenes" / "triangle_room.json") as fin:
+        scene = json.load(fin)
+    obj_idxs, mat_idxs = manifest_changes(None, scene_manifest(scene))
+
+    writes = []
+
+    async def monitor():
+        while True:
+            await RisingEdge(dut.clk)
+            await ReadOnly()
+            if dut.flash_wen.value == 1:
+                cmd = dut.flash_cmd.value.integer
+                # Bits above the command's bytes are never written (X after reset)
+                writes.append((cmd, int(dut.flash_data.value.binstr[-8 * CMD_BYTES[cmd]:], 2)))
+
+    cocotb.start_soon(monitor())
+
+    # Single idx + data commands, then the same scene as 0x0A / 0x0B bursts
+    for burst in [False, True]:
+        stream = build_stream(scene, obj_idxs, mat_idxs, burst)
+        expected = MemflashDecoder().feed(stream.buf)
+        writes.clear()
+
+        # A few idle cycles between bytes, like the UART receiver
+        for byte in stream.buf:
+            await FallingEdge(dut.clk)
+            dut.uart_rx_valid.value = 1
+            dut.uart_rx_byte.value = byte
+            await FallingEdge(dut.clk)
+            dut.uart_rx_valid.value = 0
+            await ClockCycles(dut.clk, 2)
+
+        await ClockCycles(dut.clk, 4)
+        expected = [(cmd, data & ((1 << (8 * CMD_BYTES[cmd])) - 1)) for cmd, data in expected]
+        assert writes == expected, f"burst={burst}: {len(writes)} writes, expected {len(expected)}"
+
 def runner():
     """Module tester."""
 
@@ -68,6 +123,7 @@ def runner():
     sys.path.append(str(proj_path / "sim" / "model"))
     sources = [
         proj_path / "hdl" / "constants.sv",
+        proj_path / "hdl" / "types" / "types.sv",
         proj_path / "hdl" / "uart" / f"uart_memflash_rtx.sv"
     ]
     build_test_args = ["-Wall"]
@@ -76,13 +132,14 @@ def runner():
     parameters = {}
 
     sys.path.append(str(proj_path / "sim"))
+    from build_cache import build_cached
     hdl_toplevel = module_name
     
     runner = get_runner(sim)
-    runner.build(
+    build_cached(
+        runner,
         sources=sources,
         hdl_toplevel=hdl_toplevel,
-        always=True,
         build_args=build_test_args,
         parameters=parameters,
         timescale=("1ns", "1ps"),
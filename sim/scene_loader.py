@@ -0,0 +1,35 @@
+# Write a scene into a testbench's scene buffer / material dictionary at runtime
+
+import sys
+from pathlib import Path
+
+from cocotb.triggers import RisingEdge
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "ctrl"))
+from make_scene_buffer import pack_scene
+
+
+async def load_scene(dut, scene: dict, clk=None):
+    """
+    Write every material and object through the flash_mat_* / flash_obj_* ports,
+        one word per clock. RAM writes ignore rst, so this can run during reset.
+    Returns the number of objects (for num_objs).
+    """
+    clk = clk if clk is not None else dut.clk
+    obj_words, mat_words = pack_scene(scene)
+
+    dut.flash_mat_wen.value = 1
+    for mat_idx, (mat_bits, _) in enumerate(mat_words):
+        dut.flash_mat_idx.value = mat_idx
+        dut.flash_mat_data.value = mat_bits
+        await RisingEdge(clk)
+    dut.flash_mat_wen.value = 0
+
+    dut.flash_obj_wen.value = 1
+    for obj_idx, (obj_bits, _) in enumerate(obj_words):
+        dut.flash_obj_idx.value = obj_idx
+        dut.flash_obj_data.value = obj_bits
+        await RisingEdge(clk)
+    dut.flash_obj_wen.value = 0
+
+    return len(obj_words)
@@ -0,0 +1,177 @@
+"""
+sim_profile.py
+
+Opt-in profiler for the cocotb harnesses: is a render limited by the RTL
+simulator or by Python? Set SIM_PROFILE=<dir> (test_rtx_parallel.py --profile sets
+it to sim/sim_build/rtx_parallel/profile) and every `profiled` block writes one
+JSON with
+
+    sim_cycles, wall_s, cycles_per_s   simulated clock cycles and how fast they went
+    gpi_callbacks                      callbacks registered with the simulator, by kind
+    python_s                           wall time spent inside those callbacks, i.e. in
+                                       cocotb's scheduler and our coroutines
+    sim_s                              the rest: RTL evaluation and the GPI itself
+
+Python time is measured by wrapping the callbacks cocotb registers through
+cocotb.simulator, so it includes the clock driver, every trigger and tqdm.
+Without SIM_PROFILE, `profiled` does nothing.
+
+    python sim/sim_profile.py sim/sim_build/rtx_parallel/profile    # table + summary.json
+"""
+
+import os
+import sys
+import json
+import time
+from pathlib import Path
+from contextlib import contextmanager
+
+PROFILE_ENV = "SIM_PROFILE"
+
+# cocotb.simulator functions triggers register their callbacks through:
+#   kind, position of the Python callback in the arguments
+CALLBACK_KINDS = {
+    "register_timed_callback": ("timed", 1),
+    "register_value_change_callback": ("value_change", 1),
+    "register_readonly_callback": ("readonly", 0),
+    "register_rwsynch_callback": ("rwsynch", 0),
+    "register_nextstep_callback": ("nextstep", 0),
+}
+
+
+class SimProfiler:
+    """
+    Counts and times the GPI callbacks of one simulator process while started
+    """
+    def __init__(self, clk_period_ns: float):
+        self.clk_period_ns = clk_period_ns
+        self.callbacks = {kind: 0 for kind, _ in CALLBACK_KINDS.values()}
+        self.python_s = 0.0
+        self._patched = {}
+
+    def _wrap_register(self, register, kind: str, idx: int):
+        def wrapped_register(*args):
+            self.callbacks[kind] += 1
+
+            args = list(args)
+            func = args[idx]
+
+            def timed_callback(*cb_args):
+                start = time.perf_counter()
+                try:
+                    return func(*cb_args)
+                finally:
+                    self.python_s += time.perf_counter() - start
+
+            args[idx] = timed_callback
+            return register(*args)
+        return wrapped_register
+
+    def start(self):
+        from cocotb import simulator
+        from cocotb.utils import get_sim_time
+
+        for name, (kind, idx) in CALLBACK_KINDS.items():
+            self._patched[name] = getattr(simulator, name)
+            setattr(simulator, name, self._wrap_register(self._patched[name], kind, idx))
+
+        self.start_wall = time.perf_counter()
+        self.start_ns = get_sim_time("ns")
+
+    def stop(self):
+        """
+        Restore cocotb.simulator and return the profile
+        """
+        from cocotb import simulator
+        from cocotb.utils import get_sim_time
+
+        for name, register in self._patched.items():
+            setattr(simulator, name, register)
+        self._patched = {}
+
+        wall_s = time.perf_counter() - self.start_wall
+        sim_cycles = int((get_sim_time("ns") - self.start_ns) // self.clk_period_ns)
+        n_callbacks = sum(self.callbacks.values())
+        return {
+            "sim_cycles": sim_cycles,
+            "wall_s": wall_s,
+            "cycles_per_s": sim_cycles / wall_s if wall_s else 0.0,
+            "gpi_callbacks": n_callbacks,
+            "gpi_callbacks_by_kind": dict(self.callbacks),
+            "callbacks_per_cycle": n_callbacks / sim_cycles if sim_cycles else 0.0,
+            "python_s": self.python_s,
+            "sim_s": wall_s - self.python_s,
+            "python_frac": self.python_s / wall_s if wall_s else 0.0,
+        }
+
+
+@contextmanager
+def profiled(test: str, worker: str, clk_period_ns: float, meta: dict = None):
+    """
+    Profile the enclosed block if SIM_PROFILE is set, saving
+        $SIM_PROFILE/<test>_<worker>.json
+    """
+    out_dir = os.environ.get(PROFILE_ENV)
+    if not out_dir:
+        yield
+        return
+
+    profiler = SimProfiler(clk_period_ns)
+    profiler.start()
+    try:
+        yield
+    finally:
+        profile = dict(meta or {}, test=test, worker=worker, pid=os.getpid(), **profiler.stop())
+        os.makedirs(out_dir, exist_ok=True)
+        with open(Path(out_dir) / f"{test}_{worker}.json", "w") as fout:
+            json.dump(profile, fout, indent=2)
+
+
+def summarize_profiles(profile_dir):
+    """
+    Every profile in a directory, per test and in total, also written to summary.json
+    """
+    profile_dir = Path(profile_dir)
+    profiles = []
+    for path in sorted(profile_dir.glob("*.json")):
+        if path.name != "summary.json":
+            with open(path) as fin:
+                profiles.append(json.load(fin))
+
+    tests = {}
+    for profile in profiles:
+        total = tests.setdefault(profile["test"], {"workers": 0, "sim_cycles": 0, "gpi_callbacks": 0, "python_s": 0.0, "sim_s": 0.0})
+        total["workers"] += 1
+        for key in ("sim_cycles", "gpi_callbacks", "python_s", "sim_s"):
+            total[key] += profile[key]
+
+    for total in tests.values():
+        # Summed over workers, so this is the rate of one simulator
+        wall_s = total["python_s"] + total["sim_s"]
+        total["cycles_per_s"] = total["sim_cycles"] / wall_s if wall_s else 0.0
+        total["python_frac"] = total["python_s"] / wall_s if wall_s else 0.0
+
+    summary = {"tests": tests, "profiles": profiles}
+    with open(profile_dir / "summary.json", "w") as fout:
+        json.dump(summary, fout, indent=2)
+    return summary
+
+
+def print_summary(summary: dict):
+    print(f"{'test':>24} {'worker':>10} {'cycles':>12} {'cycles/s':>10} {'callbacks':>10} {'cb/cycle':>8} {'python':>8} {'sim':>8}")
+    for profile in summary["profiles"]:
+        print(
+            f"{profile['test']:>24} {profile['worker']:>10} {profile['sim_cycles']:12d} {profile['cycles_per_s']:10.0f} "
+            f"{profile['gpi_callbacks']:10d} {profile['callbacks_per_cycle']:8.2f} "
+            f"{profile['python_s']:7.1f}s {profile['sim_s']:7.1f}s"
+        )
+    for test, total in summary["tests"].items():
+        print(
+            f"{test}: {total['workers']} workers, {total['cycles_per_s']:.0f} cycles/s per simulator, "
+            f"{100 * total['python_frac']:.0f}% of the time in Python"
+        )
+
+
+if __name__ == "__main__":
+    summary = summarize_profiles(sys.argv[1])
+    print_summary(summary)
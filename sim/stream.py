@@ -0,0 +1,85 @@
+# Stream operands through fully pipelined modules, one per clock cycle
+
+import sys
+from collections import deque
+from pathlib import Path
+
+from cocotb.triggers import RisingEdge
+
+sys.path.append(str(Path(__file__).resolve().parent))
+from utils import parse_sv_params
+
+proj_path = Path(__file__).resolve().parent.parent
+
+# Pipeline delays (FP_ADD_DELAY, VEC3_NORM_DELAY, ...) straight from the HDL
+DELAYS = parse_sv_params(proj_path / "hdl" / "constants.sv")
+
+
+class Scoreboard:
+    """
+    FIFO of expected outputs, popped and compared in order as the DUT produces them
+    """
+    def __init__(self, name: str, compare=None):
+        self.name = name
+        self.compare = compare or (lambda got, exp: got == exp)
+        self.expected = deque()
+        self.n_checked = 0
+        self.mismatches = []
+
+    def push(self, expected):
+        self.expected.append(expected)
+
+    def extend(self, expected):
+        self.expected.extend(expected)
+
+    def check(self, got):
+        exp = self.expected.popleft()
+        if not self.compare(got, exp):
+            self.mismatches.append((self.n_checked, got, exp))
+        self.n_checked += 1
+
+    def report(self, log):
+        """
+        Log a summary and fail the test on any mismatch
+        """
+        n_ok = self.n_checked - len(self.mismatches)
+        log.info(f"[{self.name}] {n_ok}/{self.n_checked} outputs matched")
+        for idx, got, exp in self.mismatches[:10]:
+            got = "X" if got is None else f"{got:#x}"
+            log.error(f"[{self.name}] vector {idx}: got {got}, expected {exp:#x}")
+        assert not self.mismatches, f"{len(self.mismatches)} mismatches on {self.name}"
+        assert not self.expected, f"{len(self.expected)} expected values never came out of {self.name}"
+
+
+async def stream(dut, inputs: dict, outputs: list[str], delay: int, scoreboards: dict = None, clk=None):
+    """
+    Drive inputs[name][i] before clock edge i and sample each output `delay`
+        edges later, so a new vector enters the pipeline every cycle.
+    Returns {output name: list of sampled ints (None if X/Z)}, one per vector.
+    """
+    clk = clk if clk is not None else dut.clk
+    scoreboards = scoreboards or {}
+
+    n_vectors = len(next(iter(inputs.values())))
+    in_handles = [(getattr(dut, name), values) for name, values in inputs.items()]
+    out_handles = [(name, getattr(dut, name)) for name in outputs]
+    results = {name: [] for name in outputs}
+
+    edge = RisingEdge(clk)
+    for cycle in range(n_vectors + delay):
+        if cycle < n_vectors:
+            for handle, values in in_handles:
+                handle.value = int(values[cycle])
+
+        await edge
+
+        if cycle >= delay:
+            for name, handle in out_handles:
+                value = handle.value
+                value = value.integer if value.is_resolvable else None
+                results[name].append(value)
+
+                if name in scoreboards:
+                    scoreboards[name].check(value)
+
+    return results
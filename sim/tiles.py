@@ -0,0 +1,109 @@
+# 2D tile scheduling for parallel renders
+
+import numpy as np
+
+
+def make_tiles(width: int, height: int, tile_size: int):
+    """
+    Split the image into tile_size x tile_size tiles (smaller at the right/bottom edges)
+    Tiles are dicts {"x0", "y0", "x1", "y1"} with inclusive bounds
+    """
+    return [
+        {
+            "x0": x0, "y0": y0,
+            "x1": min(x0 + tile_size, width) - 1,
+            "y1": min(y0 + tile_size, height) - 1,
+        }
+        for y0 in range(0, height, tile_size)
+        for x0 in range(0, width, tile_size)
+    ]
+
+
+def task_pixel_indices(task: dict, width: int):
+    """
+    Flat (row-major) pixel indices covered by a task, either a tile or a
+    contiguous {"start", "end"} run of pixels
+    """
+    if "start" in task:
+        return np.arange(task["start"], task["end"] + 1)
+
+    ys, xs = np.mgrid[task["y0"]:task["y1"] + 1, task["x0"]:task["x1"] + 1]
+    return (ys * width + xs).ravel()
+
+
+def task_cost(task: dict, pixel_cost: np.ndarray):
+    """
+    Estimated cost of a task given a per-pixel (H, W) cost map
+    """
+    return float(pixel_cost.ravel()[task_pixel_indices(task, pixel_cost.shape[1])].sum())
+
+
+def order_tasks(tasks: list[dict], pixel_cost: np.ndarray = None):
+    """
+    Most expensive first, so the stragglers start early and cheap tasks fill in the gaps
+    """
+    if pixel_cost is None:
+        return list(tasks)
+    return sorted(tasks, key=lambda task: task_cost(task, pixel_cost), reverse=True)
+
+
+def primary_ray_dirs(cam: dict, width: int, height: int):
+    """
+    Unnormalized primary ray directions, as ray_maker builds them (minus the noise)
+        forward + (h - W/2) * right + (H/2 - v) * up
+    """
+    v, h = np.mgrid[0:height, 0:width]
+    u = (h - width // 2).astype(float)
+    v = (height // 2 - v).astype(float)
+
+    return (
+        np.asarray(cam["forward"], dtype=float)
+        + u[..., None] * np.asarray(cam["right"], dtype=float)
+        + v[..., None] * np.asarray(cam["up"], dtype=float)
+    )
+
+
+def primary_hits(objects: list[dict], origin, dirs: np.ndarray):
+    """
+    Boolean mask of rays that hit any object in the scene JSON
+    """
+    origin = np.asarray(origin, dtype=float)
+    d = dirs.reshape(-1, 3)
+    d = d / np.linalg.norm(d, axis=1, keepdims=True)
+    hit = np.zeros(len(d), dtype=bool)
+
+    for obj in objects:
+        if obj.get("obj_type", 0):
+            # Moller-Trumbore, trig is [v0, v0->v1, v0->v2]
+            v0, e1, e2 = (np.asarray(p, dtype=float) for p in obj["trig"])
+            p = np.cross(d, e2)
+            det = p @ e1
+            with np.errstate(divide="ignore", invalid="ignore"):
+                inv_det = 1 / det
+                s = origin - v0
+                bu = (p @ s) * inv_det
+                q = np.cross(s, e1)
+                bv = (d @ q) * inv_det
+                t = (q @ e2) * inv_det
+                hit |= (np.abs(det) > 1e-12) & (bu >= 0) & (bv >= 0) & (bu + bv <= 1) & (t > 0)
+
+        else:
+            center = np.asarray(obj["sphere_center"], dtype=float)
+            oc = center - origin
+            t_mid = d @ oc
+            dist_sq = oc @ oc - t_mid ** 2
+            rad_sq = obj.get("sphere_rad", 1) ** 2
+            t_half = np.sqrt(np.maximum(rad_sq - dist_sq, 0))
+            hit |= (dist_sq <= rad_sq) & (t_mid + t_half > 0)
+
+    return hit.reshape(dirs.shape[:-1])
+
+
+def estimate_pixel_cost(scene: dict, cam: dict, width: int, height: int, max_bounces: int):
+    """
+    Quick software pre-pass: every ray costs one sweep of the scene buffer,
+        rays that hit something are assumed to bounce max_bounces times.
+    Returns an (H, W) map in units of scene buffer sweeps.
+    """
+    hit = primary_hits(scene["objects"], cam["origin"], primary_ray_dirs(cam, width, height))
+    return np.where(hit, max(max_bounces, 1), 1).astype(float)
@@ -1,8 +1,11 @@
 # Convert bit representations
 
+import re
 import math
 import ctypes
 
+import numpy as np
+
 import cocotb
 from cocotb.binary import BinaryValue
 
@@ -55,6 +58,59 @@ def convert_fp(f: BinaryValue):
 
     return sign * (2 ** exp) * mant
 
+def make_fp_array(x: np.ndarray):
+    """
+    Vectorized make_fp: convert an array of floats to fp values (as uint32)
+    Matches make_fp bit for bit
+    """
+    x = np.asarray(x, dtype=np.float64)
+    assert np.all(np.isfinite(x)), "FP conversion of non-finite value"
+
+    sign = (x < 0).astype(np.uint32)
+    value = np.abs(x)
+    nonzero = value != 0
+
+    # frexp gives value = m * 2^e with m in [0.5, 1), so frac = 2m is in [1, 2)
+    m, e = np.frexp(value)
+    exp = e.astype(np.int64) - 1
+    exp_biased = exp + FP_EXP_OFFSET
+    bad = nonzero & ((exp_biased < 0) | (exp_biased >= 2 ** FP_EXP_BITS))
+    assert not np.any(bad), f"FP exponent out of range, got {x[bad][0]} (exp={exp[bad][0]})"
+
+    frac = np.ldexp(m, 1)
+    mant = np.floor((frac - 1.0) * (1 << FP_MANT_BITS) + 0.5).astype(np.int64)
+
+    res = (
+        (sign << (FP_EXP_BITS + FP_MANT_BITS)) |
+        (exp_biased.astype(np.uint32) << FP_MANT_BITS) |
+        mant.astype(np.uint32)
+    )
+    res = np.where(nonzero, res, 0).astype(np.uint32)
+
+    # Mantissa rounded up to 2.0: make_fp's result here depends on how math.log2
+    # rounds right below a power of two, so defer to it for these (rare) values
+    for idx in zip(*np.nonzero(nonzero & (mant == (1 << FP_MANT_BITS)))):
+        res[idx] = make_fp(float(x[idx]))
+
+    return res
+
+def convert_fp_array(f: np.ndarray):
+    """
+    Vectorized convert_fp: convert an array of fp values to float64
+    """
+    f = np.asarray(f).astype(np.int64)
+
+    EXP_MANT_MASK = (1 << (FP_EXP_BITS + FP_MANT_BITS)) - 1
+    EXP_MASK = (1 << FP_EXP_BITS) - 1
+    MANT_MASK = (1 << FP_MANT_BITS) - 1
+
+    sign = np.where((f >> (FP_EXP_BITS + FP_MANT_BITS)) & 1, -1.0, 1.0)
+    exp = ((f >> FP_MANT_BITS) & EXP_MASK) - FP_EXP_OFFSET
+    mant = 1 + (f & MANT_MASK) / (1 << FP_MANT_BITS)
+
+    # If all but the sign bit is zero, this represents zero
+    return np.where(f & EXP_MANT_MASK == 0, 0.0, sign * np.ldexp(mant, exp))
+
 def make_fp_vec3(vec3: tuple[float]):
     """
     Convert (x, y, z) to packed fp_vec3
@@ -94,6 +150,36 @@ def make_material(
         (specular, 8),
     ])
 
+# ===== HDL PARAMETERS =====
+def parse_sv_params(path, params: dict = None):
+    """
+    Read `parameter [type] NAME = expr;` declarations (or `NAME = expr,` in a
+        module header) from a SystemVerilog file into a dict of ints. Later
+        expressions can reference earlier parameters (also those in `params`,
+        e.g. from constants.sv). Anything that isn't a plain integer expression
+        (struct/replication literals) is skipped.
+    """
+    params = dict(params or {})
+    param_re = re.compile(r"^\s*(?:local)?parameter\s+(?:\w+\s+)?(\w+)\s*=\s*([^;]+?)\s*[;,]?\s*$")
+
+    with open(path) as fin:
+        for line in fin:
+            match = param_re.match(line.split("//")[0])
+            if match is None:
+                continue
+
+            name, expr = match.groups()
+            expr = re.sub(r"\d*'[hH]", "0x", expr)
+            expr = re.sub(r"\d*'[bB]", "0b", expr)
+            expr = re.sub(r"\d*'[dD]", "", expr)
+            expr = expr.replace("$clog2", "clog2").replace("/", "//")
+            try:
+                params[name] = int(eval(expr, {"clog2": lambda n: (n - 1).bit_length()}, dict(params)))
+            except Exception:
+                pass
+
+    return params
+
 # Pack bits together
 def pack_bits(values: list[int, int], msb=True):
     """
@@ -109,3 +195,17 @@ def pack_bits(values: list[int, int], msb=True):
         pos += width
 
     return res
+
+# Unpack bits, inverse of pack_bits
+def unpack_bits(packed: int, widths: list[int], msb=True):
+    """
+    Split packed into fields of the given widths, returns a list of values
+    """
+    widths = widths[::-1] if msb else widths
+
+    values = []
+    for width in widths:
+        values.append(packed & ((1 << width) - 1))
+        packed >>= width
+
+    return values[::-1] if msb else values
@@ -0,0 +1,66 @@
+# File-backed work queue shared between simulator processes
+
+import os
+import json
+from pathlib import Path
+
+
+class WorkQueue:
+    """
+    Directory of task files that long-lived workers pull from until it runs dry.
+
+    Each task is a JSON file in `todo/`. Claiming a task is an atomic rename into
+    `claimed/`, so any number of processes (including ones started by a
+    simulator, which can't share Python objects with us) can pull from the same
+    queue without locks. Tasks are handed out in filename order.
+    """
+    def __init__(self, root):
+        self.root = Path(root)
+        self.todo_dir = self.root / "todo"
+        self.claimed_dir = self.root / "claimed"
+
+    def reset(self):
+        """
+        Drop every pending and claimed task
+        """
+        for d in (self.todo_dir, self.claimed_dir):
+            os.makedirs(d, exist_ok=True)
+            for path in d.glob("*.json"):
+                path.unlink()
+
+    def put(self, tasks: list[dict]):
+        """
+        Enqueue tasks, first one is handed out first
+        """
+        os.makedirs(self.todo_dir, exist_ok=True)
+        os.makedirs(self.claimed_dir, exist_ok=True)
+        n_existing = len(list(self.todo_dir.glob("*.json"))) + len(list(self.claimed_dir.glob("*.json")))
+
+        for i, task in enumerate(tasks):
+            name = f"{n_existing + i:08}.json"
+
+            # Write then rename so workers never see a half-written task
+            tmp_path = self.root / f".{name}.tmp"
+            with open(tmp_path, "w") as fout:
+                json.dump(task, fout)
+            os.replace(tmp_path, self.todo_dir / name)
+
+    def claim(self):
+        """
+        Take the next task, or None once the queue is empty
+        """
+        for path in sorted(self.todo_dir.glob("*.json")):
+            dest = self.claimed_dir / path.name
+            try:
+                os.rename(path, dest)
+            except FileNotFoundError:
+                # Another worker got there first
+                continue
+
+            with open(dest) as fin:
+                return json.load(fin)
+
+        return None
+
+    def __len__(self):
+        return len(list(self.todo_dir.glob("*.json")))
@@ -0,0 +1,246 @@
+"""
+reference.py
+
+Software reference renderer for the scene JSONs in ctrl/scenes.
+Follows the hardware (ray_maker -> ray_intersector -> ray_reflector, bounce
+rules of ray_tracer.sv, 565 output of rtx_tb_parallel.sv) in float32, so its
+images can be compared against RTL renders of the same scene.
+
+    python reference.py ../ctrl/scenes/canonical_balls.json --width 320 --height 180 --samples 16
+"""
+
+import os
+import sys
+import json
+import time
+from pathlib import Path
+from argparse import ArgumentParser, BooleanOptionalAction
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+proj_path = Path(__file__).resolve().parent.parent
+sys.path.append(str(proj_path / "ctrl"))
+
+from camera import Camera
+from make_scene_buffer import Material, Object, bounce_limit, build_material_dict
+
+parser = ArgumentParser()
+parser.add_argument("scene", type=str)
+parser.add_argument("--width", type=int, default=320)
+parser.add_argument("--height", type=int, default=180)
+parser.add_argument("--samples", type=int, default=1, help="samples per pixel")
+parser.add_argument("--threads", type=int, default=os.cpu_count())
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--rgb565", action=BooleanOptionalAction, default=True, help="quantize every sample like rtx_tb_parallel's 565 output")
+parser.add_argument("--out", type=str, default="reference.png")
+
+# Same constants as the hardware
+TRIG_DET_EPSILON = 2.0 ** -16   # trig_intersector.sv EPSILON
+ORIGIN_EPSILON = 2.0 ** -8      # ray_reflector.sv EPSILON
+
+
+class ReferenceScene:
+    """
+    Scene JSON flattened into float32 arrays, one row per object / material
+    """
+    def __init__(self, scene: dict):
+        _, mat_name2idx, _ = build_material_dict(scene)
+
+        # Deduplicated materials, in material dictionary order
+        mats = {}
+        for mat_name, mat_json in scene["materials"].items():
+            mats.setdefault(mat_name2idx[mat_name], Material(**mat_json))
+        mats = [mats[idx] for idx in range(len(mats))]
+
+        self.mat_color = np.array([m.color for m in mats], dtype=np.float32)
+        self.mat_spec_color = np.array([m.spec_color for m in mats], dtype=np.float32)
+        self.mat_emit = np.array([m.emit_color for m in mats], dtype=np.float32)
+        self.mat_smoothness = np.array([m.smoothness for m in mats], dtype=np.float32)
+        self.mat_specular_prob = np.array([m.specular_prob for m in mats], dtype=np.int32)
+
+        objs = [
+            Object(**dict(obj, mat_idx=mat_name2idx[obj["material"]]))
+            for obj in scene["objects"]
+        ]
+        self.obj_type = np.array([o.obj_type for o in objs], dtype=np.int32)
+        self.obj_mat = np.array([o.mat_idx for o in objs], dtype=np.int32)
+        self.trig = np.array([o.trig for o in objs], dtype=np.float32)          # (N, 3, 3): v0, v0v1, v0v2
+        self.trig_norm = np.array([o.trig_norm for o in objs], dtype=np.float32)
+        self.center = np.array([o.sphere_center for o in objs], dtype=np.float32)
+        self.rad_sq = np.array([o.sphere_rad_sq for o in objs], dtype=np.float32)
+        self.rad_inv = np.array([o.sphere_rad_inv for o in objs], dtype=np.float32)
+
+        self.is_sphere = self.obj_type == 0
+        self.max_bounces = bounce_limit(scene["max_bounces"])
+
+    def intersect(self, origin: np.ndarray, d: np.ndarray):
+        """
+        Closest hit of every ray (rows of origin/d) against every object
+            Returns (hit_any, hit_pos, hit_norm, hit_mat_idx)
+        """
+        n_rays = len(d)
+        dist = np.full((n_rays, len(self.obj_type)), np.inf, dtype=np.float32)
+
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            # Spheres: nearest root of t^2 + b t + c, b = 2 d.L, c = |L|^2 - r^2
+            L = origin[:, None, :] - self.center[None, :, :]
+            b = 2 * np.einsum("rk,rok->ro", d, L)
+            c = np.einsum("rok,rok->ro", L, L) - self.rad_sq
+            x0 = (-b - np.sqrt(b * b - 4 * c)) / 2
+            sphere_hit = self.is_sphere & (x0 >= 0)
+            dist = np.where(sphere_hit, x0, dist)
+
+            # Triangles / parallelograms / planes, unnormalized barycentrics like trig_intersector
+            v0, e1, e2 = self.trig[:, 0], self.trig[:, 1], self.trig[:, 2]
+            pvec = np.cross(d[:, None, :], e2[None, :, :])
+            det = np.einsum("ok,rok->ro", e1, pvec)
+            tvec = origin[:, None, :] - v0[None, :, :]
+            u = np.einsum("rok,rok->ro", tvec, pvec)
+            qvec = np.cross(tvec, e1[None, :, :])
+            v = np.einsum("rk,rok->ro", d, qvec)
+            t = np.einsum("ok,rok->ro", e2, qvec) / det
+
+            # Comparisons are on magnitudes (fp_greater), so both faces are hit
+            pos_uv = (np.signbit(u) == np.signbit(det)) & (np.signbit(v) == np.signbit(det))
+            in_trig = pos_uv & ~(np.abs(u + v) > np.abs(det)) & (np.abs(det) > TRIG_DET_EPSILON)
+            in_square = pos_uv & (np.abs(det) > np.abs(u)) & (np.abs(det) > np.abs(v))
+            in_bounds = np.select(
+                [self.obj_type == 1, self.obj_type == 2],
+                [in_trig, in_square],
+                default=True,
+            )
+            trig_hit = ~self.is_sphere & in_bounds & (t > TRIG_DET_EPSILON)
+            dist = np.where(trig_hit, t, dist)
+
+        closest = np.argmin(dist, axis=1)
+        rows = np.arange(n_rays)
+        hit_dist = dist[rows, closest]
+        hit_any = np.isfinite(hit_dist)
+        hit_dist = np.where(hit_any, hit_dist, 0).astype(np.float32)
+
+        hit_pos = origin + d * hit_dist[:, None]
+        sphere_norm = (hit_pos - self.center[closest]) * self.rad_inv[closest][:, None]
+        # Back faces get the flipped normal
+        back_face = np.signbit(det[rows, closest])[:, None]
+        trig_norm = np.where(back_face, -self.trig_norm[closest], self.trig_norm[closest])
+        hit_norm = np.where(self.is_sphere[closest][:, None], sphere_norm, trig_norm)
+
+        return hit_any, hit_pos, hit_norm, self.obj_mat[closest]
+
+
+def normalize(v: np.ndarray):
+    return v / np.linalg.norm(v, axis=-1, keepdims=True)
+
+
+def trace(scene: ReferenceScene, origin: np.ndarray, d: np.ndarray, rng: np.random.Generator):
+    """
+    ray_tracer.sv for a batch of rays: up to max_bounces INTX/REFLECT rounds,
+        a ray stops as soon as it misses. Updates origin/d in place, returns the
+        incoming light per ray.
+    """
+    n_rays = len(d)
+    ray_color = np.ones((n_rays, 3), dtype=np.float32)
+    income_light = np.zeros((n_rays, 3), dtype=np.float32)
+    alive = np.arange(n_rays)
+
+    for _ in range(scene.max_bounces):
+        hit_any, hit_pos, hit_norm, mat_idx = scene.intersect(origin[alive], d[alive])
+        alive, hit_pos, hit_norm, mat_idx = alive[hit_any], hit_pos[hit_any], hit_norm[hit_any], mat_idx[hit_any]
+        if len(alive) == 0:
+            break
+
+        # Specular with probability specular_prob (prng8 <= specular_prob)
+        is_specular = rng.integers(0, 256, len(alive)) <= scene.mat_specular_prob[mat_idx]
+        spec_amt = np.where(is_specular, scene.mat_smoothness[mat_idx], 0).astype(np.float32)[:, None]
+
+        diffuse_dir = normalize(normalize(rng.uniform(-1, 1, (len(alive), 3)).astype(np.float32)) + hit_norm)
+        cur_dir = d[alive]
+        specular_dir = cur_dir - 2 * np.sum(cur_dir * hit_norm, axis=1, keepdims=True) * hit_norm
+        new_dir = normalize(diffuse_dir * (1 - spec_amt) + specular_dir * spec_amt)
+
+        true_mat_color = scene.mat_color[mat_idx] * (1 - spec_amt) + scene.mat_spec_color[mat_idx] * spec_amt
+        income_light[alive] += ray_color[alive] * scene.mat_emit[mat_idx]
+        ray_color[alive] *= true_mat_color
+
+        origin[alive] = hit_pos + hit_norm * ORIGIN_EPSILON
+        d[alive] = new_dir
+
+    return income_light
+
+
+def to_rgb8(light: np.ndarray, rgb565: bool = True):
+    """
+    Light -> 8-bit color, optionally through convert_fp_uint's 565 truncation
+    """
+    light = np.abs(light)
+    if not rgb565:
+        return np.clip(light * 256, 0, 255).astype(np.uint8)
+
+    bits = np.array([5, 6, 5])
+    n = np.minimum(np.floor(light * (1 << bits)), (1 << bits) - 1).astype(np.int32)
+    return (n << (8 - bits)).astype(np.uint8)
+
+
+def render_rows(scene: ReferenceScene, cam: Camera, width: int, height: int, rows: range, samples: int, seed: int, rgb565: bool):
+    """
+    Average of `samples` samples for every pixel of some rows, (len(rows), W, 3) float32 in [0, 255]
+    """
+    cam_origin, forward, right, up = (np.asarray(v, dtype=np.float32) for v in cam.vectors)
+
+    v, h = np.mgrid[rows.start:rows.stop, 0:width]
+    u = (h - width // 2).ravel().astype(np.float32)
+    v = (height // 2 - v).ravel().astype(np.float32)
+
+    # Deterministic per (seed, first row), independent of the thread count
+    rng = np.random.default_rng([seed, rows.start])
+    acc = np.zeros((len(u), 3), dtype=np.float32)
+
+    for _ in range(samples):
+        # ray_maker adds a signed 8-bit fraction of a pixel, [-0.5, 0.5), to u and v
+        u_noisy = u + rng.integers(-128, 128, len(u)) / 256
+        v_noisy = v + rng.integers(-128, 128, len(v)) / 256
+        d = normalize(forward + u_noisy[:, None] * right + v_noisy[:, None] * up).astype(np.float32)
+        origin = np.broadcast_to(cam_origin, d.shape).copy()
+
+        acc += to_rgb8(trace(scene, origin, d, rng), rgb565)
+
+    return (acc / samples).reshape((len(rows), width, 3))
+
+
+def render(scene: dict, width: int, height: int, samples: int = 1, threads: int = None, seed: int = 0, rgb565: bool = True, rows_per_job: int = 4):
+    """
+    Render a scene JSON, (H, W, 3) float32 in [0, 255]
+    Rows are split into jobs of rows_per_job rows that run on a thread pool
+        (NumPy drops the GIL inside the per-row array ops)
+    """
+    ref_scene = ReferenceScene(scene)
+    cam = Camera.from_json(scene["camera"], width)
+
+    jobs = [range(y, min(y + rows_per_job, height)) for y in range(0, height, rows_per_job)]
+    img = np.zeros((height, width, 3), dtype=np.float32)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = pool.map(
+            lambda rows: render_rows(ref_scene, cam, width, height, rows, samples, seed, rgb565),
+            jobs,
+        )
+        for rows, pixels in zip(jobs, results):
+            img[rows.start:rows.stop] = pixels
+
+    return img
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    with open(args.scene) as fin:
+        scene = json.load(fin)
+
+    start = time.time()
+    img = render(scene, args.width, args.height, args.samples, args.threads, args.seed, args.rgb565)
+    print(f"Rendered {args.width}x{args.height} @ {args.samples} spp in {time.time() - start:.2f}s")
+
+    Image.fromarray(np.clip(img, 0, 255).astype("uint8")).save(args.out)
+    print(f"Wrote {args.out}")